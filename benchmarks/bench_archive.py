@@ -0,0 +1,89 @@
+"""
+Efecto del archivo histórico: tiempo de abrir el mes actual, de cargar todas las tareas
+activas y de guardar (compactación completa) antes y después de archivar las tareas
+completadas de hace más de ``--days`` días, más el de leer un año archivado bajo demanda.
+
+Uso: python benchmarks/bench_archive.py [--tasks 1000000] [--days 365] [--repeat 3]
+"""
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic import write_agenda  # noqa: E402
+
+from agenda.archive import archive_cutoff  # noqa: E402
+from agenda.service import AgendaService  # noqa: E402
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def measure(path, year, month, repeat):
+    """Mejor tiempo (segundos) de cada fase, cada repetición con un servicio nuevo."""
+    best = {}
+    for _ in range(repeat):
+        service = AgendaService(path)
+        timings = {
+            "first_month": timed(lambda: service.set_month(year, month)),
+            "load_all": timed(service.load_all),
+            "save": timed(service.save),
+        }
+        service.close()
+        for phase, value in timings.items():
+            best[phase] = min(best.get(phase, float("inf")), value)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365, help="horizonte de archivo")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por medición (se toma la mejor)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agenda-archive-")
+    try:
+        path = os.path.join(workdir, "tasks.txt")
+        rows = write_agenda(path, args.tasks)
+        last_date = datetime.date.fromisoformat(rows[-1][0]) if rows else datetime.date.today()
+        del rows
+        # El horizonte se cuenta desde la última fecha de la agenda sintética, como si fuera hoy
+        before = archive_cutoff(args.days, today=last_date)
+        year, month = last_date.year, last_date.month
+
+        size_before = os.path.getsize(path)
+        results = {"antes": measure(path, year, month, args.repeat)}
+
+        service = AgendaService(path)
+        archived = timed(lambda: service.archive_completed(before))
+        service.close()
+        size_after = os.path.getsize(path)
+        results["después"] = measure(path, year, month, args.repeat)
+
+        service = AgendaService(path)
+        old_year = int(before[:4]) - 5
+        archive_year = timed(lambda: service.set_month(old_year, 6))
+        service.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.tasks} tareas: archivadas las completadas anteriores al {before} en {archived:.2f} s, "
+          f"tasks.txt {size_before / 2**20:.1f} -> {size_after / 2**20:.1f} MiB (mejor de {args.repeat}):")
+    for label, best in results.items():
+        print(f"  {label:<8} " + "   ".join(f"{phase} {value * 1000:8.1f} ms" for phase, value in best.items()))
+    print(f"  abrir un mes de {old_year} (lee su archivo): {archive_year * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
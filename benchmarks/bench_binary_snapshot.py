@@ -0,0 +1,97 @@
+"""
+Compara el snapshot de texto (tasks.txt) con el binario (.agb): tiempo de carga y memoria
+residente máxima (RSS) de la carga completa y de un solo mes. Cada medición se hace en un
+proceso nuevo, para que la memoria y la caché de páginas de una no afecten a la siguiente.
+
+Uso: python benchmarks/bench_binary_snapshot.py [--tasks 1000000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+
+
+def measure(path, month):
+    """Se ejecuta en el proceso hijo: (segundos, RSS máxima en MiB) de la carga."""
+    sys.path.insert(0, SRC_DIR)
+    from agenda.calendar import Calendar
+    from agenda.storage import open_store
+
+    store = open_store(path)
+    calendar = Calendar(2025, 1)
+    start = time.perf_counter()
+    if month:
+        store.load_month(calendar, *map(int, month.split("-")))
+    else:
+        store.load_all(calendar)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, peak_rss_kib() / 1024
+
+
+def peak_rss_kib():
+    # VmHWM es el pico de este proceso; ru_maxrss en Linux conserva el del proceso padre tras exec
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KiB en Linux, bytes en macOS
+
+
+def run_child(path, month):
+    command = [sys.executable, os.path.abspath(__file__), "--child", path, month or ""]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3, help="procesos por medición (se toma el mejor)")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, SRC_DIR)
+    from synthetic import write_agenda
+
+    from agenda.binary_store import convert_snapshot
+
+    workdir = tempfile.mkdtemp(prefix="agenda-binary-")
+    try:
+        text_path = os.path.join(workdir, "tasks.txt")
+        binary_path = os.path.join(workdir, "tasks.agb")
+        rows = write_agenda(text_path, args.tasks)
+        convert_snapshot(text_path, binary_path)
+        month = rows[len(rows) // 2][0][:7] if rows else "2025-01"
+        del rows
+        print(f"{args.tasks} tareas: texto {os.path.getsize(text_path) / 2**20:.1f} MiB, "
+              f"binario {os.path.getsize(binary_path) / 2**20:.1f} MiB (mejor de {args.repeat} procesos)")
+
+        for label, load_month in (("completa", None), (f"mes {month}", month)):
+            for name, path in (("texto", text_path), ("binario", binary_path)):
+                runs = [run_child(path, load_month) for _ in range(args.repeat)]
+                elapsed = min(run[0] for run in runs)
+                rss = min(run[1] for run in runs)
+                print(f"  {label:<12} {name:<8} {elapsed * 1000:9.1f} ms   RSS {rss:7.1f} MiB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compara la memoria de 1M de tareas cargadas con el modelo actual (__slots__ y secciones
+internadas) frente al modelo anterior (clases con __dict__ y una Section nueva por línea).
+
+Uso: python benchmarks/bench_model_memory.py [--count N]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from agenda.sections import Section  # noqa: E402
+from agenda.tasks import Task  # noqa: E402
+
+SECTIONS = ["Gimnasio", "Escuela", "Trabajo", "Personal", "Hogar"]
+
+
+class LegacySection:
+    def __init__(self, name):
+        self.name = name
+
+
+class LegacyTask:
+    def __init__(self, title, description, section):
+        self.title = title
+        self.description = description
+        self.section = section
+        self.completed = False
+
+
+def measure(task_cls, section_cls, count):
+    """Devuelve los bytes retenidos por ``count`` tareas (los textos se excluyen: son iguales en ambos modelos)."""
+    titles = [f"Tarea {i}" for i in range(count)]
+    description = "Descripción"
+    section_names = [SECTIONS[i % len(SECTIONS)] for i in range(count)]
+
+    gc.collect()
+    tracemalloc.start()
+    # Cada línea del archivo produce un nombre de sección nuevo (como split('|') en la carga)
+    tasks = [task_cls(titles[i], description, section_cls("".join(section_names[i]))) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    legacy = measure(LegacyTask, LegacySection, args.count)
+    current = measure(Task, Section, args.count)
+    print(f"Tareas: {args.count}")
+    print(f"Modelo anterior: {legacy / 2**20:8.1f} MiB")
+    print(f"Modelo actual:   {current / 2**20:8.1f} MiB ({100 * (1 - current / legacy):.0f}% menos)")
+
+
+if __name__ == "__main__":
+    main()
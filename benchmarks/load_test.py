@@ -0,0 +1,154 @@
+"""
+Prueba de carga de la API HTTP (agenda.api): varios clientes concurrentes leen rangos
+paginados (la mayoría con If-None-Match, como un cliente que hace polling) y algunos
+escriben. Muestra las peticiones por segundo y la latencia por tipo de petición.
+
+Sin ``--url`` arranca un servidor local sobre una agenda sintética de ``--tasks`` tareas.
+
+Uso:
+    python benchmarks/load_test.py [--clients 8] [--duration 10] [--write-ratio 0.05]
+    python benchmarks/load_test.py --url http://192.168.1.10:8000
+"""
+import argparse
+import calendar
+import collections
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic import write_agenda  # noqa: E402
+
+
+def start_local_server(tasks, workdir):
+    """Arranca la API en un hilo sobre una agenda sintética. Devuelve (url, servidor, agenda)."""
+    from werkzeug.serving import make_server
+
+    from agenda.api import RequestHandler, SharedAgenda, create_app
+    from agenda.service import AgendaService
+    from agenda.writer import PersistenceWorker
+
+    path = os.path.join(workdir, "tasks.txt")
+    write_agenda(path, tasks)
+    shared = SharedAgenda(AgendaService(path, writer=PersistenceWorker()))
+    logging.getLogger("werkzeug").setLevel(logging.ERROR) # Sin una línea de log por petición
+    server = make_server("127.0.0.1", 0, create_app(shared), threaded=True, request_handler=RequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, shared
+
+
+class Client(threading.Thread):
+    """Cliente que repite peticiones hasta ``deadline`` y acumula latencias por tipo."""
+
+    def __init__(self, url, deadline, write_ratio, seed):
+        super().__init__(daemon=True)
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.deadline = deadline
+        self.write_ratio = write_ratio
+        self.random = random.Random(seed)
+        self.latencies = collections.defaultdict(list) # "GET 200" -> [segundos]
+        self.errors = 0
+        self.etags = {} # ruta -> ETag, como un cliente que hace polling
+
+    def request(self, conn, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        self.latencies[f"{method} {response.status}"].append(time.perf_counter() - start)
+        return response, data
+
+    def connect(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def run(self):
+        conn = self.connect()
+        while time.monotonic() < self.deadline:
+            year = self.random.randint(2000, 2024)
+            month = self.random.randint(1, 12)
+            try:
+                if self.random.random() < self.write_ratio:
+                    body = json.dumps({"date": f"{year}-{month:02d}-15", "title": "Carga", "section": "Trabajo"})
+                    self.request(conn, "POST", "/api/tasks", body, {"Content-Type": "application/json"})
+                else:
+                    last_day = calendar.monthrange(year, month)[1]
+                    path = f"/api/tasks?from={year}-{month:02d}-01&to={year}-{month:02d}-{last_day}&per_page=50"
+                    headers = {"If-None-Match": self.etags[path]} if path in self.etags else {}
+                    response, _ = self.request(conn, "GET", path, headers=headers)
+                    if response.getheader("ETag"):
+                        self.etags[path] = response.getheader("ETag")
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = self.connect()
+        conn.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="servidor ya en marcha (por defecto se arranca uno local)")
+    parser.add_argument("--tasks", type=int, default=100_000, help="tareas de la agenda sintética local")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="fracción de peticiones de escritura")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agenda-load-")
+    server = shared = None
+    try:
+        url = args.url
+        if url is None:
+            url, server, shared = start_local_server(args.tasks, workdir)
+            print(f"Servidor local con {args.tasks} tareas en {url}")
+
+        deadline = time.monotonic() + args.duration
+        clients = [Client(url, deadline, args.write_ratio, seed) for seed in range(args.clients)]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.shutdown()
+            shared.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = collections.defaultdict(list)
+    for client in clients:
+        for kind, values in client.latencies.items():
+            latencies[kind].extend(values)
+    total = sum(len(values) for values in latencies.values())
+    errors = sum(client.errors for client in clients)
+
+    print(f"{total} peticiones en {elapsed:.1f} s con {args.clients} clientes: {total / elapsed:.0f} peticiones/s"
+          + (f", {errors} errores de conexión" if errors else ""))
+    for kind in sorted(latencies):
+        values = latencies[kind]
+        print(f"  {kind:<10} {len(values):>8}  p50 {percentile(values, 0.5) * 1000:7.2f} ms"
+              f"  p99 {percentile(values, 0.99) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
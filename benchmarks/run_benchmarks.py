@@ -0,0 +1,218 @@
+"""
+Benchmarks de la capa de datos y de operaciones de la interfaz sin pantalla.
+
+Genera agendas sintéticas (por defecto de 1k, 100k y 1M tareas), mide las rutas críticas
+y escribe los resultados en JSON. Si existe una línea base, falla (código de salida 1)
+cuando alguna medición supera ``--tolerance`` veces su valor de referencia.
+
+Las mediciones de Tk necesitan una pantalla; en servidores se ejecutan con Xvfb:
+
+    xvfb-run python benchmarks/run_benchmarks.py
+
+Uso:
+    python benchmarks/run_benchmarks.py [--sizes 1000,100000] [--output results.json]
+                                        [--baseline benchmarks/baseline.json] [--update-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic import write_agenda  # noqa: E402
+
+from agenda.calendar import Calendar  # noqa: E402
+from agenda.sections import Section  # noqa: E402
+from agenda.tasks import Task  # noqa: E402
+from agenda.text_store import TextTaskStore  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+def best_of(repeat, func, setup=None):
+    """Devuelve el menor tiempo (segundos) de ``repeat`` ejecuciones de ``func(setup())``."""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_calendar(path):
+    calendar = Calendar(2025, 1)
+    store = TextTaskStore(path)
+    store.load_all(calendar)
+    return store, calendar
+
+
+def bench_data_layer(size, workdir, repeat, results):
+    path = os.path.join(workdir, f"tasks_{size}.txt")
+    rows = write_agenda(path, size)
+
+    results[f"load_tasks[{size}]"] = best_of(repeat, lambda _: load_calendar(path))
+
+    def save(state):
+        store, calendar = state
+        store.checkpoint(calendar, force=True)
+        store.flush()
+    results[f"save_tasks[{size}]"] = best_of(repeat, save, lambda: load_calendar(path))
+
+    def append_one(state):
+        store, calendar = state
+        task = Task("Nueva tarea", "", Section("Personal"))
+        calendar.add_task("2025-01-15", task)
+        store.add_task("2025-01-15", task)
+        store.flush()
+    results[f"journal_append[{size}]"] = best_of(repeat, append_one, lambda: load_calendar(path))
+
+    tasks = [(row[0], Task(row[1], row[2], Section(row[3]))) for row in rows]
+
+    def add_all(_):
+        calendar = Calendar(2025, 1)
+        for date_str, task in tasks:
+            calendar.add_task(date_str, task)
+    results[f"calendar_add_task[{size}]"] = best_of(repeat, add_all)
+
+    _, calendar = load_calendar(path)
+    dates = [row[0] for row in rows]
+    results[f"calendar_get_tasks[{size}]"] = best_of(
+        repeat, lambda _: [calendar.get_tasks(date_str) for date_str in dates])
+    # Búsqueda por id: la primera construye el índice id -> fecha, las siguientes solo lo consultan
+    task_ids = [task.id for _, tasks_on_date in calendar.iter_tasks() for task in tasks_on_date][::max(size // 1000, 1)]
+    results[f"calendar_find_id[{size}]"] = best_of(
+        repeat, lambda _: [calendar.find(task_id) for task_id in task_ids]) / len(task_ids)
+    results[f"calendar_month_mask[{size}]"] = best_of(
+        repeat, lambda _: [calendar.month_task_mask(2010, month) for month in range(1, 13)]) / 12
+
+    # Insignias de un mes: la primera consulta recorre el mes, las siguientes leen los agregados
+    month_days = [f"2010-01-{day:02d}" for day in range(1, 32)]
+    results[f"month_counts_first[{size}]"] = best_of(
+        repeat, lambda _: calendar.aggregates.month(2010, 1), calendar.aggregates.clear)
+    results[f"month_counts_cached[{size}]"] = best_of(
+        repeat, lambda _: [calendar.aggregates.day(date_str) for date_str in month_days])
+
+
+def bench_ui(size, workdir, repeat, results, skipped):
+    import tkinter as tk
+    try:
+        probe = tk.Tk()
+        probe.destroy()
+    except tk.TclError as e:
+        skipped.append(f"ui[{size}]: sin pantalla ({e}); usa xvfb-run")
+        return
+
+    path = os.path.join(workdir, f"tasks_{size}.txt")
+    os.environ["AGENDA_DATA_FILE"] = path
+    from main import AgendaApp
+
+    app = AgendaApp()
+    try:
+        app.service.load_all()
+        app.update()
+
+        def switch_months(_):
+            for _ in range(12):
+                app.shift_month(1)
+                app.update_idletasks()
+        results[f"display_calendar_switch[{size}]"] = best_of(repeat, switch_months) / 12
+
+        def open_history(_):
+            app.ver_tareas()
+            app.update_idletasks()
+            for window in app.winfo_children():
+                if isinstance(window, tk.Toplevel):
+                    window.destroy()
+        results[f"ver_tareas_open[{size}]"] = best_of(repeat, open_history)
+    finally:
+        app.watcher.stop()
+        app.service.close()
+        app.destroy()
+
+
+def compare(results, baseline, tolerance):
+    """Imprime la comparación con la línea base y devuelve las mediciones que empeoraron."""
+    regressions = []
+    for name, value in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"  {name:40s} {value * 1000:10.3f} ms   (sin referencia)")
+            continue
+        ratio = value / reference if reference else float("inf")
+        flag = "  REGRESIÓN" if ratio > tolerance else ""
+        print(f"  {name:40s} {value * 1000:10.3f} ms   x{ratio:5.2f}{flag}")
+        if ratio > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la agenda.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Tamaños de agenda separados por comas.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición (se toma la mejor).")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Línea base JSON con la que comparar.")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Factor máximo permitido respecto a la línea base.")
+    parser.add_argument("--update-baseline", action="store_true", help="Guarda los resultados como línea base.")
+    parser.add_argument("--no-ui", action="store_true", help="Omite las mediciones de Tk.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = {}
+    skipped = []
+    workdir = tempfile.mkdtemp(prefix="agenda-bench-")
+    try:
+        for size in sizes:
+            print(f"Agenda de {size} tareas...", file=sys.stderr)
+            bench_data_layer(size, workdir, args.repeat, results)
+            if args.no_ui:
+                skipped.append(f"ui[{size}]: omitido con --no-ui")
+            else:
+                bench_ui(size, workdir, args.repeat, results, skipped)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+        "skipped": skipped,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Línea base actualizada en {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print("Resultados:")
+    regressions = compare(results, baseline, args.tolerance)
+    for reason in skipped:
+        print(f"  omitido: {reason}")
+    if regressions:
+        print(f"ERROR: {len(regressions)} mediciones superan x{args.tolerance} la línea base: "
+              + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
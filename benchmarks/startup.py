@@ -0,0 +1,116 @@
+"""
+Tiempo de arranque en frío: cada medición se hace en un proceso nuevo sobre una agenda
+sintética. Fases:
+
+- ``imports``: importar la aplicación (``main`` y sus módulos).
+- ``first_month``: abrir el servicio y cargar el mes visible (lo que la ventana necesita para pintarse).
+- ``history``: leer el resto del historial en segundo plano e incorporarlo.
+- ``first_paint`` (solo con pantalla o ``xvfb-run``): construir ``AgendaApp`` y pintar la ventana.
+
+Termina con error si ``imports + first_month`` (o ``first_paint``) supera ``--target`` segundos.
+
+Uso:
+    python benchmarks/startup.py [--tasks 1000000] [--repeat 3] [--target 0.5]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+
+DEFAULT_TARGET = 0.5 # Segundos hasta tener el mes visible con 1M tareas
+
+
+def measure(path, year, month, ui):
+    """Se ejecuta en el proceso hijo: devuelve los tiempos de cada fase (segundos)."""
+    sys.path.insert(0, SRC_DIR)
+    timings = {}
+    start = time.perf_counter()
+    import main
+    timings["imports"] = time.perf_counter() - start
+
+    from agenda.service import AgendaService
+    start = time.perf_counter()
+    service = AgendaService(path)
+    service.set_month(year, month)
+    timings["first_month"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    service.preload()
+    service.finish_preload(wait=True)
+    timings["history"] = time.perf_counter() - start
+    service.close()
+
+    if ui:
+        import tkinter as tk
+        try:
+            tk.Tk().destroy()
+        except tk.TclError:
+            return timings
+        os.environ["AGENDA_DATA_FILE"] = path
+        start = time.perf_counter()
+        app = main.AgendaApp()
+        app.update()
+        timings["first_paint"] = time.perf_counter() - start
+        app.on_closing()
+    return timings
+
+
+def run_child(path, year, month, ui):
+    command = [sys.executable, os.path.abspath(__file__), "--child", path, f"{year}-{month:02d}"]
+    if ui:
+        command.append("--ui")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1_000_000, help="tareas de la agenda sintética")
+    parser.add_argument("--repeat", type=int, default=3, help="procesos por medición (se toma el mejor)")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help="segundos máximos hasta el primer mes")
+    parser.add_argument("--ui", action="store_true", help="mide también la ventana Tk (necesita pantalla)")
+    parser.add_argument("--child", nargs=2, metavar=("ARCHIVO", "MES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path, month = args.child
+        year, month = map(int, month.split("-"))
+        print(json.dumps(measure(path, year, month, args.ui)))
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    from synthetic import write_agenda
+
+    workdir = tempfile.mkdtemp(prefix="agenda-startup-")
+    try:
+        path = os.path.join(workdir, "tasks.txt")
+        rows = write_agenda(path, args.tasks)
+        last_date = rows[-1][0] if rows else time.strftime("%Y-%m-%d")
+        year, month = int(last_date[:4]), int(last_date[5:7]) # El mes más reciente con tareas
+
+        best = {}
+        for _ in range(args.repeat):
+            for phase, value in run_child(path, year, month, args.ui).items():
+                best[phase] = min(best.get(phase, float("inf")), value)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Arranque con {args.tasks} tareas (mejor de {args.repeat} procesos):")
+    for phase, value in best.items():
+        print(f"  {phase:<12} {value * 1000:9.1f} ms")
+    first_screen = best.get("first_paint", best["imports"] + best["first_month"])
+    verdict = "OK" if first_screen <= args.target else "POR ENCIMA DEL OBJETIVO"
+    print(f"Hasta el primer mes: {first_screen * 1000:.1f} ms (objetivo {args.target * 1000:.0f} ms): {verdict}")
+    if first_screen > args.target:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Generación de agendas sintéticas en el formato de tasks.txt para los benchmarks."""
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from agenda.storage import format_snapshot_header, format_task_line  # noqa: E402
+
+SECTIONS = ["Gimnasio", "Escuela", "Trabajo", "Personal", "Hogar", "Iglesia"]
+VERBS = ["Repasar", "Entregar", "Preparar", "Comprar", "Llamar", "Leer", "Entrenar", "Rendir"]
+
+
+def generate_rows(count, start_year=2000, years=25, seed=42):
+    """Devuelve ``count`` tuplas (fecha, titulo, descripcion, seccion, completado) ordenadas por fecha."""
+    rng = random.Random(seed)
+    first_day = datetime.date(start_year, 1, 1).toordinal()
+    span = years * 365
+    rows = []
+    for i in range(count):
+        date_str = datetime.date.fromordinal(first_day + rng.randrange(span)).strftime("%Y-%m-%d")
+        title = f"{rng.choice(VERBS)} tarea {i}"
+        description = "" if i % 4 else f"Detalle {i} | con separador"
+        rows.append((date_str, title, description, rng.choice(SECTIONS), rng.random() < 0.6))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def write_agenda(path, count, seed=42):
+    """Escribe una agenda sintética de ``count`` tareas en ``path`` y devuelve las filas."""
+    rows = generate_rows(count, seed=seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(format_snapshot_header(0, len(rows) + 1) + "\n")
+        f.write("\n".join(format_task_line(*row, task_id) for task_id, row in enumerate(rows, 1)))
+    return rows
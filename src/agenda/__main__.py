@@ -0,0 +1,5 @@
+import sys
+
+from agenda.cli import main
+
+sys.exit(main())
@@ -0,0 +1,146 @@
+import collections
+import datetime
+
+
+def _count(counter, key, sign):
+    # Sin entradas a cero: las secciones sin tareas no aparecen en el desglose
+    value = counter[key] + sign
+    if value:
+        counter[key] = value
+    else:
+        del counter[key]
+
+
+class TaskCounts:
+    """Totales de un día o de un mes: tareas, completadas y ambos por sección."""
+
+    __slots__ = ('total', 'completed', 'by_section', 'completed_by_section')
+
+    def __init__(self):
+        self.total = 0
+        self.completed = 0
+        self.by_section = collections.Counter()
+        self.completed_by_section = collections.Counter()
+
+    @property
+    def pending(self):
+        return self.total - self.completed
+
+    @property
+    def ratio(self):
+        """Fracción completada (0 si no hay tareas)."""
+        return self.completed / self.total if self.total else 0.0
+
+    def add(self, section_name, completed, sign=1):
+        """Suma (o resta, con ``sign=-1``) una tarea."""
+        self.total += sign
+        _count(self.by_section, section_name, sign)
+        if completed:
+            self.completed += sign
+            _count(self.completed_by_section, section_name, sign)
+
+    def merge(self, other):
+        self.total += other.total
+        self.completed += other.completed
+        self.by_section.update(other.by_section)
+        self.completed_by_section.update(other.completed_by_section)
+
+    def all_completed(self):
+        return self.total > 0 and self.completed == self.total
+
+
+class CalendarAggregates:
+    """
+    Agregados por día y por mes de un Calendar, mantenidos de forma incremental.
+
+    Cada mes se calcula la primera vez que se consulta, recorriendo solo sus fechas; desde
+    entonces el Calendar avisa de cada alta, baja o cambio y los totales se actualizan en O(1).
+    Los meses que nadie consultó no cuestan nada al cargar ni al modificar tareas.
+    """
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self.months = {} # "YYYY-MM" -> TaskCounts, solo los meses ya calculados
+        self._days = {} # "YYYY-MM-DD" -> TaskCounts de los días con tareas de esos meses
+
+    def clear(self):
+        self.months.clear()
+        self._days.clear()
+
+    def month(self, year, month):
+        """Totales del mes: O(fechas del mes) la primera vez, O(1) después."""
+        key = f"{year}-{month:02d}"
+        counts = self.months.get(key)
+        if counts is None:
+            counts = self.months[key] = TaskCounts()
+            for date_str, tasks in self.calendar.iter_month(year, month):
+                day = self._days[date_str] = TaskCounts()
+                for task in tasks:
+                    day.add(task.section.name, task.completed)
+                counts.merge(day)
+        return counts
+
+    def day(self, date_str):
+        """Totales del día, o None si no tiene tareas."""
+        self.month(int(date_str[:4]), int(date_str[5:7]))
+        return self._days.get(date_str)
+
+    # --- Avisos del Calendar ---
+
+    def task_added(self, date_str, task, sign=1):
+        counts = self.months.get(date_str[:7])
+        if counts is None:
+            return # Mes sin calcular: se calculará completo al consultarlo
+        counts.add(task.section.name, task.completed, sign)
+        day = self._days.get(date_str)
+        if day is None:
+            day = self._days[date_str] = TaskCounts()
+        day.add(task.section.name, task.completed, sign)
+        if not day.total:
+            del self._days[date_str]
+
+    def task_removed(self, date_str, task):
+        self.task_added(date_str, task, sign=-1)
+
+    def task_changed(self, date_str, section_name, completed, task):
+        """La tarea tenía ``section_name`` y ``completed`` antes del cambio."""
+        counts = self.months.get(date_str[:7])
+        if counts is None:
+            return
+        day = self._days[date_str]
+        for totals in (counts, day):
+            totals.add(section_name, completed, -1)
+            totals.add(task.section.name, task.completed)
+
+
+def _day_done(day_counts, day):
+    counts = day_counts(day)
+    return counts is not None and counts.all_completed()
+
+
+def current_streak(day_counts, today):
+    """
+    Días seguidos con todas sus tareas completadas que terminan hoy. ``day_counts(fecha)``
+    devuelve el TaskCounts del día o None. Un día sin tareas o con alguna pendiente corta la
+    racha, salvo hoy: si aún tiene pendientes, la racha sigue viva hasta que termine el día.
+    Cuesta O(longitud de la racha).
+    """
+    streak = 0
+    day = today
+    if not _day_done(day_counts, day):
+        day -= datetime.timedelta(days=1)
+    while _day_done(day_counts, day):
+        streak += 1
+        day -= datetime.timedelta(days=1)
+    return streak
+
+
+def best_streak(day_counts, first, last):
+    """Racha más larga entre ``first`` y ``last`` (fechas incluidas). Cuesta O(días del intervalo)."""
+    best = current = 0
+    day = first
+    while day <= last:
+        current = current + 1 if _day_done(day_counts, day) else 0
+        best = max(best, current)
+        day += datetime.timedelta(days=1)
+    return best
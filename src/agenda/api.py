@@ -0,0 +1,414 @@
+"""
+API HTTP/JSON de la agenda (Flask) para clientes de la red local: móviles, paneles, scripts.
+
+    GET    /api/tasks?from=&to=&section=&completed=&page=&per_page=
+    GET    /api/tasks/<fecha>
+    POST   /api/tasks                      {"date", "title", "description", "section"}
+    PATCH  /api/tasks/<fecha>/<posición>   {"title", "description", "section", "completed"}
+    DELETE /api/tasks/<fecha>/<posición>
+    PATCH  /api/tasks/id/<id>              (igual, con el id estable que devuelven las lecturas)
+    DELETE /api/tasks/id/<id>
+
+Las respuestas de lectura llevan ETag: un GET con ``If-None-Match`` recibe 304 sin
+construir el cuerpo si nada cambió en el rango pedido. Las modificaciones aceptan
+``If-Match`` con el ETag de la fecha para no pisar cambios de otro cliente (412).
+
+Los lectores nunca esperan a un escritor: leen una vista inmutable (``AgendaView``) que
+los escritores sustituyen de forma atómica tras cada cambio.
+
+Uso (desde src/): python -m agenda serve --host 0.0.0.0 --port 8000
+"""
+
+import bisect
+import datetime
+import threading
+import urllib.parse
+import zlib
+
+from flask import Flask, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from agenda.formats import normalize_row
+
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 1000
+
+
+class AgendaView:
+    """
+    Estado de solo lectura publicado para los lectores.
+
+    ``by_date`` asocia cada fecha a una tupla de filas (titulo, descripcion, seccion, completado, id)
+    y ``date_versions`` a la versión del último cambio de esa fecha. Las fechas que se quedan
+    sin tareas se conservan con una tupla vacía para que su versión siga contando en los ETag.
+    """
+
+    __slots__ = ('version', 'dates', 'by_date', 'date_versions')
+
+    def __init__(self, version, dates, by_date, date_versions):
+        self.version = version
+        self.dates = dates # Lista ordenada de las claves de ``by_date``
+        self.by_date = by_date
+        self.date_versions = date_versions
+
+    @classmethod
+    def build(cls, dated_tasks):
+        by_date = {date_str: tuple(_task_row(task) for task in tasks) for date_str, tasks in dated_tasks}
+        return cls(0, sorted(by_date), by_date, dict.fromkeys(by_date, 0))
+
+    def range_dates(self, start=None, end=None):
+        lo = 0 if start is None else bisect.bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return self.dates[lo:hi]
+
+    def range_version(self, dates):
+        """Versión del último cambio entre ``dates``: cambia si se modifica cualquier fecha del rango."""
+        return max(map(self.date_versions.__getitem__, dates), default=0)
+
+
+def _task_row(task):
+    return (task.title, task.description, task.section.name, task.completed, task.id)
+
+
+def _task_json(date_str, position, row):
+    title, description, section_name, completed, task_id = row
+    return {'id': task_id, 'date': date_str, 'position': position, 'title': title, 'description': description,
+            'section': section_name, 'completed': completed}
+
+
+class PreconditionFailed(Exception):
+    """El ETag de ``If-Match`` ya no corresponde a la fecha: otro cliente la modificó."""
+
+
+class SharedAgenda:
+    """
+    Agenda compartida por los hilos del servidor.
+
+    Los cambios se serializan con un lock, pasan por AgendaService (que encola la E/S en su
+    hilo de escritura) y publican una vista nueva copiando solo el diccionario de fechas, no
+    las tareas. Los lectores solo toman la referencia de ``view``, sin lock.
+
+    Los cambios que guardan otros procesos (la aplicación, la línea de comandos) se incorporan
+    antes de cada modificación y con ``refresh``; solo cambian los ETag de las fechas afectadas.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._write_lock = threading.Lock()
+        service.load_all()
+        self.view = AgendaView.build(service.calendar.iter_tasks())
+        self._seen_changes = service.external_changes
+
+    def refresh(self):
+        """Incorpora los cambios de otros procesos (lo llama el vigilante de archivos)."""
+        with self._write_lock:
+            self.service.sync()
+            self._reconcile()
+
+    def _reconcile(self):
+        """Si el servicio incorporó cambios externos, publica una vista nueva comparando fecha por fecha."""
+        if self.service.external_changes == self._seen_changes:
+            return
+        self._seen_changes = self.service.external_changes
+        view = self.view
+        version = view.version + 1
+        by_date = {date_str: tuple(_task_row(task) for task in tasks)
+                   for date_str, tasks in self.service.calendar.iter_tasks()}
+        date_versions = dict(view.date_versions)
+        for date_str, rows in view.by_date.items():
+            by_date.setdefault(date_str, ()) # Las fechas que se quedaron sin tareas siguen contando
+        for date_str, rows in by_date.items():
+            if view.by_date.get(date_str) != rows:
+                date_versions[date_str] = version
+        self.view = AgendaView(version, sorted(by_date), by_date, date_versions)
+
+    def date_etag(self, date_str, view=None):
+        view = view or self.view
+        return f"d{view.date_versions.get(date_str, 0)}"
+
+    def _task_at(self, date_str, position, if_match):
+        if if_match and not if_match.contains(self.date_etag(date_str)):
+            raise PreconditionFailed(date_str)
+        tasks_on_date = self.service.calendar.get_tasks(date_str)
+        if not 1 <= position <= len(tasks_on_date):
+            raise LookupError(f"No hay tarea {position} el {date_str}.")
+        return tasks_on_date[position - 1]
+
+    def _task_with_id(self, task_id, if_match):
+        date_str, task = self.service.find_task(task_id)
+        if if_match and not if_match.contains(self.date_etag(date_str)):
+            raise PreconditionFailed(date_str)
+        return date_str, task
+
+    # Los métodos de cambio devuelven la vista publicada, para responder con el estado que dejaron
+
+    def add_task(self, date_str, title, description, section_name):
+        """Añade una tarea y devuelve (posición, vista)."""
+        with self._write_lock:
+            self.service.add_task(date_str, title, description, section_name)
+            return len(self.service.calendar.get_tasks(date_str)), self._publish(date_str)
+
+    def update_task(self, date_str, position, changes, if_match=None):
+        with self._write_lock:
+            self.service.sync()
+            self._reconcile() # Las posiciones y los ETag se comprueban contra el estado actual
+            task = self._task_at(date_str, position, if_match)
+            return self._update(date_str, task, changes)
+
+    def update_task_by_id(self, task_id, changes, if_match=None):
+        """Como ``update_task``, con la tarea indicada por su id. Devuelve (fecha, posición, vista)."""
+        with self._write_lock:
+            self.service.sync()
+            self._reconcile()
+            date_str, task = self._task_with_id(task_id, if_match)
+            view = self._update(date_str, task, changes)
+            return date_str, self.service.calendar.position(date_str, task) + 1, view
+
+    def _update(self, date_str, task, changes):
+        if {'title', 'description', 'section'} & changes.keys():
+            self.service.update_task(date_str, task, changes.get('title', task.title),
+                                     changes.get('description', task.description),
+                                     changes.get('section', task.section.name))
+        if 'completed' in changes and changes['completed'] != task.completed:
+            self.service.set_completed(date_str, task, changes['completed'])
+        return self._publish(date_str)
+
+    def delete_task(self, date_str, position, if_match=None):
+        with self._write_lock:
+            self.service.sync()
+            self._reconcile()
+            task = self._task_at(date_str, position, if_match)
+            self.service.delete_task(date_str, task)
+            return self._publish(date_str)
+
+    def delete_task_by_id(self, task_id, if_match=None):
+        with self._write_lock:
+            self.service.sync()
+            self._reconcile()
+            date_str, task = self._task_with_id(task_id, if_match)
+            self.service.delete_task(date_str, task)
+            return self._publish(date_str)
+
+    def _publish(self, date_str):
+        """Publica una vista nueva con la fecha ``date_str`` actualizada."""
+        view = self.view
+        version = view.version + 1
+        by_date = dict(view.by_date)
+        dates = view.dates
+        if date_str not in by_date:
+            dates = list(dates)
+            bisect.insort(dates, date_str)
+        by_date[date_str] = tuple(_task_row(task) for task in self.service.calendar.get_tasks(date_str))
+        date_versions = dict(view.date_versions)
+        date_versions[date_str] = version
+        self.view = AgendaView(version, dates, by_date, date_versions) # Asignación atómica
+        self._reconcile() # El cambio pudo incorporar también cambios externos
+        return self.view
+
+    def close(self):
+        self.service.close()
+
+
+def _parse_bool(value, name):
+    if value is None:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f"'{name}' debe ser true o false.")
+
+
+def _parse_positive_int(value, name, default, maximum=None):
+    if value is None:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f"'{name}' debe ser un entero positivo.")
+    return min(int(value), maximum) if maximum else int(value)
+
+
+def _parse_date(value, name):
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"'{name}' debe ser una fecha YYYY-MM-DD.") from None
+
+
+def create_app(shared):
+    """Crea la aplicación Flask sobre una SharedAgenda."""
+    app = Flask(__name__)
+    app.config['JSON_AS_ASCII'] = False
+
+    def log_writer_errors():
+        writer = shared.service.writer
+        while writer is not None and not writer.errors.empty():
+            app.logger.error("No se pudieron guardar las tareas: %s", writer.errors.get_nowait())
+
+    @app.errorhandler(HTTPException)
+    def http_error(error):
+        return jsonify(error=error.description), error.code
+
+    @app.errorhandler(ValueError)
+    def bad_request(error):
+        return jsonify(error=str(error)), 400
+
+    @app.errorhandler(LookupError)
+    def not_found(error):
+        return jsonify(error=str(error)), 404
+
+    @app.errorhandler(PreconditionFailed)
+    def precondition_failed(error):
+        return jsonify(error=f"La fecha {error} cambió; vuelva a leerla."), 412
+
+    @app.errorhandler(IOError)
+    def storage_error(error):
+        return jsonify(error=f"No se pudieron guardar las tareas: {error}"), 500
+
+    @app.get("/api/tasks")
+    def list_tasks():
+        args = request.args
+        start = _parse_date(args.get('from'), 'from')
+        end = _parse_date(args.get('to'), 'to')
+        section = args.get('section')
+        completed = _parse_bool(args.get('completed'), 'completed')
+        page = _parse_positive_int(args.get('page'), 'page', 1)
+        per_page = _parse_positive_int(args.get('per_page'), 'per_page', DEFAULT_PER_PAGE, MAX_PER_PAGE)
+
+        view = shared.view # Una sola lectura: toda la respuesta sale de la misma vista
+        dates = view.range_dates(start, end)
+        # El ETag depende de los cambios en el rango y de la consulta, no de toda la agenda
+        etag = f"r{view.range_version(dates)}-{zlib.crc32(request.query_string):08x}"
+        if request.if_none_match.contains(etag):
+            return "", 304, {'ETag': f'"{etag}"'}
+
+        first = (page - 1) * per_page
+        items, total = [], 0
+        for date_str in dates:
+            for position, row in enumerate(view.by_date[date_str], 1):
+                if section is not None and row[2] != section:
+                    continue
+                if completed is not None and row[3] != completed:
+                    continue
+                if first <= total < first + per_page:
+                    items.append(_task_json(date_str, position, row))
+                total += 1
+
+        body = {'tasks': items, 'page': page, 'per_page': per_page, 'total': total, 'next': None}
+        if first + per_page < total:
+            query = args.to_dict()
+            query['page'] = page + 1
+            body['next'] = f"{request.base_url}?{urllib.parse.urlencode(query)}"
+        response = jsonify(body)
+        response.set_etag(etag)
+        return response
+
+    @app.get("/api/tasks/<date_str>")
+    def date_tasks(date_str):
+        date_str = _parse_date(date_str, 'fecha')
+        view = shared.view
+        etag = shared.date_etag(date_str, view)
+        if request.if_none_match.contains(etag):
+            return "", 304, {'ETag': f'"{etag}"'}
+        rows = view.by_date.get(date_str, ())
+        response = jsonify(tasks=[_task_json(date_str, position, row) for position, row in enumerate(rows, 1)])
+        response.set_etag(etag)
+        return response
+
+    def task_fields(data, required):
+        if not isinstance(data, dict):
+            raise ValueError("Se esperaba un objeto JSON.")
+        for name in ('title', 'description', 'section'):
+            if name in data and not isinstance(data[name], str):
+                raise ValueError(f"'{name}' debe ser texto.")
+        if 'completed' in data and not isinstance(data['completed'], bool):
+            raise ValueError("'completed' debe ser true o false.")
+        missing = [name for name in required if not data.get(name)]
+        if missing:
+            raise ValueError(f"Faltan campos: {', '.join(missing)}")
+        return data
+
+    @app.post("/api/tasks")
+    def create_task():
+        data = task_fields(request.get_json(silent=True), ('date', 'title'))
+        date_str, title, description, section_name, _ = normalize_row(
+            data['date'], data['title'], data.get('description', ''), data.get('section', ''), False)
+        position, view = shared.add_task(date_str, title, description, section_name)
+        log_writer_errors()
+        response = jsonify(_task_json(date_str, position, view.by_date[date_str][position - 1]))
+        response.status_code = 201
+        response.headers['Location'] = f"/api/tasks/{date_str}/{position}"
+        response.set_etag(shared.date_etag(date_str, view))
+        return response
+
+    def task_changes():
+        data = task_fields(request.get_json(silent=True), ())
+        changes = {name: data[name] for name in ('title', 'description', 'section', 'completed') if name in data}
+        if 'title' in changes and not changes['title'].strip():
+            raise ValueError("La tarea no tiene título.")
+        if 'section' in changes:
+            changes['section'] = changes['section'].strip() or "General"
+        return changes
+
+    def updated_task(date_str, position, view):
+        log_writer_errors()
+        response = jsonify(_task_json(date_str, position, view.by_date[date_str][position - 1]))
+        response.set_etag(shared.date_etag(date_str, view))
+        return response
+
+    @app.patch("/api/tasks/<date_str>/<int:position>")
+    def update_task(date_str, position):
+        date_str = _parse_date(date_str, 'fecha')
+        view = shared.update_task(date_str, position, task_changes(), request.if_match)
+        return updated_task(date_str, position, view)
+
+    @app.patch("/api/tasks/id/<int:task_id>")
+    def update_task_by_id(task_id):
+        return updated_task(*shared.update_task_by_id(task_id, task_changes(), request.if_match))
+
+    @app.delete("/api/tasks/<date_str>/<int:position>")
+    def delete_task(date_str, position):
+        date_str = _parse_date(date_str, 'fecha')
+        shared.delete_task(date_str, position, request.if_match)
+        log_writer_errors()
+        return "", 204
+
+    @app.delete("/api/tasks/id/<int:task_id>")
+    def delete_task_by_id(task_id):
+        shared.delete_task_by_id(task_id, request.if_match)
+        log_writer_errors()
+        return "", 204
+
+    return app
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Conexiones persistentes (los clientes que hacen polling no reconectan en cada petición)."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Sin esperas de ACK retrasado entre cabeceras y cuerpo
+
+
+def serve(data_file, host="127.0.0.1", port=8000):
+    """Carga la agenda y atiende peticiones con un hilo por conexión hasta Ctrl+C."""
+    from agenda.service import AgendaService
+    from agenda.watcher import ChangeWatcher
+    from agenda.writer import PersistenceWorker
+
+    shared = SharedAgenda(AgendaService(data_file, writer=PersistenceWorker()))
+    server = make_server(host, port, create_app(shared), threaded=True, request_handler=RequestHandler)
+    # La aplicación o la línea de comandos pueden guardar en el mismo archivo mientras tanto.
+    # La relectura va al hilo de escritura, que informa de sus errores como los de guardado.
+    watcher = ChangeWatcher(shared.service.watch_paths(),
+                            on_change=lambda: shared.service.writer.submit("refresh", shared.refresh))
+    print(f"Sirviendo {data_file} en http://{host}:{server.server_port}/api/tasks")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        server.server_close()
+        shared.close() # Vacía la cola de escritura
@@ -0,0 +1,154 @@
+"""
+Archivo histórico: las tareas completadas anteriores a un horizonte salen del almacenamiento
+principal y se guardan comprimidas, un archivo por año, en ``<archivo de datos>.archive/``
+(``2019.txt.gz`` con gzip o ``2019.txt.xz`` con lzma), con el mismo formato de línea que
+tasks.txt. Así la carga al arrancar y las compactaciones solo trabajan con las tareas activas.
+
+Los archivos de un año solo se leen cuando hace falta (al ver ese año, al buscar en el
+historial o al exportar). Cada archivo se reescribe completo y de forma atómica.
+"""
+
+import datetime
+import gzip
+import lzma
+import os
+import re
+
+from agenda.sections import Section
+from agenda.storage import StorageError, file_identity, format_task_line, parse_task_line, rows_in_range
+from agenda.tasks import Task
+
+DEFAULT_HORIZON_DAYS = 365
+COMPRESSIONS = {'gz': gzip, 'xz': lzma} # Extensión -> módulo con open() y compress()
+_ARCHIVE_NAME = re.compile(r"(\d{4})\.txt\.(gz|xz)")
+
+
+def archive_cutoff(days=DEFAULT_HORIZON_DAYS, today=None):
+    """Fecha (YYYY-MM-DD) desde la que las tareas siguen activas: las completadas anteriores se archivan."""
+    if days < 0:
+        raise ValueError("El horizonte de archivo no puede ser negativo.")
+    today = today or datetime.date.today()
+    return (today - datetime.timedelta(days=days)).isoformat()
+
+
+class TaskArchive:
+    """
+    Archivos comprimidos por año. Las filas son tuplas (fecha, titulo, descripcion, seccion,
+    completado, id) ordenadas por fecha. Los cambios se hacen con el lock de la agenda tomado.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._seen = {} # año -> identidad de su archivo en la última lectura (None si no existía)
+
+    def path(self, year):
+        """Ruta del archivo de ``year``, o None si no hay."""
+        for extension in COMPRESSIONS:
+            path = os.path.join(self.directory, f"{year}.txt.{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def years(self):
+        """Años con archivo, en orden."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted({int(match.group(1)) for match in map(_ARCHIVE_NAME.fullmatch, names) if match})
+
+    def _identity(self, year):
+        path = self.path(year)
+        return file_identity(path) if path else None
+
+    @staticmethod
+    def _read_rows(path):
+        extension = path.rsplit(".", 1)[1]
+        try:
+            with COMPRESSIONS[extension].open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = parse_task_line(line)
+                    if row is not None and row[5] is not None:
+                        yield row
+        except (EOFError, lzma.LZMAError, UnicodeDecodeError) as e: # gzip.BadGzipFile ya es un IOError
+            raise StorageError(f"El archivo histórico {path} está dañado: {e}") from e
+
+    # --- Lectura ---
+
+    def was_read(self, year):
+        return year in self._seen
+
+    def read_year(self, year):
+        """Tareas archivadas de ``year`` como {fecha: [Task]} ({} si no tiene archivo)."""
+        # La identidad se toma antes de leer: si otro proceso lo reescribe, ``changed`` lo detecta
+        self._seen[year] = self._identity(year)
+        path = self.path(year)
+        tasks_by_date, sections = {}, {}
+        if path is None:
+            return tasks_by_date
+        for date_str, title, description, section_name, completed, task_id in self._read_rows(path):
+            section = sections.get(section_name)
+            if section is None:
+                section = sections[section_name] = Section(section_name)
+            task = Task(title, description, section, task_id)
+            task.completed = completed
+            tasks_by_date.setdefault(date_str, []).append(task)
+        return tasks_by_date
+
+    def changed(self):
+        """Años ya leídos cuyo archivo cambió desde entonces (otro proceso archivó o recuperó tareas)."""
+        return [year for year, identity in self._seen.items() if self._identity(year) != identity]
+
+    def iter_rows(self, start=None, end=None):
+        """Recorre en streaming las filas archivadas entre ``start`` y ``end`` (YYYY-MM-DD, incluidas)."""
+        for year in self.years():
+            if (start is not None and year < int(start[:4])) or (end is not None and year > int(end[:4])):
+                continue
+            yield from rows_in_range(self._read_rows(self.path(year)), start, end)
+
+    # --- Escritura ---
+
+    def add(self, rows, compression='gz'):
+        """Añade filas a los archivos de sus años (las de un id ya archivado lo sustituyen)."""
+        by_year = {}
+        for row in rows:
+            by_year.setdefault(int(row[0][:4]), []).append(row)
+        for year, new_rows in by_year.items():
+            path = self.path(year)
+            ids = {row[5] for row in new_rows}
+            kept = [row for row in self._read_rows(path) if row[5] not in ids] if path else []
+            # sorted es estable: dentro de cada fecha, las ya archivadas van primero
+            self._write(year, path or os.path.join(self.directory, f"{year}.txt.{compression}"),
+                        sorted(kept + new_rows, key=lambda row: row[0]))
+
+    def remove(self, year, task_ids):
+        """Quita del archivo de ``year`` las tareas con esos ids (vuelven al almacenamiento principal)."""
+        path = self.path(year)
+        if path is None:
+            return
+        rows = [row for row in self._read_rows(path) if row[5] not in task_ids]
+        if rows:
+            self._write(year, path, rows)
+        else:
+            os.remove(path)
+            self._note_write(year)
+
+    def _write(self, year, path, rows):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        data = "\n".join(format_task_line(*row) for row in rows).encode('utf-8')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(COMPRESSIONS[path.rsplit(".", 1)[1]].compress(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._note_write(year)
+
+    def _note_write(self, year):
+        # Un cambio propio no cuenta para ``changed``: el calendario ya lo refleja
+        if year in self._seen:
+            self._seen[year] = self._identity(year)
@@ -0,0 +1,375 @@
+"""
+Snapshot binario de la agenda (archivos .agb), legible con ``mmap``.
+
+Disposición (little-endian, versión 2):
+
+    cabecera      HEADER: firma, versión, seq, número de tareas, de textos y de fechas,
+                  desplazamientos y próximo id de tarea libre
+    textos        (textos + 1) desplazamientos u32 dentro del bloque UTF-8, y el bloque con los
+                  textos separados por NUL (títulos, descripciones y secciones, sin repetir)
+    tareas        20 bytes por tarea, ordenadas por fecha: ordinal de la fecha, título,
+                  descripción y sección (índices de texto; el bit alto de la sección es
+                  "completada") e id de la tarea
+    índice        por fecha: ordinal, primera tarea y número de tareas, ordenado por fecha
+
+La versión 1 no tenía ids (16 bytes por tarea y sin próximo id): se sigue leyendo, y cada tarea
+recibe como id su posición más uno, como las líneas sin id del formato de texto.
+
+Los textos se guardan en el orden en que aparecen por primera vez, así que los de un mes quedan
+juntos: cargar un mes solo toca las páginas de su tramo del índice, de sus tareas y de sus textos.
+La carga completa decodifica el bloque de textos de una vez y recorre las tareas con ``iter_unpack``.
+
+Conversión con tasks.txt (en ambos sentidos, incluidos los cambios pendientes del diario):
+
+    python -m agenda.binary_store ../tasks.txt ../tasks.agb
+    python -m agenda.binary_store ../tasks.agb ../tasks.txt
+"""
+
+import array
+import bisect
+import datetime
+import gc
+import mmap
+import os
+import struct
+import sys
+
+from agenda.calendar import Calendar
+from agenda.sections import Section
+from agenda.storage import (BINARY_EXTENSION, SIDECAR_SUFFIXES, SQLITE_EXTENSIONS, TEXT_SNAPSHOT, LoadReport,
+                            StorageError, copy_sidecars, open_store, sidecar_paths, snapshot_rows)
+from agenda.tasks import Task
+from agenda.text_store import TextTaskStore
+
+MAGIC = b"AGENDAB\0"
+VERSION = 2
+SIGNATURE = struct.Struct("<8sH")
+# firma, versión, reservado, seq, tareas, textos, fechas, desplazamientos de textos, bloque, tareas,
+# índice y próximo id
+HEADER = struct.Struct("<8sHHQQIIQQQQQ")
+HEADER_V1 = struct.Struct("<8sHHQQIIQQQQ")
+RECORD = struct.Struct("<IIIII")
+RECORD_V1 = struct.Struct("<IIII")
+DATE_ENTRY = struct.Struct("<III")
+STRING_OFFSET = struct.Struct("<I")
+COMPLETED_BIT = 1 << 31
+
+
+class _Header:
+    __slots__ = ('version', 'seq', 'task_count', 'string_count', 'date_count', 'offsets_at', 'blob_at',
+                 'records_at', 'index_at', 'next_id', 'record')
+
+    def __init__(self, mm, path):
+        if len(mm) < SIGNATURE.size:
+            raise StorageError(f"{path} no es una agenda binaria (archivo demasiado corto).")
+        magic, self.version = SIGNATURE.unpack_from(mm)
+        if magic != MAGIC:
+            raise StorageError(f"{path} no es una agenda binaria.")
+        if self.version not in (1, VERSION):
+            raise StorageError(
+                f"{path} usa la versión {self.version} del formato binario (se admiten la 1 y la {VERSION}).")
+        header = HEADER if self.version == VERSION else HEADER_V1
+        if len(mm) < header.size:
+            raise StorageError(f"{path} no es una agenda binaria (archivo demasiado corto).")
+        fields = header.unpack_from(mm)
+        (self.seq, self.task_count, self.string_count, self.date_count,
+         self.offsets_at, self.blob_at, self.records_at, self.index_at) = fields[3:11]
+        if self.version == VERSION:
+            self.next_id = fields[11]
+            self.record = RECORD
+        else:
+            self.next_id = self.task_count + 1
+            self.record = RECORD_V1
+
+    def records(self, data, first):
+        """
+        (ordinal, título, descripción, sección, id) de los registros de ``data``, que empiezan en la
+        tarea número ``first``. En la versión 1 el id es la posición de la tarea más uno.
+        """
+        if self.version == VERSION:
+            return RECORD.iter_unpack(data)
+        return ((*fields, task_id) for task_id, fields in enumerate(RECORD_V1.iter_unpack(data), first + 1))
+
+
+def _open_map(path):
+    """Abre el archivo proyectado en memoria. None si está vacío (no se puede proyectar)."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        # El mapa sigue siendo válido tras cerrar el archivo, y aunque otro proceso lo reemplace
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _month_ordinals(date_prefix):
+    """Ordinales del primer día del mes de ``date_prefix`` ("YYYY-MM-") y del siguiente."""
+    year, month = int(date_prefix[:4]), int(date_prefix[5:7])
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return datetime.date(year, month, 1).toordinal(), datetime.date(next_year, next_month, 1).toordinal()
+
+
+class _IndexOrdinals:
+    """Vista de solo lectura de los ordinales del índice de fechas, para ``bisect`` sin leer el índice entero."""
+
+    def __init__(self, mm, header):
+        self.mm = mm
+        self.index_at = header.index_at
+        self.date_count = header.date_count
+
+    def __len__(self):
+        return self.date_count
+
+    def __getitem__(self, position):
+        return DATE_ENTRY.unpack_from(self.mm, self.index_at + position * DATE_ENTRY.size)[0]
+
+
+class BinarySnapshotFormat:
+    """Formato de snapshot binario, con la misma interfaz que ``storage.TextSnapshotFormat``."""
+
+    def read(self, path, date_prefix=None, progress=None):
+        mm = _open_map(path)
+        if mm is None:
+            return {}, LoadReport()
+        with mm:
+            header = _Header(mm, path)
+            report = LoadReport()
+            report.seq = header.seq
+            report.next_id = header.next_id
+            if date_prefix is None:
+                tasks_by_date = self._read_all(mm, header, progress)
+            else:
+                tasks_by_date = self._read_month(mm, header, date_prefix)
+            report.loaded = sum(map(len, tasks_by_date.values()))
+        return tasks_by_date, report
+
+    def _read_all(self, mm, header, progress):
+        strings = mm[header.blob_at:header.records_at].decode('utf-8').split('\0')
+        sections = {}
+        tasks_by_date = {}
+        append = None
+        current = None
+        step = max(header.task_count // 64, 1) # Avisos de progreso
+        # Las tareas están ordenadas por fecha: basta con detectar el cambio de ordinal, sin usar el índice
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for start in range(0, header.task_count, step):
+                end = min(start + step, header.task_count)
+                size = header.record.size
+                view = mm[header.records_at + start * size:header.records_at + end * size]
+                for ordinal, title, description, section_id, task_id in header.records(view, start):
+                    if ordinal != current:
+                        current = ordinal
+                        tasks = tasks_by_date[datetime.date.fromordinal(ordinal).isoformat()] = []
+                        append = tasks.append
+                    section_name_id = section_id & ~COMPLETED_BIT
+                    section = sections.get(section_name_id)
+                    if section is None:
+                        section = sections[section_name_id] = Section(strings[section_name_id])
+                    task = Task(strings[title], strings[description], section, task_id)
+                    if section_id & COMPLETED_BIT:
+                        task.completed = True
+                    append(task)
+                if progress is not None:
+                    progress(end / header.task_count)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return tasks_by_date
+
+    def _read_month(self, mm, header, date_prefix):
+        first_ordinal, next_ordinal = _month_ordinals(date_prefix)
+        ordinals = _IndexOrdinals(mm, header)
+        lo = bisect.bisect_left(ordinals, first_ordinal)
+        hi = bisect.bisect_left(ordinals, next_ordinal)
+        tasks_by_date = {}
+        strings = {}
+        sections = {}
+
+        def string(string_id):
+            value = strings.get(string_id)
+            if value is None:
+                start, = STRING_OFFSET.unpack_from(mm, header.offsets_at + string_id * STRING_OFFSET.size)
+                end, = STRING_OFFSET.unpack_from(mm, header.offsets_at + (string_id + 1) * STRING_OFFSET.size)
+                value = strings[string_id] = mm[header.blob_at + start:header.blob_at + end - 1].decode('utf-8')
+            return value
+
+        for position in range(lo, hi):
+            ordinal, first, count = DATE_ENTRY.unpack_from(mm, header.index_at + position * DATE_ENTRY.size)
+            tasks = tasks_by_date[datetime.date.fromordinal(ordinal).isoformat()] = []
+            start = header.records_at + first * header.record.size
+            data = mm[start:start + count * header.record.size]
+            for _, title, description, section_id, task_id in header.records(data, first):
+                section_name_id = section_id & ~COMPLETED_BIT
+                section = sections.get(section_name_id)
+                if section is None:
+                    section = sections[section_name_id] = Section(string(section_name_id))
+                task = Task(string(title), string(description), section, task_id)
+                if section_id & COMPLETED_BIT:
+                    task.completed = True
+                tasks.append(task)
+        return tasks_by_date
+
+    def _read_header(self, path):
+        """Cabecera del archivo, o None si no existe o está vacío."""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        return _Header(data, path) if data else None
+
+    def read_seq(self, path):
+        header = self._read_header(path)
+        return 0 if header is None else header.seq
+
+    def read_next_id(self, path):
+        header = self._read_header(path)
+        return 1 if header is None else header.next_id
+
+    def in_date_order(self, path):
+        return True # Siempre se escribe desde un calendario, ordenado por fecha
+
+    def iter_rows(self, path, report=None):
+        """Recorre las tareas en orden de fecha sin decodificar todos los textos a la vez."""
+        # El archivo se proyecta ya (como el de texto se abre): otro proceso puede reemplazarlo después
+        mm = _open_map(path)
+        return iter(()) if mm is None else self._iter_mapped_rows(mm, path)
+
+    def _iter_mapped_rows(self, mm, path):
+        with mm:
+            header = _Header(mm, path)
+            offsets = array.array('I', mm[header.offsets_at:header.blob_at])
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+
+            def string(string_id):
+                return mm[header.blob_at + offsets[string_id]:header.blob_at + offsets[string_id + 1] - 1].decode('utf-8')
+
+            for ordinal, first, count in DATE_ENTRY.iter_unpack(
+                    mm[header.index_at:header.index_at + header.date_count * DATE_ENTRY.size]):
+                date_str = datetime.date.fromordinal(ordinal).isoformat()
+                start = header.records_at + first * header.record.size
+                data = mm[start:start + count * header.record.size]
+                for _, title, description, section_id, task_id in header.records(data, first):
+                    yield (date_str, string(title), string(description), string(section_id & ~COMPLETED_BIT),
+                           bool(section_id & COMPLETED_BIT), task_id)
+
+    def write(self, path, rows, seq, next_id):
+        """Escribe (con fsync) el snapshot. Las filas se ordenan por fecha conservando el orden dentro de cada una."""
+        rows = sorted(rows, key=lambda row: row[0])
+        string_ids = {}
+        strings = []
+
+        def intern(value):
+            string_id = string_ids.get(value)
+            if string_id is None:
+                string_id = string_ids[value] = len(strings)
+                strings.append(value.replace('\0', '')) # NUL separa los textos
+            return string_id
+
+        records = bytearray(len(rows) * RECORD.size)
+        index = []
+        ordinals = {}
+        for position, (date_str, title, description, section_name, completed, task_id) in enumerate(rows):
+            ordinal = ordinals.get(date_str)
+            if ordinal is None:
+                try:
+                    ordinal = ordinals[date_str] = datetime.date.fromisoformat(date_str).toordinal()
+                except ValueError:
+                    raise StorageError(f"Fecha inválida en la agenda: {date_str!r}") from None
+                index.append([ordinal, position, 0])
+            index[-1][2] += 1
+            section_id = intern(section_name)
+            if completed:
+                section_id |= COMPLETED_BIT
+            RECORD.pack_into(records, position * RECORD.size, ordinal, intern(title), intern(description), section_id,
+                             task_id)
+
+        blob = "\0".join(strings).encode('utf-8') + b"\0" if strings else b""
+        if len(blob) >= 1 << 32 or len(strings) >= COMPLETED_BIT or next_id > 1 << 32:
+            raise StorageError("La agenda es demasiado grande para el formato binario.")
+        offsets = array.array('I', [0])
+        for value in strings:
+            offsets.append(offsets[-1] + len(value.encode('utf-8')) + 1)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+
+        offsets_at = HEADER.size
+        blob_at = offsets_at + len(offsets) * STRING_OFFSET.size
+        records_at = blob_at + len(blob)
+        index_at = records_at + len(records)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, seq, len(rows), len(strings), len(index),
+                                offsets_at, blob_at, records_at, index_at, next_id))
+            f.write(offsets.tobytes())
+            f.write(blob)
+            f.write(records)
+            f.write(b"".join(DATE_ENTRY.pack(*entry) for entry in index))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+BINARY_SNAPSHOT = BinarySnapshotFormat()
+
+
+class BinaryTaskStore(TextTaskStore):
+    """
+    Backend con snapshot binario (.agb) y el mismo diario de cambios que el de texto: solo cambia
+    el formato del snapshot que escriben las compactaciones y que se lee al cargar.
+    """
+
+    snapshot_format = BINARY_SNAPSHOT
+
+
+def convert_snapshot(source_path, target_path):
+    """
+    Convierte una agenda de texto a binaria o al revés (según la extensión de ``target_path``),
+    incluidos los cambios pendientes del diario de origen y copias de su archivo histórico, reglas
+    de repetición y feeds. Devuelve el número de tareas (sin las archivadas). Falla si el destino
+    o alguno de esos archivos ya existe.
+    """
+    for path in (source_path, target_path):
+        if os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS:
+            raise StorageError(f"{path}: solo se convierten agendas de texto o .agb "
+                               "(para SQLite, use python -m agenda.sqlite_store).")
+    if os.path.exists(target_path):
+        raise StorageError(f"{target_path} ya existe.")
+    sidecars = sidecar_paths(source_path, target_path)
+    if os.path.splitext(target_path)[1].lower() == BINARY_EXTENSION:
+        target_format = BINARY_SNAPSHOT
+    else:
+        target_format = TEXT_SNAPSHOT
+
+    # Se carga entero (en vez de recorrerlo con ``iter_rows``) para conservar los ids y el próximo id libre
+    source = open_store(source_path)
+    calendar = Calendar(2000, 1)
+    try:
+        source.load_all(calendar)
+        next_id = source.journal.next_id
+    finally:
+        source.close()
+    rows = snapshot_rows(calendar)
+    del calendar
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    try:
+        target_format.write(tmp_path, rows, 0, next_id)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    copy_sidecars(sidecars) # Los ids se conservan: siguen valiendo con el snapshot nuevo
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # Uso: python -m agenda.binary_store tasks.txt tasks.agb  (o tasks.agb tasks.txt)
+    if len(sys.argv) != 3:
+        sys.exit("Uso: python -m agenda.binary_store <origen> <destino>")
+    try:
+        converted = convert_snapshot(sys.argv[1], sys.argv[2])
+    except StorageError as e:
+        sys.exit(f"Error: {e}")
+    print(f"{converted} tareas convertidas a {sys.argv[2]}")
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(sys.argv[2] + suffix):
+            print(f"Copiado {sys.argv[2] + suffix}")
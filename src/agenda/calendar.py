@@ -1,18 +1,43 @@
+import bisect
 import calendar
 import datetime
 
+from agenda.aggregates import CalendarAggregates
+from agenda.month_view import MONTH_NAMES
+
+
+def _date_key(value):
+    """Normaliza una fecha (datetime.date o cadena YYYY-MM-DD) a la clave interna YYYY-MM-DD."""
+    if isinstance(value, datetime.date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
 class Calendar:
     def __init__(self, year, month_num):  # Cambiado a month_num
         self.year = year
         self.month_num = month_num # Almacena el número del mes
         self.days = self.get_days_in_month()
         self.tasks = {}  # Diccionario para almacenar tareas por fecha
+        # Índice ordenado de las fechas con tareas. Las claves YYYY-MM-DD ordenan igual
+        # que cronológicamente, así que basta con bisect sobre las cadenas.
+        self._dates = []
+        # Totales por día y por mes para las insignias y estadísticas, sin recorrer ``tasks``
+        self.aggregates = CalendarAggregates(self)
+        # Versiones para las vistas de mes: cambian al crear o eliminar fechas, o al sustituir todo
+        self._generation = 0
+        self._month_versions = {} # "YYYY-MM" -> número de cambios de fechas del mes
+        # Índice id de tarea -> fecha, para encontrar una tarea por su id sin recorrer el historial.
+        # Se construye con la primera búsqueda por id y después se mantiene en cada cambio.
+        self._id_dates = None
+        # Tareas de los años archivados que se están mostrando (agenda.archive): van al final de
+        # cada fecha y se conservan cuando ``replace_tasks`` sustituye las demás
+        self._archives = {} # año -> {fecha: [tareas archivadas]}
+        self.archived_ids = {} # id -> año, de las tareas archivadas presentes en ``tasks``
 
     def get_month_name(self):
         # Asegúrate de que month_num sea válido
-        nombres_meses = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
         if 1 <= self.month_num <= 12:
-            return nombres_meses[self.month_num]
+            return MONTH_NAMES[self.month_num]
         return "Mes Desconocido"
 
     def get_days_in_month(self):
@@ -33,8 +58,182 @@ class Calendar:
         """Añade una tarea a una fecha específica. Asume formato YYYY-MM-DD."""
         if date_str not in self.tasks:
             self.tasks[date_str] = []
+            bisect.insort(self._dates, date_str)
+            self._bump_month(date_str)
         self.tasks[date_str].append(task)
+        if self._id_dates is not None and task.id is not None:
+            self._id_dates[task.id] = date_str
+        if self.aggregates.months: # Sin meses calculados (carga inicial) no hay nada que actualizar
+            self.aggregates.task_added(date_str, task)
+
+    def update_task(self, date_str, task, title=None, description=None, section=None, completed=None):
+        """Cambia los campos indicados de una tarea de ``date_str`` manteniendo los agregados."""
+        previous_section, previous_completed = task.section.name, task.completed
+        if title is not None:
+            task.title = title
+        if description is not None:
+            task.description = description
+        if section is not None:
+            task.section = section
+        if completed is not None:
+            task.set_completed(completed)
+        self.aggregates.task_changed(date_str, previous_section, previous_completed, task)
+
+    def remove_task(self, date_str, index):
+        """Elimina la tarea en la posición ``index`` de una fecha y devuelve la tarea eliminada."""
+        tasks_on_date = self.tasks[date_str]
+        task = tasks_on_date.pop(index)
+        # Si no quedan más tareas para esa fecha, eliminar la entrada completa
+        if not tasks_on_date:
+            del self.tasks[date_str]
+            del self._dates[bisect.bisect_left(self._dates, date_str)]
+            self._bump_month(date_str)
+        if self._id_dates is not None:
+            self._id_dates.pop(task.id, None)
+        self.aggregates.task_removed(date_str, task)
+        return task
+
+    def index_task(self, date_str, task):
+        """Registra en el índice de ids una tarea que recibió su id después de añadirse."""
+        if self._id_dates is not None and task.id is not None:
+            self._id_dates[task.id] = date_str
+
+    def find(self, task_id):
+        """Devuelve (fecha, tarea) de la tarea con ese id, o None. Solo recorre las tareas de su fecha."""
+        if self._id_dates is None:
+            self._id_dates = {task.id: date_str for date_str, tasks in self.tasks.items()
+                              for task in tasks if task.id is not None}
+        date_str = self._id_dates.get(task_id)
+        if date_str is None:
+            return None
+        for task in self.tasks[date_str]:
+            if task.id == task_id:
+                return date_str, task
+        return None
+
+    def position(self, date_str, task):
+        """
+        Posición de ``task`` en su fecha, o None si ya no está. Encuentra también la tarea con el
+        mismo id si se sustituyó por un objeto nuevo (al releer lo que guardó otro proceso).
+        """
+        tasks_on_date = self.tasks.get(date_str, ())
+        for index, candidate in enumerate(tasks_on_date):
+            if candidate is task:
+                return index
+        if task.id is not None:
+            for index, candidate in enumerate(tasks_on_date):
+                if candidate.id == task.id:
+                    return index
+        return None
+
+    def clear_tasks(self):
+        """Elimina todas las tareas del calendario, también las archivadas."""
+        self.tasks = {}
+        self._dates = []
+        self._id_dates = None
+        self._archives = {}
+        self.archived_ids = {}
+        self.aggregates.clear()
+        self._generation += 1
+
+    def replace_tasks(self, tasks_by_date):
+        """
+        Sustituye todas las tareas por un diccionario fecha -> lista, ordenando el índice una sola vez.
+        Las tareas archivadas que se estaban mostrando se vuelven a añadir.
+        """
+        self.tasks = tasks_by_date
+        self._dates = sorted(tasks_by_date)
+        self._id_dates = None # Se reconstruye con la próxima búsqueda por id
+        self.aggregates.clear() # Se recalculan por mes al consultarlos
+        self._generation += 1
+        self.archived_ids = {}
+        for year, archived in self._archives.items():
+            self._merge_archive(year, archived)
+
+    # --- Tareas archivadas ---
+
+    def attach_archive(self, year, tasks_by_date):
+        """Muestra las tareas archivadas de ``year`` (o sustituye las que ya se mostraban)."""
+        self.detach_archive(year)
+        if tasks_by_date:
+            self._archives[year] = tasks_by_date
+            self._merge_archive(year, tasks_by_date)
+
+    def _merge_archive(self, year, tasks_by_date):
+        for date_str, tasks in tasks_by_date.items():
+            present = {task.id for task in self.tasks.get(date_str, ())}
+            for task in tasks:
+                # Tras un cierre a mitad de archivar, la copia del almacenamiento principal es la que vale
+                if task.id not in present:
+                    self.add_task(date_str, task)
+                    self.archived_ids[task.id] = year
+
+    def detach_archive(self, year):
+        """Quita del calendario las tareas archivadas de ``year``."""
+        for date_str, tasks in self._archives.pop(year, {}).items():
+            for task in tasks:
+                if self.archived_ids.get(task.id) != year:
+                    continue
+                del self.archived_ids[task.id]
+                tasks_on_date = self.tasks[date_str]
+                self.remove_task(date_str, next(i for i, t in enumerate(tasks_on_date) if t is task))
+
+    def unarchive(self, date_str, task):
+        """La tarea deja de contar como archivada (sigue en el calendario). Devuelve el año de su archivo."""
+        year = self.archived_ids.pop(task.id)
+        archived = self._archives[year]
+        archived[date_str] = [t for t in archived[date_str] if t is not task]
+        if not archived[date_str]:
+            del archived[date_str]
+        return year
+
+    def completed_before(self, before):
+        """(fecha, tarea) de las tareas completadas anteriores a ``before`` (YYYY-MM-DD) que no están archivadas."""
+        return [(date_str, task) for date_str in self._dates[:bisect.bisect_left(self._dates, before)]
+                for task in self.tasks[date_str] if task.completed and task.id not in self.archived_ids]
+
+    def remove_completed_before(self, before):
+        """Quita las tareas de ``completed_before`` (ya se copiaron al archivo). Devuelve cuántas quitó."""
+        removed = self.completed_before(before)
+        for date_str, task in reversed(removed):
+            tasks_on_date = self.tasks[date_str]
+            self.remove_task(date_str, next(i for i, t in enumerate(tasks_on_date) if t is task))
+        return len(removed)
+
+    def _bump_month(self, date_str):
+        key = date_str[:7]
+        self._month_versions[key] = self._month_versions.get(key, 0) + 1
+
+    def month_version(self, year, month):
+        """Cambia cada vez que se crea o elimina una fecha del mes (las listas de tareas se modifican en su sitio)."""
+        return self._generation, self._month_versions.get(f"{year}-{month:02d}", 0)
 
     def get_tasks(self, date_str):
         """Obtiene las tareas de una fecha específica. Asume formato YYYY-MM-DD."""
-        return self.tasks.get(date_str, [])
\ No newline at end of file
+        return self.tasks.get(date_str, [])
+
+    def iter_tasks(self):
+        """Recorre (fecha, tareas) en orden cronológico sin volver a ordenar las claves."""
+        for date_str in self._dates:
+            yield date_str, self.tasks[date_str]
+
+    def get_tasks_in_range(self, start, end):
+        """
+        Devuelve una lista de (fecha, tareas) con las fechas entre ``start`` y ``end`` (ambas incluidas).
+        Acepta datetime.date o cadenas YYYY-MM-DD. Cuesta O(log n + fechas en el rango).
+        """
+        lo = bisect.bisect_left(self._dates, _date_key(start))
+        hi = bisect.bisect_right(self._dates, _date_key(end))
+        return [(date_str, self.tasks[date_str]) for date_str in self._dates[lo:hi]]
+
+    def iter_month(self, year, month):
+        """Recorre (fecha, tareas) de un mes concreto en orden cronológico."""
+        last_day = calendar.monthrange(year, month)[1]
+        return iter(self.get_tasks_in_range(datetime.date(year, month, 1), datetime.date(year, month, last_day)))
+
+    def month_task_mask(self, year, month):
+        """Mapa de bits de los días del mes con tareas: el bit ``d`` está activo si el día ``d`` tiene tareas."""
+        mask = 0
+        for date_str, _ in self.iter_month(year, month):
+            mask |= 1 << int(date_str[8:10])
+        return mask
\ No newline at end of file
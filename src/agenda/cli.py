@@ -0,0 +1,234 @@
+"""
+Línea de comandos de la agenda, sin interfaz gráfica (útil en servidores o para scripts).
+
+Uso (desde src/):
+    python -m agenda import tareas.csv
+    python -m agenda export copia.jsonl --from 2024-01-01 --to 2024-12-31
+    python -m agenda sync horario.ics   (vuelve a importar el feed: solo cambia lo que cambió)
+    python -m agenda list --from 2024-05-01 --to 2024-05-31
+    python -m agenda complete 2024-05-03 2 5
+    python -m agenda complete 2024-05-03 --section Escuela
+    python -m agenda stats
+    python -m agenda archive --days 365   (archiva las completadas de hace más de un año)
+    python -m agenda serve --port 8000   (API HTTP/JSON, necesita Flask)
+
+El archivo de datos es el mismo que usa la aplicación (``AGENDA_DATA_FILE`` o tasks.txt),
+o el indicado con ``--data``. Un archivo ``-`` significa la entrada o salida estándar.
+"""
+
+import argparse
+import contextlib
+import datetime
+import os
+import sys
+
+from agenda.archive import COMPRESSIONS, DEFAULT_HORIZON_DAYS, archive_cutoff
+from agenda.formats import FORMATS, detect_format, read_ics_entries, read_rows, write_rows
+from agenda.service import AgendaService
+from agenda.storage import LoadReport
+
+
+def parse_date(value):
+    """Acepta YYYY-MM-DD o DD-MM-YYYY (el formato que muestra la aplicación) y devuelve YYYY-MM-DD."""
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"fecha no válida: {value} (use YYYY-MM-DD)")
+
+
+@contextlib.contextmanager
+def open_text(path, mode):
+    """Abre un archivo de texto UTF-8, o stdin/stdout si ``path`` es ``-``."""
+    if path == "-":
+        yield sys.stdin if 'r' in mode else sys.stdout
+        return
+    # newline='': csv e iCalendar gestionan sus propios finales de línea
+    with open(path, mode, encoding='utf-8', newline='') as f:
+        yield f
+
+
+def cmd_import(service, args):
+    fmt = args.format or detect_format(args.file)
+    report = LoadReport()
+    with open_text(args.file, 'r') as f:
+        count = service.import_rows(read_rows(f, fmt, report))
+    print(f"{count} tareas importadas en {service.data_file}")
+    if report.malformed:
+        print(f"Se ignoraron {report.malformed} registros no válidos "
+              f"(el primero en la línea {report.first_malformed_line}).", file=sys.stderr)
+    return 0
+
+
+def cmd_export(service, args):
+    fmt = args.format or detect_format(args.file)
+    with open_text(args.file, 'w') as f:
+        # En iCalendar el UID sale del id de cada tarea
+        count = write_rows(f, fmt, service.iter_rows(args.start, args.end, with_ids=fmt == 'ics'))
+    if args.file != "-":
+        print(f"{count} tareas exportadas a {args.file}")
+    return 0
+
+
+def cmd_sync(service, args):
+    name = args.name or os.path.splitext(os.path.basename(args.file))[0]
+    if args.file == "-" and not args.name:
+        print("Error: al leer de la entrada estándar, indique el nombre del feed con --name.", file=sys.stderr)
+        return 1
+    report = LoadReport()
+    with open_text(args.file, 'r') as f:
+        result = service.sync_feed(name, read_ics_entries(f, report))
+    print(f"Feed '{name}': {result}")
+    if report.malformed:
+        print(f"Se ignoraron {report.malformed} entradas sin UID o no válidas "
+              f"(la primera en la línea {report.first_malformed_line}).", file=sys.stderr)
+    return 0
+
+
+def cmd_list(service, args):
+    current_date, position = None, 0
+    for date_str, title, description, section_name, completed in service.iter_rows(args.start, args.end):
+        # La posición dentro de la fecha es la que recibe ``complete``
+        if date_str != current_date:
+            current_date, position = date_str, 0
+        position += 1
+        if args.section is not None and section_name != args.section:
+            continue
+        if args.pending and completed:
+            continue
+        mark = "x" if completed else " "
+        print(f"{date_str}  {position:>3}  [{mark}] {title} ({section_name})")
+    return 0
+
+
+def cmd_complete(service, args):
+    try:
+        if args.positions:
+            tasks = [service.get_task(args.date, position) for position in args.positions]
+        else:
+            tasks = service.get_tasks(args.date)
+    except IndexError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.section is not None:
+        tasks = [task for task in tasks if task.section.name == args.section]
+    # Todas en un solo lote: un lock y una escritura
+    try:
+        with service.batch():
+            for task in tasks:
+                service.set_completed(args.date, task, not args.undo)
+    except LookupError as e: # Otro proceso eliminó la tarea mientras tanto
+        print(e, file=sys.stderr)
+        return 1
+    state = 'pendiente' if args.undo else 'completada'
+    for task in tasks:
+        print(f"'{task.title}' marcada como {state}.")
+    return 0
+
+
+def cmd_stats(service, args):
+    stats = service.stats(args.start, args.end)
+    print(f"Tareas:      {stats.total}")
+    if not stats.total:
+        return 0
+    print(f"Completadas: {stats.completed} ({stats.completed * 100 / stats.total:.1f}%)")
+    print(f"Pendientes:  {stats.pending}")
+    print(f"Fechas:      {stats.first_date} a {stats.last_date}")
+    print("Por sección:")
+    for section_name, count in stats.by_section.most_common():
+        print(f"  {section_name}: {count}")
+    return 0
+
+
+def cmd_archive(service, args):
+    before = args.before or archive_cutoff(args.days)
+    count = service.archive_completed(before, args.compression)
+    print(f"{count} tareas completadas anteriores al {before} archivadas en {service.archive.directory}")
+    return 0
+
+
+def cmd_serve(args):
+    try:
+        from agenda.api import serve # Flask solo hace falta para este comando
+    except ImportError as e:
+        print(f"Error: el servidor necesita Flask (pip install -r requirements.txt): {e}", file=sys.stderr)
+        return 1
+    # El servidor abre su propio servicio, con hilo de escritura
+    serve(args.data, host=args.host, port=args.port)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m agenda", description="Agenda sin interfaz gráfica.")
+    parser.add_argument("--data", default=os.environ.get("AGENDA_DATA_FILE", "tasks.txt"),
+                        help="archivo de tareas (.txt o .db); por defecto AGENDA_DATA_FILE o tasks.txt")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_range(command):
+        command.add_argument("--from", dest="start", type=parse_date, help="fecha inicial (incluida)")
+        command.add_argument("--to", dest="end", type=parse_date, help="fecha final (incluida)")
+
+    command = commands.add_parser("import", help="importa tareas desde CSV, JSON Lines o iCalendar")
+    command.add_argument("file", help="archivo a importar (- para la entrada estándar)")
+    command.add_argument("--format", choices=FORMATS, help="formato (por defecto, según la extensión)")
+    command.set_defaults(handler=cmd_import)
+
+    command = commands.add_parser("export", help="exporta tareas a CSV, JSON Lines o iCalendar")
+    command.add_argument("file", help="archivo de destino (- para la salida estándar)")
+    command.add_argument("--format", choices=FORMATS, help="formato (por defecto, según la extensión)")
+    add_range(command)
+    command.set_defaults(handler=cmd_export)
+
+    command = commands.add_parser("sync", help="sincroniza un calendario iCalendar por UID (importaciones repetidas)")
+    command.add_argument("file", help="archivo .ics del feed (- para la entrada estándar)")
+    command.add_argument("--name", help="nombre del feed (por defecto, el del archivo sin extensión)")
+    command.set_defaults(handler=cmd_sync)
+
+    command = commands.add_parser("list", help="muestra las tareas por fecha")
+    add_range(command)
+    command.add_argument("--section", help="solo las tareas de esta sección")
+    command.add_argument("--pending", action="store_true", help="solo las tareas sin completar")
+    command.set_defaults(handler=cmd_list)
+
+    command = commands.add_parser("complete", help="marca tareas de una fecha como completadas")
+    command.add_argument("date", type=parse_date, help="fecha de las tareas")
+    command.add_argument("positions", type=int, nargs="*",
+                         help="números de las tareas en esa fecha (columna de 'list'); sin números, todas")
+    command.add_argument("--section", help="solo las tareas de esta sección")
+    command.add_argument("--undo", action="store_true", help="marcarla de nuevo como pendiente")
+    command.set_defaults(handler=cmd_complete)
+
+    command = commands.add_parser("stats", help="resumen de tareas completadas y por sección")
+    add_range(command)
+    command.set_defaults(handler=cmd_stats)
+
+    command = commands.add_parser("archive", help="mueve las tareas completadas antiguas al archivo por años")
+    horizon = command.add_mutually_exclusive_group()
+    horizon.add_argument("--days", type=int, default=DEFAULT_HORIZON_DAYS,
+                         help=f"archiva las completadas de hace más de DAYS días (por defecto {DEFAULT_HORIZON_DAYS})")
+    horizon.add_argument("--before", type=parse_date, help="archiva las completadas anteriores a esta fecha")
+    command.add_argument("--compression", choices=list(COMPRESSIONS), default="gz",
+                         help="compresión de los archivos de años nuevos (gz o xz)")
+    command.set_defaults(handler=cmd_archive)
+
+    command = commands.add_parser("serve", help="sirve la agenda como API HTTP/JSON (necesita Flask)")
+    command.add_argument("--host", default="127.0.0.1", help="dirección (0.0.0.0 para toda la red local)")
+    command.add_argument("--port", type=int, default=8000)
+    command.set_defaults(handler=None)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "serve":
+            return cmd_serve(args)
+        service = AgendaService(args.data)
+        try:
+            return args.handler(service, args)
+        finally:
+            service.close()
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
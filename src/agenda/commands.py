@@ -0,0 +1,199 @@
+"""
+Cambios reversibles sobre la agenda (patrón comando) con historial para deshacer y rehacer.
+
+Cada cambio de la interfaz se expresa como un Command que sabe aplicarse y revertirse a
+través de AgendaService. ``Batch`` agrupa varios en una sola transacción (un lock, un
+``sync`` y una escritura) y se deshace de una vez. Los comandos guardan referencias a las
+tareas: deshacer una eliminación vuelve a añadir el mismo objeto, así los comandos
+anteriores del historial siguen apuntando a él.
+"""
+
+import collections
+
+
+class Command:
+    """Cambio reversible. ``apply`` puede llamarse de nuevo después de ``revert`` (rehacer)."""
+
+    label = "Cambio"
+
+    def apply(self, service):
+        raise NotImplementedError
+
+    def revert(self, service):
+        raise NotImplementedError
+
+
+class AddTask(Command):
+    label = "Añadir tarea"
+
+    def __init__(self, date_str, title, description, section_name):
+        self.date_str = date_str
+        self.fields = (title, description, section_name)
+        self.task = None
+
+    def apply(self, service):
+        if self.task is None:
+            self.task = service.add_task(self.date_str, *self.fields)
+        else:
+            service.restore_task(self.date_str, self.task)
+
+    def revert(self, service):
+        if not service.delete_task(self.date_str, self.task):
+            raise LookupError("La tarea ya no existe (se modificó o eliminó en otra ventana).")
+
+
+class AddRecurringTask(Command):
+    label = "Añadir tarea repetida"
+
+    def __init__(self, start, freq, title, description, section_name, **options):
+        self.args = (start, freq, title, description, section_name)
+        self.options = options
+        self.rule = None
+
+    def apply(self, service):
+        if self.rule is None:
+            self.rule = service.add_recurring_task(*self.args, **self.options)
+        else:
+            service.restore_series(self.rule)
+
+    def revert(self, service):
+        service.delete_series(self.rule)
+
+
+class EditTask(Command):
+    label = "Editar tarea"
+
+    def __init__(self, date_str, task, title, description, section_name):
+        self.date_str = date_str
+        self.task = task
+        self.fields = (title, description, section_name)
+        self.previous = (task.title, task.description, task.section.name)
+
+    def apply(self, service):
+        service.update_task(self.date_str, self.task, *self.fields)
+
+    def revert(self, service):
+        service.update_task(self.date_str, self.task, *self.previous)
+
+
+class SetCompleted(Command):
+    def __init__(self, date_str, task, completed):
+        self.date_str = date_str
+        self.task = task
+        self.completed = completed
+        self.previous = task.completed
+        self.label = "Completar tarea" if completed else "Marcar tarea como pendiente"
+
+    def apply(self, service):
+        service.set_completed(self.date_str, self.task, self.completed)
+
+    def revert(self, service):
+        service.set_completed(self.date_str, self.task, self.previous)
+
+
+class DeleteTask(Command):
+    """Elimina una tarea o una ocurrencia. Al deshacer, la tarea vuelve al final de su fecha."""
+
+    label = "Eliminar tarea"
+
+    def __init__(self, date_str, task):
+        self.date_str = date_str
+        self.task = task
+
+    def apply(self, service):
+        if not service.delete_task(self.date_str, self.task):
+            raise LookupError("La tarea ya no existe (se modificó o eliminó en otra ventana).")
+
+    def revert(self, service):
+        service.restore_task(self.date_str, self.task)
+
+
+class DeleteSeries(Command):
+    label = "Eliminar tarea repetida"
+
+    def __init__(self, rule):
+        self.rule = rule
+
+    def apply(self, service):
+        service.delete_series(self.rule)
+
+    def revert(self, service):
+        service.restore_series(self.rule)
+
+
+class Batch(Command):
+    """Varios comandos como uno solo: si uno falla, se revierten los ya aplicados."""
+
+    def __init__(self, commands, label=None):
+        self.commands = list(commands)
+        self.label = label or f"{len(self.commands)} cambios"
+
+    def apply(self, service):
+        self._run(service, self.commands, 'apply', 'revert')
+
+    def revert(self, service):
+        self._run(service, self.commands[::-1], 'revert', 'apply')
+
+    @staticmethod
+    def _run(service, commands, forward, backward):
+        done = []
+        with service.batch():
+            try:
+                for command in commands:
+                    getattr(command, forward)(service)
+                    done.append(command)
+            except Exception:
+                for command in reversed(done):
+                    getattr(command, backward)(service)
+                raise
+
+
+class CommandHistory:
+    """
+    Pilas de deshacer y rehacer de un AgendaService, con como mucho ``limit`` comandos cada una
+    (los más antiguos se descartan). Un comando que no puede deshacerse o rehacerse porque otro
+    proceso cambió sus tareas se descarta y el error se propaga.
+    """
+
+    def __init__(self, service, limit=100):
+        self.service = service
+        self._undo = collections.deque(maxlen=limit)
+        self._redo = collections.deque(maxlen=limit)
+
+    def execute(self, command):
+        """Aplica el comando en una transacción y lo añade al historial. Devuelve el comando."""
+        with self.service.batch():
+            command.apply(self.service)
+        self._undo.append(command)
+        self._redo.clear()
+        return command
+
+    def undo(self):
+        """Revierte el último comando. Devuelve el comando, o None si no hay nada que deshacer."""
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        with self.service.batch():
+            command.revert(self.service)
+        self._redo.append(command)
+        return command
+
+    def redo(self):
+        """Vuelve a aplicar el último comando deshecho. Devuelve el comando, o None si no hay ninguno."""
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        with self.service.batch():
+            command.apply(self.service)
+        self._undo.append(command)
+        return command
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
@@ -0,0 +1,66 @@
+"""
+Estado de los calendarios externos sincronizados por UID (p. ej. el horario del colegio).
+
+Por cada feed, ``<archivo de tareas>.feeds.json`` guarda UID -> [id de la tarea, huella de la
+entrada importada, completado según el feed]. Al volver a sincronizar, las entradas con la misma
+huella no se tocan: solo cambian las tareas de las entradas nuevas, modificadas o que ya no
+están en el feed.
+"""
+
+import hashlib
+import json
+
+from agenda.storage import file_identity, write_atomic
+
+
+def entry_digest(row):
+    """Huella de una fila (fecha, titulo, descripcion, seccion, completado) importada."""
+    return hashlib.blake2b("\x1f".join(map(str, row)).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class FeedReport:
+    """Resultado de una sincronización: tareas añadidas, cambiadas, eliminadas y sin cambios."""
+
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+
+    def __str__(self):
+        return (f"{self.added} nuevas, {self.updated} cambiadas, {self.deleted} eliminadas, "
+                f"{self.unchanged} sin cambios")
+
+
+class FeedBook:
+    """Entradas sincronizadas de cada feed, en un archivo JSON junto al de tareas."""
+
+    def __init__(self, path):
+        self.path = path
+        self.feeds = {} # nombre -> {uid: [id de la tarea, huella, completado]}
+        self._file_id = None # Identidad del archivo en la última lectura o escritura
+
+    def refresh(self):
+        """Vuelve a leer el archivo si otro proceso lo cambió."""
+        file_id = file_identity(self.path)
+        if file_id == self._file_id:
+            return
+        feeds = {}
+        if file_id is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                feeds = json.load(f)
+        self.feeds = feeds
+        self._file_id = file_id
+
+    def entries(self, name):
+        """Copia de las entradas del feed ``name``: {uid: [id de la tarea, huella, completado]}."""
+        return dict(self.feeds.get(name, {}))
+
+    def save(self, name, entries):
+        """Sustituye las entradas de ``name`` y escribe el archivo (un feed sin entradas se olvida)."""
+        if entries:
+            self.feeds[name] = entries
+        else:
+            self.feeds.pop(name, None)
+        write_atomic(self.path, json.dumps(self.feeds, ensure_ascii=False, separators=(',', ':')))
+        self._file_id = file_identity(self.path)
@@ -0,0 +1,76 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Lock exclusivo entre procesos sobre un archivo ``.lock`` (flock en POSIX, msvcrt en Windows).
+
+    Es reentrante y también excluye a los hilos del mismo proceso. Hay una sola instancia
+    por ruta: dos descriptores del mismo proceso sobre el mismo archivo se bloquearían entre sí.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __new__(cls, path):
+        path = os.path.abspath(path)
+        with cls._registry_lock:
+            lock = cls._registry.get(path)
+            if lock is None:
+                lock = super().__new__(cls)
+                lock.path = path
+                lock._thread_lock = threading.RLock()
+                lock._depth = 0
+                lock._fd = None
+                cls._registry[path] = lock
+            return lock
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError: # LK_LOCK se rinde tras unos segundos: seguir esperando
+                            pass
+            except OSError:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,290 @@
+"""
+Formatos de intercambio para importar y exportar tareas: CSV, JSON Lines e iCalendar (VTODO).
+
+Todos trabajan en streaming sobre tuplas (fecha, titulo, descripcion, seccion, completado):
+los lectores son generadores que procesan una línea o registro cada vez y los escritores
+consumen un iterable, así que el tamaño del archivo no está limitado por la memoria.
+
+En iCalendar la sección es la primera categoría (CATEGORIES) y el completado el estado (STATUS).
+Al exportar, el UID de cada tarea sale de su id (``task_uid``), así que es estable entre
+exportaciones; ``read_ics_entries`` lee un feed junto con sus UID para ``AgendaService.sync_feed``.
+"""
+
+import csv
+import datetime
+import json
+import os
+import re
+
+FORMATS = ('csv', 'jsonl', 'ics')
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.ics': 'ics',
+    '.ical': 'ics',
+}
+
+CSV_FIELDS = ['date', 'title', 'description', 'section', 'completed']
+
+UID_DOMAIN = "agenda-app"
+
+_TRUE_VALUES = {'true', '1', 'yes', 'si', 'sí', 'x'}
+_FALSE_VALUES = {'false', '0', 'no', ''}
+
+
+def detect_format(path):
+    """Deduce el formato a partir de la extensión del archivo."""
+    fmt = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"No se reconoce el formato de {path}; use --format ({', '.join(FORMATS)}).")
+    return fmt
+
+
+def normalize_row(date_str, title, description, section_name, completed):
+    """Valida y normaliza una fila importada. Lanza ValueError si no es válida."""
+    date_str = datetime.date.fromisoformat(date_str.strip()).isoformat()
+    if not title.strip():
+        raise ValueError("La tarea no tiene título.")
+    if isinstance(completed, str):
+        value = completed.strip().casefold()
+        if value in _TRUE_VALUES:
+            completed = True
+        elif value in _FALSE_VALUES:
+            completed = False
+        else:
+            raise ValueError(f"Valor de completado no válido: {completed}")
+    return date_str, title, description, section_name.strip() or "General", bool(completed)
+
+
+def _checked_row(number, raw, report):
+    """Fila normalizada, o None (contada en ``report``) si no es válida."""
+    try:
+        row = normalize_row(*raw)
+    except (TypeError, ValueError):
+        report.malformed += 1
+        if report.first_malformed_line is None:
+            report.first_malformed_line = number
+        return None
+    report.loaded += 1
+    return row
+
+
+def read_rows(f, fmt, report):
+    """
+    Lee filas de un archivo de texto abierto. Las filas no válidas se cuentan en ``report``
+    (un LoadReport) con su número de línea o registro y se omiten.
+    """
+    readers = {'csv': _read_csv, 'jsonl': _read_jsonl, 'ics': _read_ics}
+    for number, raw in readers[fmt](f):
+        row = _checked_row(number, raw, report)
+        if row is not None:
+            yield row
+
+
+def read_ics_entries(f, report):
+    """
+    Lee un feed iCalendar como pares (clave, fila). La clave es el UID, más el RECURRENCE-ID en
+    las instancias modificadas de un evento repetido. Las entradas sin UID o no válidas se cuentan
+    en ``report`` y se omiten.
+    """
+    for number, key, raw in _read_ics_components(f):
+        row = _checked_row(number, raw if key else None, report)
+        if row is not None:
+            yield key, row
+
+
+def task_uid(task_id):
+    """UID de iCalendar de la tarea con ese id."""
+    return f"{task_id}@{UID_DOMAIN}"
+
+
+def write_rows(f, fmt, rows):
+    """Escribe filas en un archivo de texto abierto. Devuelve cuántas se escribieron."""
+    writers = {'csv': _write_csv, 'jsonl': _write_jsonl, 'ics': _write_ics}
+    return writers[fmt](f, rows)
+
+
+# --- CSV ---
+
+def _read_csv(f):
+    reader = csv.DictReader(f)
+    missing = {'date', 'title'} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(missing))}")
+    for record in reader:
+        yield reader.line_num, (record['date'], record['title'], record.get('description') or '',
+                                record.get('section') or '', record.get('completed') or '')
+
+
+def _write_csv(f, rows):
+    writer = csv.writer(f)
+    writer.writerow(CSV_FIELDS)
+    count = 0
+    for date_str, title, description, section_name, completed in rows:
+        writer.writerow((date_str, title, description, section_name, 'true' if completed else 'false'))
+        count += 1
+    return count
+
+
+# --- JSON Lines ---
+
+def _read_jsonl(f):
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield number, (record['date'], record['title'], record.get('description', ''),
+                           record.get('section', ''), record.get('completed', False))
+        except (ValueError, KeyError, TypeError):
+            yield number, None # Se cuenta como fila mal formada
+
+
+def _write_jsonl(f, rows):
+    count = 0
+    for date_str, title, description, section_name, completed in rows:
+        record = {'date': date_str, 'title': title, 'description': description,
+                  'section': section_name, 'completed': completed}
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+# --- iCalendar (RFC 5545) ---
+
+def _ics_escape(value):
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ics_unescape(value):
+    if "\\" not in value:
+        return value # Lo habitual: nada que desescapar
+    result = []
+    chars = iter(value)
+    for ch in chars:
+        if ch == "\\":
+            escaped = next(chars, "")
+            result.append("\n" if escaped in ("n", "N") else escaped)
+        else:
+            result.append(ch)
+    return "".join(result)
+
+
+def _ics_fold(line):
+    """Parte las líneas de más de 75 octetos en líneas de continuación que empiezan con un espacio."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1 # No cortar un carácter UTF-8 por la mitad
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74 # El espacio inicial de la continuación cuenta como octeto
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_unfolded_lines(f):
+    """Devuelve (número de línea, línea lógica) uniendo las líneas de continuación."""
+    current, current_number = None, 0
+    for number, line in enumerate(f, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_number, current
+        current, current_number = line, number
+    if current is not None:
+        yield current_number, current
+
+
+def _ics_date(value):
+    """Convierte un valor DATE o DATE-TIME de iCalendar (20240131 o 20240131T090000Z) a YYYY-MM-DD."""
+    value = value.strip()
+    return f"{value[0:4]}-{value[4:6]}-{value[6:8]}"
+
+
+def _read_ics(f):
+    for number, _, raw in _read_ics_components(f):
+        yield number, raw
+
+
+def _read_ics_components(f):
+    """
+    Devuelve (número de línea, clave, datos) por cada VTODO o VEVENT, con la clave de
+    ``read_ics_entries`` (None si no tiene UID). Los cancelados (STATUS:CANCELLED) se omiten.
+    ValueError al final si el archivo se cortó antes de END:VCALENDAR (p. ej. una descarga a medias).
+    """
+    component, number, props, nested = None, 0, {}, 0
+    open_calendars = 0
+    for line_number, line in _ics_unfolded_lines(f):
+        name, _, value = line.partition(":")
+        name = name.partition(";")[0].upper()
+        value_upper = value.upper()
+        if component is None:
+            if value_upper == "VCALENDAR" and name in ("BEGIN", "END"):
+                open_calendars += 1 if name == "BEGIN" else -1
+            elif name == "BEGIN" and value_upper in ("VTODO", "VEVENT"):
+                component, number, props, nested = value_upper, line_number, {}, 0
+        elif name == "BEGIN":
+            nested += 1 # Subcomponente (p. ej. VALARM): sus propiedades no son de la tarea
+        elif nested:
+            if name == "END":
+                nested -= 1
+        elif name == "END" and value_upper == component:
+            component = None
+            status = props.get("STATUS", "").upper()
+            if status == "CANCELLED":
+                continue
+            key = props.get("UID")
+            if key is not None and "RECURRENCE-ID" in props:
+                key = f"{key}#{props['RECURRENCE-ID'].strip()}"
+            date_value = props.get("DTSTART") or props.get("DUE")
+            if date_value is None:
+                yield number, key, None
+            else:
+                completed = status == "COMPLETED" or "COMPLETED" in props
+                # La sección es la primera categoría (las comas escapadas forman parte del nombre)
+                section_name = _ics_unescape(re.split(r"(?<!\\),", props.get("CATEGORIES", ""))[0])
+                yield number, key, (_ics_date(date_value), props.get("SUMMARY", ""), props.get("DESCRIPTION", ""),
+                                    section_name, completed)
+        elif name in ("SUMMARY", "DESCRIPTION", "UID"):
+            props[name] = _ics_unescape(value)
+        elif name in ("DTSTART", "DUE", "STATUS", "COMPLETED", "CATEGORIES", "RECURRENCE-ID"):
+            props[name] = value
+    if open_calendars > 0 or component is not None:
+        raise ValueError("El archivo iCalendar está incompleto (falta END:VCALENDAR).")
+
+
+def _write_ics(f, rows):
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Agenda App//ES\r\n")
+    count = 0
+    for row in rows:
+        date_str, title, description, section_name, completed = row[:5]
+        count += 1
+        date_value = date_str.replace("-", "")
+        # Con el id (sexto elemento) el UID es estable y permite volver a sincronizar por UID
+        uid = task_uid(row[5]) if len(row) > 5 and row[5] is not None else f"{date_value}-{count}@{UID_DOMAIN}"
+        lines = [
+            "BEGIN:VTODO",
+            f"UID:{_ics_escape(uid)}",
+            f"DTSTAMP:{stamp}",
+            f"DUE;VALUE=DATE:{date_value}",
+            f"SUMMARY:{_ics_escape(title)}",
+        ]
+        if description:
+            lines.append(f"DESCRIPTION:{_ics_escape(description)}")
+        lines.append(f"CATEGORIES:{_ics_escape(section_name)}")
+        lines.append("STATUS:COMPLETED" if completed else "STATUS:NEEDS-ACTION")
+        lines.append("END:VTODO")
+        f.write("".join(_ics_fold(line) for line in lines))
+    f.write("END:VCALENDAR\r\n")
+    return count
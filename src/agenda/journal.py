@@ -0,0 +1,355 @@
+import json
+import os
+
+from agenda.calendar import Calendar
+from agenda.filelock import FileLock
+from agenda.sections import Section
+from agenda.storage import TEXT_SNAPSHOT, LoadReport, file_identity
+from agenda.tasks import Task
+
+
+def _same_tasks(tasks, other):
+    return len(tasks) == len(other) and all(
+        (a.id, a.title, a.description, a.section.name, a.completed)
+        == (b.id, b.title, b.description, b.section.name, b.completed)
+        for a, b in zip(tasks, other))
+
+
+class TaskJournal:
+    """
+    Diario de escritura anticipada (write-ahead log) para las tareas, compartible entre procesos.
+
+    Cada cambio (add/update/toggle/delete/archive) se añade como una línea JSON al final de
+    ``<snapshot>.journal`` (O(1) por cambio, sin reescribir el archivo) con un número de
+    secuencia ``seq`` creciente. Los registros se escriben con el lock de la agenda tomado y
+    después de ``sync``, que aplica antes los registros de otros procesos: así el orden del
+    diario es el orden real de los cambios y los ids que asigna ``record_add`` no se repiten.
+    Los registros identifican la tarea por su ``id``; los de diarios anteriores, por su
+    posición dentro de la fecha.
+    ``flush`` (en el hilo de escritura) hace el fsync y las compactaciones pendientes.
+
+    Compactación (recuperable ante cierres inesperados): el snapshot nuevo se escribe en un
+    archivo temporal con el número N del último registro incluido (en texto, la cabecera
+    ``#agenda seq=N``) y lo reemplaza de forma atómica; al
+    leer, los registros con ``seq <= N`` se ignoran. Después el diario se reescribe sin esos
+    registros conservando los posteriores, aunque los haya escrito otro proceso.
+    """
+
+    def __init__(self, snapshot_path, compact_threshold=256 * 1024, snapshot_format=TEXT_SNAPSHOT):
+        self.snapshot_path = snapshot_path
+        self.snapshot_format = snapshot_format
+        self.path = snapshot_path + ".journal"
+        self.tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        self.compact_threshold = compact_threshold
+        self.lock = FileLock(snapshot_path + ".lock") # Compartido con el servicio (misma instancia por ruta)
+        self.last_seq = 0 # Último registro aplicado o escrito por este proceso
+        self.offset = 0 # Bytes del diario abierto ya leídos o escritos
+        self._file = None # Diario abierto para añadir (sin búfer)
+        self._journal_id = None # (dispositivo, inodo) del diario abierto
+        self._snapshot_id = None # Identidad del snapshot en la última lectura o compactación
+        self._dirty = False # Hay registros sin fsync
+        self._pending_compaction = None # (filas, seq, offset, diario) de la copia del estado
+        self.date_prefix = None # Carga parcial: solo se aplican los registros de estas fechas
+        self.next_id = 1 # Próximo id de tarea libre (del snapshot y de los registros leídos)
+
+    # --- Carga y sincronización (con el lock tomado) ---
+
+    def load(self, calendar, date_prefix=None):
+        """
+        Carga el snapshot y aplica el diario. Devuelve el LoadReport del snapshot.
+        Con ``date_prefix`` (p. ej. "2025-01-") la carga es parcial: solo esas fechas, también en los ``sync`` siguientes.
+        """
+        self._recover_legacy()
+        self.date_prefix = date_prefix
+        self._snapshot_id = file_identity(self.snapshot_path)
+        if self._snapshot_id is not None:
+            tasks_by_date, report = self.snapshot_format.read(self.snapshot_path, date_prefix=date_prefix)
+        else:
+            tasks_by_date, report = {}, LoadReport()
+        self.last_seq = report.seq
+        self.next_id = report.next_id
+        calendar.replace_tasks(tasks_by_date) # Sustituye las tareas actuales y construye el índice de fechas
+
+        self._reopen()
+        self._replay(calendar) # Cambios posteriores al snapshot
+        return report
+
+    def adopt(self, calendar, tasks_by_date, report, snapshot_id):
+        """
+        Completa el calendario con un snapshot leído sin el lock (en otro hilo) cuya identidad
+        era ``snapshot_id``, aplicando encima el diario entero. Las listas de las fechas ya
+        cargadas que no cambian se conservan, así la interfaz sigue usando los mismos objetos.
+        Devuelve False si el snapshot se reemplazó desde entonces (hay que usar ``load``).
+        """
+        if file_identity(self.snapshot_path) != snapshot_id:
+            return False
+        self.date_prefix = None
+        self._snapshot_id = snapshot_id
+        self.last_seq = report.seq
+        self.next_id = report.next_id
+        full = Calendar(calendar.year, calendar.month_num)
+        full.replace_tasks(tasks_by_date)
+        self._reopen()
+        self._replay(full)
+
+        for date_str, tasks in calendar.tasks.items():
+            loaded = full.tasks.get(date_str)
+            if loaded is not None and _same_tasks(tasks, loaded):
+                full.tasks[date_str] = tasks
+        calendar.replace_tasks(full.tasks)
+        return True
+
+    def sync(self, calendar):
+        """
+        Aplica los registros que otros procesos añadieron desde la última lectura.
+        Con ``calendar`` None solo avanza la secuencia y el próximo id (para añadir registros sin cargar las tareas).
+        Si otro proceso compactó registros que este no había leído, recarga todo. Devuelve cuántos cambios aplicó.
+        """
+        snapshot_id = file_identity(self.snapshot_path)
+        if snapshot_id != self._snapshot_id:
+            self._snapshot_id = snapshot_id
+            snapshot_seq = self.snapshot_format.read_seq(self.snapshot_path)
+            if snapshot_seq > self.last_seq:
+                # Los registros intermedios ya no están en el diario: solo quedan en el snapshot
+                if calendar is not None:
+                    self.load(calendar, self.date_prefix)
+                    return 1
+                self.last_seq = snapshot_seq
+            if calendar is None:
+                # Sin cargar las tareas, los ids nuevos deben quedar también por encima de los del snapshot
+                self.next_id = max(self.next_id, self.snapshot_format.read_next_id(self.snapshot_path))
+
+        journal_id = file_identity(self.path)
+        if journal_id is None or journal_id[:2] != self._journal_id:
+            self._reopen() # Otro proceso reescribió el diario: se relee filtrando por seq
+        return self._replay(calendar)
+
+    def _reopen(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, 'ab', buffering=0)
+        st = os.fstat(self._file.fileno())
+        self._journal_id = (st.st_dev, st.st_ino)
+        self.offset = 0
+
+    def _replay(self, calendar):
+        applied = 0
+        valid_bytes = self.offset
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for raw in f:
+                try:
+                    if not raw.endswith(b"\n"):
+                        raise ValueError("Registro incompleto")
+                    record = json.loads(raw)
+                except ValueError:
+                    break # Registro truncado por un cierre inesperado: se descarta la cola
+                valid_bytes += len(raw)
+                # Los diarios anteriores a las secuencias no tienen ``seq``: van en orden
+                seq = record.get('seq', self.last_seq + 1)
+                if seq <= self.last_seq:
+                    continue # Ya incluido en el snapshot o escrito por este proceso
+                if record['op'] == 'add':
+                    # Los registros anteriores a los ids reciben el siguiente libre, igual en todos los procesos
+                    task_id = record.setdefault('id', self.next_id)
+                    self.next_id = max(self.next_id, task_id + 1)
+                if calendar is not None:
+                    self._apply(record, calendar)
+                self.last_seq = seq
+                applied += 1
+
+        # Recortar la cola dañada para que los nuevos registros no queden detrás de ella
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self.offset = valid_bytes
+        return applied
+
+    def _apply(self, record, calendar):
+        op = record['op']
+        if op == 'archive':
+            # Mismo estado en todos los procesos en este punto del diario: se quitan las mismas tareas
+            calendar.remove_completed_before(record['before'])
+            return
+        date_str = record['date']
+        if self.date_prefix is not None and not date_str.startswith(self.date_prefix):
+            return # Fecha fuera de la carga parcial
+
+        if op == 'add':
+            task = Task(record['title'], record['description'], Section(record['section']), record['id'])
+            task.set_completed(record['completed'])
+            calendar.add_task(date_str, task)
+            return
+
+        tasks_on_date = calendar.tasks.get(date_str, [])
+        if 'id' in record:
+            index = next((i for i, task in enumerate(tasks_on_date) if task.id == record['id']), -1)
+        else:
+            index = record['index']
+        if not 0 <= index < len(tasks_on_date):
+            return # Registro inconsistente con el snapshot, se ignora
+
+        task = tasks_on_date[index]
+        if op == 'update':
+            calendar.update_task(date_str, task, title=record['title'], description=record['description'],
+                                 section=Section(record['section']))
+        elif op == 'toggle':
+            calendar.update_task(date_str, task, completed=record['completed'])
+        elif op == 'delete':
+            calendar.remove_task(date_str, index)
+
+    def _recover_legacy(self):
+        """Integra una compactación interrumpida del formato anterior (.compacting/.compacted)."""
+        compacting_path = self.path + ".compacting"
+        compacted_path = self.path + ".compacted"
+        legacy_tmp_path = self.snapshot_path + ".tmp"
+        if os.path.exists(compacted_path):
+            # El snapshot temporal estaba completo: terminar el reemplazo
+            if os.path.exists(legacy_tmp_path):
+                os.replace(legacy_tmp_path, self.snapshot_path)
+            os.remove(compacted_path)
+            if os.path.exists(compacting_path):
+                os.remove(compacting_path)
+        elif os.path.exists(legacy_tmp_path):
+            os.remove(legacy_tmp_path)
+
+        if os.path.exists(compacting_path):
+            # El segmento sin compactar va delante del diario actual
+            with open(compacting_path, 'ab') as dst:
+                if os.path.exists(self.path):
+                    with open(self.path, 'rb') as src:
+                        dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(compacting_path, self.path)
+
+    # --- Registro de cambios (con el lock tomado y después de ``sync``) ---
+
+    def record_add(self, date_str, task):
+        """Registra una tarea nueva, asignándole el siguiente id libre si aún no tiene uno."""
+        task.id = self.record_add_row(date_str, task.title, task.description, task.section.name, task.completed,
+                                      task.id)
+
+    def record_add_row(self, date_str, title, description, section_name, completed, task_id=None):
+        """Registra una tarea (con un id nuevo si ``task_id`` es None). Devuelve su id."""
+        if task_id is None:
+            task_id = self.next_id
+        self.next_id = max(self.next_id, task_id + 1)
+        self._append({'op': 'add', 'date': date_str, 'id': task_id, 'title': title, 'description': description,
+                      'section': section_name, 'completed': completed})
+        return task_id
+
+    def record_update(self, date_str, task):
+        self._append({'op': 'update', 'date': date_str, 'id': task.id, 'title': task.title,
+                      'description': task.description, 'section': task.section.name})
+
+    def record_toggle(self, date_str, task):
+        self._append({'op': 'toggle', 'date': date_str, 'id': task.id, 'completed': task.completed})
+
+    def record_delete(self, date_str, task):
+        self._append({'op': 'delete', 'date': date_str, 'id': task.id})
+
+    def record_archive(self, before):
+        """Un solo registro para todas las tareas completadas anteriores a ``before`` que pasaron al archivo."""
+        self._append({'op': 'archive', 'before': before})
+
+    def _append(self, record):
+        if self._file is None:
+            self._reopen()
+        seq = self.last_seq + 1
+        record['seq'] = seq
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        start = self._file.seek(0, os.SEEK_END)
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[self._file.write(view):]
+        except OSError:
+            # No dejar un registro a medias delante de los siguientes
+            try:
+                self._file.truncate(start)
+            except OSError:
+                pass
+            raise
+        self.last_seq = seq
+        self.offset += len(data)
+        self._dirty = True
+
+    # --- Escritura y compactación ---
+
+    def has_records(self):
+        """Indica si el diario en disco tiene registros (posiblemente no incluidos en el snapshot)."""
+        journal_id = file_identity(self.path)
+        return journal_id is not None and journal_id[2] > 0
+
+    def needs_compaction(self):
+        """Indica si el diario superó el umbral y no hay otra compactación pendiente."""
+        return self.offset >= self.compact_threshold and self._pending_compaction is None
+
+    def request_compaction(self, rows):
+        """
+        Solicita compactar el diario en un snapshot nuevo en el próximo ``flush``. Se llama con el
+        lock tomado: ``rows`` es una copia del estado que incluye hasta el registro ``last_seq``,
+        tuplas (fecha, titulo, descripcion, seccion, completado, id).
+        Una solicitud posterior reemplaza a la anterior, porque su copia ya incluye todos los cambios.
+        """
+        self._pending_compaction = (rows, self.last_seq, self.next_id, self.offset, self._journal_id)
+
+    def flush(self):
+        """Hace fsync de los registros escritos y, si se solicitó, compacta el diario."""
+        with self.lock:
+            if self._dirty:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+            compaction, self._pending_compaction = self._pending_compaction, None
+        if compaction:
+            try:
+                self._compact(*compaction)
+            except OSError:
+                with self.lock:
+                    if self._pending_compaction is None:
+                        self._pending_compaction = compaction # Reintentar en el próximo flush
+                raise
+
+    def _compact(self, rows, seq, next_id, offset, journal_id):
+        # El snapshot se escribe sin el lock: los demás procesos siguen trabajando mientras tanto
+        try:
+            self.snapshot_format.write(self.tmp_path, rows, seq, next_id)
+
+            with self.lock:
+                if self.snapshot_format.read_seq(self.snapshot_path) >= seq:
+                    return # Otro proceso ya compactó hasta un punto posterior
+                os.replace(self.tmp_path, self.snapshot_path) # Punto de confirmación
+                self._snapshot_id = file_identity(self.snapshot_path)
+                current_id = file_identity(self.path)
+                if current_id is not None and current_id[:2] == journal_id:
+                    # Si otro proceso reescribió el diario, los registros ya incluidos se filtran por seq al leer
+                    self._drop_journal_prefix(offset)
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def _drop_journal_prefix(self, offset):
+        """Reescribe el diario sin sus primeros ``offset`` bytes, ya incluidos en el snapshot."""
+        journal_tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(self.path, 'rb') as src, open(journal_tmp_path, 'wb') as dst:
+            src.seek(offset)
+            while True:
+                block = src.read(1 << 20)
+                if not block:
+                    break
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(journal_tmp_path, self.path)
+
+        consumed = self.offset - offset
+        self._reopen()
+        self.offset = consumed
+
+    def close(self):
+        """Escribe lo pendiente y cierra el diario."""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
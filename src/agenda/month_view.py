@@ -0,0 +1,59 @@
+import calendar
+import collections
+
+MONTH_NAMES = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto",
+               "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+
+class MonthView:
+    """
+    Vista de un mes sobre el Calendar de la agenda: la matriz de semanas (se calcula una vez)
+    y las tareas de cada día. Las tareas no se copian: ``tasks_by_day`` devuelve las listas
+    del Calendar y solo se recalcula si se creó o eliminó alguna fecha de este mes.
+    """
+
+    __slots__ = ('year', 'month', 'weeks', 'last_day', '_tasks_by_day', '_tasks_version')
+
+    def __init__(self, year, month):
+        self.year = year
+        self.month = month
+        # Semanas de lunes a domingo; 0 representa un día fuera del mes
+        self.weeks = calendar.monthcalendar(year, month)
+        self.last_day = calendar.monthrange(year, month)[1]
+        self._tasks_by_day = None
+        self._tasks_version = None
+
+    @property
+    def name(self):
+        return MONTH_NAMES[self.month]
+
+    def date_str(self, day):
+        return f"{self.year}-{self.month:02d}-{day:02d}"
+
+    def tasks_by_day(self, task_calendar):
+        """Diccionario día -> lista de tareas del Calendar, solo con los días que tienen tareas."""
+        version = task_calendar.month_version(self.year, self.month)
+        if version != self._tasks_version:
+            self._tasks_by_day = {int(date_str[8:10]): tasks
+                                  for date_str, tasks in task_calendar.iter_month(self.year, self.month)}
+            self._tasks_version = version
+        return self._tasks_by_day
+
+
+class MonthViewCache:
+    """Caché LRU de MonthView por (año, mes): volver a un mes reciente reutiliza su vista."""
+
+    def __init__(self, size=24):
+        self.size = size
+        self._views = collections.OrderedDict()
+
+    def get(self, year, month):
+        key = (year, month)
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = MonthView(year, month)
+            if len(self._views) > self.size:
+                self._views.popitem(last=False) # El mes usado hace más tiempo
+        else:
+            self._views.move_to_end(key)
+        return view
@@ -0,0 +1,275 @@
+"""
+Instrumentación para diagnosticar tirones de la interfaz, desactivada por defecto.
+
+Se activa con la variable de entorno ``AGENDA_PROFILE`` (o ``python src/main.py --profile``):
+
+    AGENDA_PROFILE=perfil.json python src/main.py         # resumen y eventos en JSON
+    AGENDA_PROFILE=perfil.trace.json python src/main.py   # formato Chrome trace (chrome://tracing, Perfetto)
+    AGENDA_PROFILE_CAPTURE=cprofile:ver_tareas,tracemalloc:load_tasks
+
+Los eventos (intervalos de tiempo y contadores) se guardan en un búfer circular en memoria y
+se vuelcan al cerrar la aplicación o con F12. ``AGENDA_PROFILE_CAPTURE`` perfila con cProfile
+o tracemalloc la siguiente ejecución de cada intervalo indicado y la guarda junto al volcado.
+Desactivada, cada punto instrumentado cuesta una comprobación de un atributo.
+"""
+
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+DEFAULT_OUTPUT = "agenda-profile.json"
+CAPTURE_MODES = ('cprofile', 'tracemalloc')
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'args', 'start', 'capture')
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.capture = None
+
+    def __enter__(self):
+        # cProfile y tracemalloc se importan solo al capturar: no retrasan el arranque
+        mode = self.profiler.take_capture(self.name)
+        if mode == 'cprofile':
+            import cProfile
+            self.capture = cProfile.Profile()
+            self.capture.enable()
+        elif mode == 'tracemalloc':
+            import tracemalloc
+            self.capture = tracemalloc
+            tracemalloc.start(25)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if self.capture is not None:
+            self.profiler.save_capture(self.name, self.capture)
+        self.profiler.record('X', self.name, self.start, end - self.start, self.args)
+        return False
+
+
+class Profiler:
+    """
+    Registro de intervalos (``span``/``timed``) y contadores en un búfer circular de ``capacity``
+    eventos. Cada evento es una tupla (fase, nombre, inicio_ns, duración_ns, hilo, args), con la
+    fase de Chrome trace: 'X' para intervalos y 'C' para contadores.
+    """
+
+    def __init__(self, capacity=100_000):
+        self.enabled = False
+        self.output = None
+        self._events = collections.deque(maxlen=capacity)
+        self._captures = {} # nombre del intervalo -> modo, para su siguiente ejecución
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def enable(self, output=None, captures=()):
+        """Activa el registro. ``captures`` es una lista de (modo, nombre del intervalo)."""
+        self.enabled = True
+        self.output = output or DEFAULT_OUTPUT
+        for mode, name in captures:
+            self.capture(name, mode)
+
+    def configure_from_env(self, environ=os.environ):
+        """
+        Activa el registro si ``AGENDA_PROFILE`` está definida ("1" usa la ruta por defecto). Las
+        entradas de ``AGENDA_PROFILE_CAPTURE`` mal escritas se avisan y se omiten: se lee al arrancar
+        y un error en el diagnóstico no debe impedir abrir la aplicación.
+        """
+        output = environ.get("AGENDA_PROFILE")
+        if not output:
+            return
+        captures = []
+        for item in filter(None, (item.strip() for item in environ.get("AGENDA_PROFILE_CAPTURE", "").split(","))):
+            mode, _, name = item.partition(":")
+            if mode not in CAPTURE_MODES or not name:
+                print(f"Advertencia: AGENDA_PROFILE_CAPTURE: se omite '{item}' (use modo:intervalo, con modo "
+                      f"{' o '.join(CAPTURE_MODES)})", file=sys.stderr)
+                continue
+            captures.append((mode, name))
+        self.enable(None if output == "1" else output, captures)
+
+    # --- Registro ---
+
+    def span(self, name, **args):
+        """Context manager que mide un intervalo. Sin perfilado activo no hace nada."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def timed(self, name=None):
+        """Decorador que mide cada llamada como un intervalo (por defecto con el nombre de la función)."""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, span_name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def counter(self, name, **values):
+        """Registra valores numéricos instantáneos (p. ej. retraso del bucle de eventos)."""
+        if self.enabled:
+            self.record('C', name, time.perf_counter_ns(), 0, values)
+
+    def record(self, phase, name, start_ns, duration_ns, args):
+        # deque.append es atómico: el hilo de escritura también puede registrar eventos
+        self._events.append((phase, name, start_ns, duration_ns, threading.get_ident(), args))
+
+    def events(self):
+        return list(self._events)
+
+    # --- Captura de una sola acción ---
+
+    def capture(self, name, mode='cprofile'):
+        """Perfila con ``mode`` (cprofile o tracemalloc) la siguiente ejecución del intervalo ``name``."""
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Modo de captura desconocido: {mode} (use {' o '.join(CAPTURE_MODES)})")
+        with self._lock:
+            self._captures[name] = mode
+
+    def take_capture(self, name):
+        if not self._captures:
+            return None
+        with self._lock:
+            return self._captures.pop(name, None)
+
+    def save_capture(self, name, capture):
+        """Guarda la captura junto al volcado: ``<salida>.<intervalo>.prof`` o ``.tracemalloc.txt``."""
+        base = self.output
+        for suffix in (".json", ".trace"):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if not hasattr(capture, 'dump_stats'): # El módulo tracemalloc
+            tracemalloc = capture
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(f"{base}.{name}.tracemalloc.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Memoria al terminar: {current / 1024:.1f} KiB, pico: {peak / 1024:.1f} KiB\n\n")
+                for stat in snapshot.statistics('lineno')[:30]:
+                    f.write(f"{stat}\n")
+        else:
+            capture.disable()
+            capture.dump_stats(f"{base}.{name}.prof") # Se lee con pstats o snakeviz
+
+    # --- Volcado ---
+
+    def summary(self):
+        """Por cada intervalo: número de llamadas, tiempo total, medio y máximo (ms)."""
+        durations = collections.defaultdict(list)
+        for phase, name, _, duration_ns, _, _ in self.events():
+            if phase == 'X':
+                durations[name].append(duration_ns / 1e6)
+        return {name: {'count': len(values), 'total_ms': round(sum(values), 3),
+                       'mean_ms': round(sum(values) / len(values), 3), 'max_ms': round(max(values), 3)}
+                for name, values in sorted(durations.items())}
+
+    def dump_json(self, path):
+        events = [{'type': 'span' if phase == 'X' else 'counter', 'name': name,
+                   'start_ms': round((start_ns - self._origin) / 1e6, 3),
+                   'duration_ms': round(duration_ns / 1e6, 3), 'thread': thread, 'args': args}
+                  for phase, name, start_ns, duration_ns, thread, args in self.events()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'events': events}, f, ensure_ascii=False, indent=1)
+
+    def dump_chrome_trace(self, path):
+        """Formato Trace Event de Chrome (tiempos en microsegundos)."""
+        pid = os.getpid()
+        trace = []
+        for phase, name, start_ns, duration_ns, thread, args in self.events():
+            event = {'name': name, 'ph': phase, 'ts': (start_ns - self._origin) / 1000, 'pid': pid, 'tid': thread,
+                     'args': args}
+            if phase == 'X':
+                event['dur'] = duration_ns / 1000
+            trace.append(event)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+    def dump(self, path=None):
+        """Vuelca los eventos a ``path`` (o a la salida configurada) según su extensión. Devuelve la ruta."""
+        path = path or self.output or DEFAULT_OUTPUT
+        if path.endswith(".trace.json"):
+            self.dump_chrome_trace(path)
+        else:
+            self.dump_json(path)
+        return path
+
+
+class EventLoopMonitor:
+    """
+    Latido periódico con ``after`` sobre una ventana Tk: el retraso con que llega cada latido es
+    el tiempo que el bucle de eventos estuvo bloqueado. Cada ``widget_every`` latidos registra
+    además el número de widgets de cada ventana.
+    """
+
+    def __init__(self, root, profiler, interval_ms=100, widget_every=50):
+        self.root = root
+        self.profiler = profiler
+        self.interval_ms = interval_ms
+        self.widget_every = widget_every
+        self._beats = 0
+        self._expected = None
+        self._after_id = None
+
+    def start(self):
+        self._schedule()
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self._after_id = self.root.after(self.interval_ms, self._beat)
+
+    def _beat(self):
+        lag_ms = max(0.0, (time.perf_counter() - self._expected) * 1000)
+        self.profiler.counter("event_loop_lag", lag_ms=round(lag_ms, 3))
+        self._beats += 1
+        if self._beats % self.widget_every == 0:
+            self.profiler.counter("widgets", **self.widget_counts())
+        self._schedule()
+
+    def widget_counts(self):
+        """Número de widgets de cada ventana (la principal y las Toplevel abiertas)."""
+        windows = [self.root] + [w for w in self.root.winfo_children() if w.winfo_class() == 'Toplevel']
+        counts = {}
+        for window in windows:
+            total = 0
+            pending = [window]
+            while pending:
+                widget = pending.pop()
+                total += 1
+                # Las Toplevel hijas se cuentan como ventanas aparte
+                pending.extend(child for child in widget.winfo_children() if child.winfo_class() != 'Toplevel')
+            counts[f"{window.title()} ({window})"] = total
+        return counts
+
+
+# Instancia compartida: los decoradores ``@profiler.timed()`` se aplican al definir las clases
+profiler = Profiler()
@@ -0,0 +1,204 @@
+import calendar
+import datetime
+import json
+
+from agenda.sections import Section
+from agenda.storage import file_identity, write_atomic
+from agenda.tasks import Task
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+
+class Occurrence(Task):
+    """Tarea generada a partir de una regla de repetición para una fecha concreta."""
+
+    __slots__ = ('rule', 'date_str')
+
+    def __init__(self, rule, date_str):
+        override = rule.exceptions.get(date_str, {})
+        super().__init__(override.get('title', rule.title),
+                         override.get('description', rule.description),
+                         Section(override.get('section', rule.section_name)))
+        self.completed = override.get('completed', False)
+        self.rule = rule
+        self.date_str = date_str
+
+
+class RecurrenceRule:
+    """
+    Regla de repetición de una tarea (diaria, semanal en ciertos días o mensual), con fin
+    opcional por fecha (``until``) o por número de repeticiones (``count``).
+
+    La regla se guarda una sola vez; las ocurrencias se calculan bajo demanda para el rango
+    pedido. Los cambios de una ocurrencia concreta (completado, edición o eliminación) se
+    guardan como excepciones dispersas en ``exceptions``: fecha -> cambios.
+    """
+
+    def __init__(self, rule_id, start, freq, title, description, section_name,
+                 interval=1, weekdays=None, until=None, count=None, exceptions=None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Frecuencia desconocida: {freq}")
+        self.id = rule_id
+        self.start = start # datetime.date
+        self.freq = freq
+        self.interval = interval
+        self.weekdays = weekdays or [] # 0 = lunes ... 6 = domingo (solo semanal)
+        self.until = until # datetime.date o None
+        self.count = count
+        self.title = title
+        self.description = description
+        self.section_name = section_name
+        self.exceptions = exceptions or {}
+
+    def _rrule(self):
+        # dateutil solo se importa cuando hace falta expandir una regla
+        from dateutil import rrule
+
+        frequencies = {'daily': rrule.DAILY, 'weekly': rrule.WEEKLY, 'monthly': rrule.MONTHLY}
+        return rrule.rrule(
+            frequencies[self.freq],
+            dtstart=datetime.datetime.combine(self.start, datetime.time()),
+            interval=self.interval,
+            byweekday=self.weekdays or None,
+            until=datetime.datetime.combine(self.until, datetime.time()) if self.until else None,
+            count=self.count,
+        )
+
+    def dates_between(self, start, end):
+        """Fechas (YYYY-MM-DD) de las ocurrencias entre ``start`` y ``end`` (incluidas), sin las eliminadas."""
+        if end < self.start or (self.until and start > self.until):
+            return []
+        occurrences = self._rrule().between(
+            datetime.datetime.combine(start, datetime.time()),
+            datetime.datetime.combine(end, datetime.time()),
+            inc=True,
+        )
+        dates = (occurrence.strftime("%Y-%m-%d") for occurrence in occurrences)
+        return [date_str for date_str in dates if not self.exceptions.get(date_str, {}).get('deleted')]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'start': self.start.isoformat(),
+            'freq': self.freq,
+            'interval': self.interval,
+            'weekdays': self.weekdays,
+            'until': self.until.isoformat() if self.until else None,
+            'count': self.count,
+            'title': self.title,
+            'description': self.description,
+            'section': self.section_name,
+            'exceptions': self.exceptions,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['id'],
+            datetime.date.fromisoformat(data['start']),
+            data['freq'],
+            data['title'],
+            data['description'],
+            data['section'],
+            interval=data.get('interval', 1),
+            weekdays=data.get('weekdays'),
+            until=datetime.date.fromisoformat(data['until']) if data.get('until') else None,
+            count=data.get('count'),
+            exceptions=data.get('exceptions'),
+        )
+
+
+class RecurrenceBook:
+    """
+    Conjunto de reglas de repetición guardado en un archivo JSON junto al de tareas.
+    Su tamaño depende de las reglas y excepciones, no de cuán lejos llegan las repeticiones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rules = {} # id -> RecurrenceRule
+        self._file_id = None # Identidad del archivo en la última lectura o escritura
+
+    @classmethod
+    def load(cls, path):
+        book = cls(path)
+        book.refresh()
+        return book
+
+    def refresh(self):
+        """Vuelve a leer las reglas si otro proceso cambió el archivo. Devuelve True si se releyó."""
+        file_id = file_identity(self.path)
+        if file_id == self._file_id:
+            return False
+        rules = {}
+        if file_id is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    rule = RecurrenceRule.from_dict(data)
+                    rules[rule.id] = rule
+        self.rules = rules
+        self._file_id = file_id
+        return True
+
+    def dumps(self):
+        """Serializa las reglas (en el hilo principal, para escribirlas luego en el de escritura)."""
+        return json.dumps([rule.to_dict() for rule in self.rules.values()], ensure_ascii=False, indent=1)
+
+    def save(self, text=None):
+        write_atomic(self.path, self.dumps() if text is None else text)
+        self._file_id = file_identity(self.path)
+
+    def add_rule(self, start, freq, title, description, section_name, **options):
+        rule_id = max(self.rules, default=0) + 1
+        rule = RecurrenceRule(rule_id, start, freq, title, description, section_name, **options)
+        self.rules[rule_id] = rule
+        return rule
+
+    def occurrences_between(self, start, end):
+        """Diccionario fecha -> lista de Occurrence con las ocurrencias del rango."""
+        by_date = {}
+        for rule in self.rules.values():
+            for date_str in rule.dates_between(start, end):
+                by_date.setdefault(date_str, []).append(Occurrence(rule, date_str))
+        return by_date
+
+    def month_mask(self, year, month):
+        """Mapa de bits de los días del mes con ocurrencias (mismo formato que Calendar.month_task_mask)."""
+        mask = 0
+        start = datetime.date(year, month, 1)
+        end = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        for rule in self.rules.values():
+            for date_str in rule.dates_between(start, end):
+                mask |= 1 << int(date_str[8:10])
+        return mask
+
+    def get_rule(self, rule_id):
+        """Devuelve la regla actual con ese id (tras ``refresh`` las ocurrencias pueden apuntar a una copia antigua)."""
+        try:
+            return self.rules[rule_id]
+        except KeyError:
+            raise LookupError("La tarea repetida ya no existe (se eliminó en otra ventana).") from None
+
+    def set_exception(self, occurrence, **changes):
+        """Guarda un cambio para una sola ocurrencia (completed, title, description, section o deleted)."""
+        rule = self.get_rule(occurrence.rule.id)
+        rule.exceptions.setdefault(occurrence.date_str, {}).update(changes)
+
+
+def merge_dated_tasks(dated_tasks, occurrences_by_date):
+    """
+    Mezcla en orden cronológico un iterable ordenado de (fecha, tareas) con las ocurrencias por fecha.
+    Devuelve (fecha, tareas + ocurrencias) sin modificar las listas originales.
+    """
+    pending = sorted(occurrences_by_date.items())
+    position = 0
+    for date_str, tasks in dated_tasks:
+        while position < len(pending) and pending[position][0] < date_str:
+            yield pending[position]
+            position += 1
+        if position < len(pending) and pending[position][0] == date_str:
+            yield date_str, tasks + pending[position][1]
+            position += 1
+        else:
+            yield date_str, tasks
+    yield from pending[position:]
@@ -0,0 +1,179 @@
+import bisect
+import heapq
+import re
+import unicodedata
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def fold_text(text):
+    """Pasa a minúsculas y quita los acentos para comparar texto en español ("Mié" -> "mie")."""
+    text = text.casefold()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Devuelve el conjunto de palabras normalizadas de un texto."""
+    return set(_WORD_RE.findall(fold_text(text)))
+
+
+class SearchResult:
+    """Resultado de una búsqueda: coincidencias ordenadas por fecha y conteos por faceta."""
+
+    def __init__(self, matches, total, section_counts, completed_counts):
+        self.matches = matches # Lista de (fecha, tarea), como mucho ``limit`` elementos
+        self.total = total # Total de coincidencias con los filtros aplicados
+        self.section_counts = section_counts # sección -> coincidencias del texto buscado
+        self.completed_counts = completed_counts # {True: n, False: n} de las coincidencias del texto buscado
+
+
+class TaskSearchIndex:
+    """
+    Índice invertido en memoria sobre el título, la descripción y la sección de las tareas,
+    con facetas por sección y por estado de completado.
+
+    Se mantiene de forma incremental (``add``, ``update``, ``update_completed``, ``remove``),
+    así que una búsqueda solo recorre las listas de las palabras consultadas.
+    """
+
+    MIN_PREFIX = 2 # La última palabra se busca como prefijo si tiene al menos estas letras
+
+    def __init__(self):
+        self._postings = {} # palabra -> set(Task)
+        self._vocabulary = [] # palabras ordenadas, para buscar por prefijo con bisect
+        self._vocabulary_dirty = False
+        self._entries = {} # Task -> (fecha, palabras, nombre de sección)
+        self._date_of = {} # Task -> fecha; clave de ordenación sin llamadas a funciones Python
+        self._by_section = {} # nombre de sección -> set(Task)
+        self._completed = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, dated_tasks):
+        """Indexa un iterable de (fecha, tareas), por ejemplo ``Calendar.iter_tasks()``."""
+        for date_str, tasks in dated_tasks:
+            for task in tasks:
+                self.add(date_str, task)
+
+    def add(self, date_str, task):
+        tokens = tokenize(f"{task.title} {task.description} {task.section.name}")
+        section_name = task.section.name
+        self._entries[task] = (date_str, tokens, section_name)
+        self._date_of[task] = date_str
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                self._vocabulary.append(token)
+                self._vocabulary_dirty = True
+            posting.add(task)
+        self._by_section.setdefault(section_name, set()).add(task)
+        if task.completed:
+            self._completed.add(task)
+
+    def remove(self, task):
+        entry = self._entries.pop(task, None)
+        if entry is None:
+            return
+        _, tokens, section_name = entry
+        del self._date_of[task]
+        for token in tokens:
+            posting = self._postings[token]
+            posting.discard(task)
+            if not posting:
+                del self._postings[token] # La palabra queda en el vocabulario y se ignora al buscar
+        section_tasks = self._by_section[section_name]
+        section_tasks.discard(task)
+        if not section_tasks:
+            del self._by_section[section_name]
+        self._completed.discard(task)
+
+    def update(self, task):
+        """Reindexa una tarea editada (título, descripción o sección) conservando su fecha."""
+        entry = self._entries.get(task)
+        if entry is None:
+            return
+        self.remove(task)
+        self.add(entry[0], task)
+
+    def update_completed(self, task):
+        if task not in self._entries:
+            return
+        if task.completed:
+            self._completed.add(task)
+        else:
+            self._completed.discard(task)
+
+    def _prefix_matches(self, prefix):
+        if self._vocabulary_dirty:
+            self._vocabulary.sort()
+            self._vocabulary_dirty = False
+        matches = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.update(self._postings.get(token, ()))
+        return matches
+
+    def _text_matches(self, query):
+        words = _WORD_RE.findall(fold_text(query))
+        if not words:
+            return None # Sin texto: todas las tareas
+
+        sets = []
+        for position, word in enumerate(words):
+            is_last = position == len(words) - 1
+            if is_last and len(word) >= self.MIN_PREFIX:
+                sets.append(self._prefix_matches(word))
+            else:
+                sets.append(self._postings.get(word, set()))
+
+        sets.sort(key=len) # Intersecar empezando por el conjunto más pequeño
+        matches = set(sets[0])
+        for other in sets[1:]:
+            matches &= other
+            if not matches:
+                break
+        return matches
+
+    def search(self, query, section=None, completed=None, limit=1000):
+        """
+        Busca las tareas que contienen todas las palabras de ``query`` (la última como prefijo).
+        ``section`` y ``completed`` filtran por faceta; None significa sin filtro.
+        """
+        matches = self._text_matches(query)
+        if matches is None:
+            # Sin texto, los conteos salen directamente de las facetas sin recorrer las tareas
+            section_counts = {name: len(tasks) for name, tasks in self._by_section.items()}
+            completed_total = len(self._completed)
+            matches = self._entries.keys()
+        else:
+            # Intersecciones de conjuntos (en C) en lugar de recorrer las coincidencias en Python
+            section_counts = {}
+            for name, tasks in self._by_section.items():
+                count = len(matches & tasks)
+                if count:
+                    section_counts[name] = count
+            completed_total = len(matches & self._completed)
+        completed_counts = {True: completed_total, False: len(matches) - completed_total}
+
+        filtered = matches
+        if section is not None:
+            section_tasks = self._by_section.get(section, set())
+            filtered = section_tasks if filtered is self._entries.keys() else filtered & section_tasks
+        if completed is not None:
+            filtered = (filtered & self._completed) if completed else (set(filtered) - self._completed)
+
+        date_of = self._date_of
+        ordered = heapq.nsmallest(limit, filtered, key=date_of.__getitem__)
+        return SearchResult(
+            [(date_of[task], task) for task in ordered],
+            len(filtered),
+            section_counts,
+            completed_counts,
+        )
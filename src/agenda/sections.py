@@ -1,9 +1,23 @@
 class Section:
-    def __init__(self, name):
-        self.name = name
+    """
+    Sección de tareas. Las instancias están internadas: ``Section(nombre)`` devuelve siempre
+    el mismo objeto para el mismo nombre, así miles de tareas comparten unas pocas secciones.
+    """
+
+    __slots__ = ('name',)
+
+    _registry = {} # nombre -> Section compartida
+
+    def __new__(cls, name):
+        section = cls._registry.get(name)
+        if section is None:
+            section = super().__new__(cls)
+            section.name = name
+            cls._registry[name] = section
+        return section
 
     def __str__(self):
         return self.name
 
     def __repr__(self):
-        return f"Section(name='{self.name}')"
\ No newline at end of file
+        return f"Section(name='{self.name}')"
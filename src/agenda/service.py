@@ -0,0 +1,584 @@
+import collections
+import contextlib
+import datetime
+import heapq
+import os
+
+from agenda.aggregates import TaskCounts, best_streak, current_streak
+from agenda.archive import TaskArchive
+from agenda.calendar import Calendar
+from agenda.feeds import FeedBook, FeedReport, entry_digest
+from agenda.filelock import FileLock
+from agenda.month_view import MonthViewCache
+from agenda.recurrence import Occurrence, RecurrenceBook
+from agenda.search import TaskSearchIndex
+from agenda.sections import Section
+from agenda.storage import ARCHIVE_SUFFIX, FEEDS_SUFFIX, RULES_SUFFIX, open_store
+from agenda.tasks import Task
+
+
+class AgendaStats:
+    """Resumen de un conjunto de tareas: totales, completadas y conteo por sección."""
+
+    def __init__(self):
+        self.total = 0
+        self.completed = 0
+        self.by_section = collections.Counter()
+        self.first_date = None
+        self.last_date = None
+
+    @property
+    def pending(self):
+        return self.total - self.completed
+
+    def add_row(self, date_str, section_name, completed):
+        self.total += 1
+        if completed:
+            self.completed += 1
+        self.by_section[section_name] += 1
+        if self.first_date is None or date_str < self.first_date:
+            self.first_date = date_str
+        if self.last_date is None or date_str > self.last_date:
+            self.last_date = date_str
+
+
+class AgendaService:
+    """
+    Lógica de datos de la agenda sin interfaz: carga, cambios y guardado de tareas y de las
+    reglas de repetición. La usan la aplicación Tk (``main.py``) y la línea de comandos
+    (``python -m agenda``).
+
+    Con ``writer`` (un PersistenceWorker) el fsync y las compactaciones se encolan en el hilo
+    de escritura; sin él, cada cambio se escribe en disco antes de volver. Los errores de
+    almacenamiento se propagan como IOError para que cada interfaz los muestre a su manera.
+
+    Varios procesos (la aplicación, la línea de comandos, el servidor) pueden usar el mismo
+    archivo a la vez: cada cambio se hace con el lock ``<archivo>.lock`` tomado y después de
+    ``sync``, que incorpora lo que guardaron los demás. Si la tarea que se quiere cambiar ya no
+    existe (otro proceso la eliminó), se lanza LookupError.
+
+    Las tareas completadas antiguas pueden pasar al archivo histórico (``archive_completed``):
+    cada año archivado se lee la primera vez que se consulta ese año o todo el historial. Una
+    tarea archivada que se cambia vuelve al almacenamiento principal con su id.
+    """
+
+    def __init__(self, data_file, writer=None):
+        self.data_file = os.path.abspath(data_file)
+        self.lock = FileLock(self.data_file + ".lock")
+        self.store = open_store(self.data_file)
+        self.writer = writer
+        hoy = datetime.date.today()
+        # Un solo Calendar con todas las tareas cargadas durante toda la sesión; el mes visible
+        # es una vista ligera que se reutiliza al volver a él
+        self.calendar = Calendar(hoy.year, hoy.month)
+        self.month_views = MonthViewCache()
+        self.month_view = self.month_views.get(hoy.year, hoy.month)
+        self.search_index = None # Se construye con la primera búsqueda
+        self.recurrences = RecurrenceBook(self.data_file + RULES_SUFFIX)
+        self.archive = TaskArchive(self.data_file + ARCHIVE_SUFFIX)
+        self.feeds = FeedBook(self.data_file + FEEDS_SUFFIX)
+        self.external_changes = 0 # Veces que ``sync`` incorporó cambios de otros procesos
+        self._batch_depth = 0
+        self._batch_flush = False # Escritura de tareas pendiente hasta el final del lote
+        self._batch_rules = False # Ídem para las reglas de repetición
+
+    # --- Carga ---
+
+    def set_month(self, year, month):
+        """Cambia el mes visible y carga sus tareas (las ya cargadas se conservan)."""
+        self.month_view = self.month_views.get(year, month)
+        self.load_month()
+
+    def load_month(self):
+        """Carga las tareas del mes visible; el resto del historial se carga bajo demanda."""
+        self.store.load_month(self.calendar, self.month_view.year, self.month_view.month)
+        self.load_archive(self.month_view.year)
+
+    def load_all(self):
+        """Carga todas las tareas activas (sin los años archivados que aún no se consultaron)."""
+        self.store.load_all(self.calendar)
+
+    def load_history(self):
+        """Carga todo el historial, también los años archivados (para verlo completo o buscar en él)."""
+        self.load_all()
+        for year in self.archive.years():
+            self.load_archive(year)
+
+    def load_archive(self, year):
+        """Añade al calendario las tareas archivadas de ``year`` la primera vez; después ``sync`` las mantiene."""
+        if self.archive.was_read(year):
+            return
+        with self.lock:
+            tasks_by_date = self.archive.read_year(year)
+        if tasks_by_date:
+            self.calendar.attach_archive(year, tasks_by_date)
+            self.search_index = None
+
+    def preload(self, progress=None):
+        """
+        Empieza a leer el resto del historial en segundo plano (tras ``load_month``). ``progress``
+        recibe la fracción leída desde el hilo de lectura. Devuelve False si no hay nada que leer.
+        """
+        return self.store.preload(progress)
+
+    @property
+    def preloading(self):
+        return self.store.preloading
+
+    def finish_preload(self, wait=False):
+        """Incorpora el historial leído con ``preload`` si ya terminó. Devuelve True si lo incorporó."""
+        with self.lock:
+            done = self.store.finish_preload(self.calendar, wait)
+        if done:
+            self.search_index = None
+        return done
+
+    @property
+    def load_report(self):
+        return self.store.load_report
+
+    def load_recurrences(self):
+        with self.lock:
+            self.recurrences.refresh()
+
+    def writes_pending(self):
+        """True si ``sync`` tendría que esperar a que el hilo de escritura guarde los cambios propios."""
+        return self.store.writes_pending()
+
+    def sync(self):
+        """Incorpora los cambios guardados por otros procesos. Devuelve True si hubo alguno."""
+        with self.lock:
+            changed = self.store.sync(self.calendar)
+            for year in self.archive.changed(): # Otro proceso archivó o recuperó tareas de ese año
+                self.calendar.attach_archive(year, self.archive.read_year(year))
+                changed = True
+            if changed:
+                self.search_index = None # Las tareas pueden ser objetos nuevos: se reconstruye al buscar
+            changed = self.recurrences.refresh() or changed
+        if changed:
+            self.external_changes += 1
+        return changed
+
+    def watch_paths(self):
+        """Archivos que cambian cuando otro proceso guarda (para ``agenda.watcher.ChangeWatcher``)."""
+        return self.store.watch_paths() + [self.recurrences.path]
+
+    @contextlib.contextmanager
+    def _change(self):
+        """Lock tomado y estado al día con lo que guardaron otros procesos."""
+        with self.lock:
+            if not self._batch_depth: # Dentro de un lote ya se sincronizó al empezar
+                self.sync()
+            yield
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Agrupa varios cambios en una transacción: el lock se toma y se sincroniza una sola vez,
+        y las tareas y las reglas se escriben una sola vez al terminar. Los lotes se pueden anidar.
+        """
+        with self.lock:
+            if not self._batch_depth:
+                self.sync()
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._finish_batch()
+
+    def _finish_batch(self):
+        save_rules, self._batch_rules = self._batch_rules, False
+        flush, self._batch_flush = self._batch_flush, False
+        if save_rules:
+            self.recurrences.save()
+        if flush:
+            self._schedule_flush()
+
+    def _save_rules(self):
+        if self._batch_depth:
+            self._batch_rules = True
+        else:
+            self.recurrences.save()
+
+    def get_search_index(self):
+        """Devuelve el índice de búsqueda, construyéndolo con todo el historial la primera vez."""
+        if self.search_index is None:
+            self.load_history()
+            self.search_index = TaskSearchIndex()
+            self.search_index.build(self.calendar.iter_tasks())
+        return self.search_index
+
+    def get_tasks(self, date_str):
+        """Copia de la lista de tareas de una fecha, cargando su mes si hace falta."""
+        date_obj = datetime.date.fromisoformat(date_str)
+        self.store.load_month(self.calendar, date_obj.year, date_obj.month)
+        self.load_archive(date_obj.year)
+        return list(self.calendar.get_tasks(date_str))
+
+    def find_task(self, task_id):
+        """Devuelve (fecha, tarea) de la tarea con ese id, cargando el historial. LookupError si no existe."""
+        self.load_all()
+        found = self.calendar.find(task_id)
+        if found is None and self.archive.years():
+            self.load_history()
+            found = self.calendar.find(task_id)
+        if found is None:
+            raise LookupError(f"No hay ninguna tarea con id {task_id}.")
+        return found
+
+    def get_task(self, date_str, position):
+        """Devuelve la tarea ``position`` (desde 1) de una fecha, cargando su mes si hace falta."""
+        tasks_on_date = self.get_tasks(date_str)
+        if not 1 <= position <= len(tasks_on_date):
+            raise IndexError(f"No hay tarea {position} el {date_str} ({len(tasks_on_date)} tareas).")
+        return tasks_on_date[position - 1]
+
+    # --- Estadísticas ---
+
+    def month_counts(self, year, month):
+        """
+        Totales del mes y por día (día -> TaskCounts, solo los días con tareas), incluidas las
+        ocurrencias de tareas repetidas. Usa los agregados del calendario: O(días del mes).
+        """
+        self.store.load_month(self.calendar, year, month)
+        self.load_archive(year)
+        view = self.month_views.get(year, month)
+        aggregates = self.calendar.aggregates
+        totals = TaskCounts()
+        totals.merge(aggregates.month(year, month))
+        days = {}
+        for day in view.tasks_by_day(self.calendar): # Solo los días con tareas
+            days[day] = counts = TaskCounts()
+            counts.merge(aggregates.day(view.date_str(day)))
+
+        start, end = datetime.date(year, month, 1), datetime.date(year, month, view.last_day)
+        for date_str, occurrences in self.recurrences.occurrences_between(start, end).items():
+            counts = days.setdefault(int(date_str[8:10]), TaskCounts())
+            for occurrence in occurrences:
+                counts.add(occurrence.section.name, occurrence.completed)
+                totals.add(occurrence.section.name, occurrence.completed)
+        return totals, days
+
+    def year_counts(self, year):
+        """Totales del año sumando los de cada mes."""
+        totals = TaskCounts()
+        for month in range(1, 13):
+            totals.merge(self.month_counts(year, month)[0])
+        return totals
+
+    def streaks(self, year, today=None):
+        """(racha actual, mejor racha de ``year``) de días con todas sus tareas completadas."""
+        today = today or datetime.date.today()
+        months = {} # (año, mes) -> totales por día, calculados una vez por llamada
+
+        def day_counts(date_obj):
+            key = (date_obj.year, date_obj.month)
+            if key not in months:
+                months[key] = self.month_counts(*key)[1]
+            return months[key].get(date_obj.day)
+
+        last = min(datetime.date(year, 12, 31), today)
+        best = best_streak(day_counts, datetime.date(year, 1, 1), last)
+        return current_streak(day_counts, today), best
+
+    # --- Cambios ---
+
+    def _locate(self, date_str, task):
+        """
+        (posición, tarea del calendario) de ``task``. Si otro proceso hizo releer las tareas, la
+        tarea del calendario es otro objeto con el mismo id: los cambios se aplican a ese.
+        """
+        index = self.calendar.position(date_str, task)
+        if index is None:
+            raise LookupError("La tarea ya no existe (se modificó o eliminó en otra ventana).")
+        return index, self.calendar.tasks[date_str][index]
+
+    def _unarchive(self, date_str, task):
+        """Una tarea archivada que va a cambiar vuelve antes al almacenamiento principal, con su id."""
+        if task.id not in self.calendar.archived_ids:
+            return
+        year = self.calendar.unarchive(date_str, task)
+        # Primero se añade: si algo falla después, la copia del almacenamiento principal es la que vale
+        self.store.add_task(date_str, task)
+        self.archive.remove(year, {task.id})
+
+    def add_task(self, date_str, title, description, section_name, completed=False):
+        task = Task(title, description, Section(section_name))
+        task.completed = completed
+        self.restore_task(date_str, task)
+        return task
+
+    def restore_task(self, date_str, task):
+        """
+        Vuelve a añadir una tarea eliminada (el mismo objeto, al final de su fecha), o deshace la
+        eliminación de una ocurrencia. Lo usan deshacer y rehacer.
+        """
+        with self._change():
+            if isinstance(task, Occurrence):
+                self.recurrences.set_exception(task, deleted=False)
+                self._save_rules()
+                return
+            self.store.add_task(date_str, task)
+            self.calendar.add_task(date_str, task)
+            if self.search_index is not None:
+                self.search_index.add(date_str, task)
+            self.store.checkpoint(self.calendar)
+        self._schedule_flush()
+
+    def update_task(self, date_str, task, title, description, section_name):
+        """Edita una tarea (o solo una ocurrencia, si es de una tarea repetida)."""
+        with self._change():
+            if isinstance(task, Occurrence):
+                self.recurrences.set_exception(task, title=title, description=description, section=section_name)
+                self._set_fields(task, title, description, section_name)
+                self._save_rules()
+                return
+            index, task = self._locate(date_str, task)
+            self._unarchive(date_str, task)
+            previous = (task.title, task.description, task.section)
+            self.calendar.update_task(date_str, task, title=title, description=description,
+                                      section=Section(section_name))
+            try:
+                self.store.update_task(date_str, index, task)
+            except IOError:
+                self.calendar.update_task(date_str, task, *previous)
+                raise
+            if self.search_index is not None:
+                self.search_index.update(task)
+            self.store.checkpoint(self.calendar)
+        self._schedule_flush()
+
+    @staticmethod
+    def _set_fields(task, title, description, section_name):
+        task.title = title
+        task.description = description
+        task.section = Section(section_name)
+
+    def set_completed(self, date_str, task, completed):
+        with self._change():
+            if isinstance(task, Occurrence):
+                self.recurrences.set_exception(task, completed=completed)
+                task.set_completed(completed)
+                self._save_rules()
+                return
+            index, task = self._locate(date_str, task)
+            self._unarchive(date_str, task)
+            previous = task.completed
+            self.calendar.update_task(date_str, task, completed=completed)
+            try:
+                self.store.toggle_task(date_str, index, task)
+            except IOError:
+                self.calendar.update_task(date_str, task, completed=previous)
+                raise
+            if self.search_index is not None:
+                self.search_index.update_completed(task)
+            self.store.checkpoint(self.calendar)
+        self._schedule_flush()
+
+    def delete_task(self, date_str, task):
+        """Elimina una tarea (o solo una ocurrencia). Devuelve False si la tarea ya no estaba."""
+        with self._change():
+            if isinstance(task, Occurrence):
+                self.recurrences.set_exception(task, deleted=True)
+                self._save_rules()
+                return True
+            try:
+                index, task = self._locate(date_str, task)
+            except LookupError:
+                return False
+            self._unarchive(date_str, task)
+            self.store.delete_task(date_str, index, task)
+            self.calendar.remove_task(date_str, index)
+            if self.search_index is not None:
+                self.search_index.remove(task)
+            self.store.checkpoint(self.calendar)
+        self._schedule_flush()
+        return True
+
+    def add_recurring_task(self, start, freq, title, description, section_name, **options):
+        with self._change():
+            rule = self.recurrences.add_rule(start, freq, title, description, section_name, **options)
+            self._save_rules()
+        return rule
+
+    def delete_series(self, rule):
+        """Elimina una regla de repetición con todas sus ocurrencias."""
+        with self._change():
+            self.recurrences.get_rule(rule.id)
+            del self.recurrences.rules[rule.id]
+            self._save_rules()
+
+    def restore_series(self, rule):
+        """Vuelve a añadir una regla eliminada con ``delete_series`` (mismo id y excepciones)."""
+        with self._change():
+            if rule.id in self.recurrences.rules:
+                raise LookupError("Ya existe otra tarea repetida con el mismo número.")
+            self.recurrences.rules[rule.id] = rule
+            self._save_rules()
+
+    # --- Archivo histórico ---
+
+    def archive_completed(self, before, compression='gz'):
+        """
+        Mueve al archivo por años las tareas completadas anteriores a ``before`` (YYYY-MM-DD):
+        dejan de cargarse al arrancar y de reescribirse al guardar. Devuelve cuántas se archivaron.
+        """
+        self.load_all()
+        with self._change():
+            self.store.flush() # En SQLite las tareas nuevas reciben su id al guardarse
+            archived = self.calendar.completed_before(before)
+            if not archived:
+                return 0
+            # Primero el archivo: si algo falla después, la copia del almacenamiento principal es la que vale
+            self.archive.add([(date_str, task.title, task.description, task.section.name, True, task.id)
+                              for date_str, task in archived], compression)
+            self.store.remove_completed_before(before, [task.id for _, task in archived])
+            self.calendar.remove_completed_before(before)
+            self.search_index = None
+            # Los años que ya se mostraban siguen completos, ahora desde el archivo
+            for year in sorted({int(date_str[:4]) for date_str, _ in archived}):
+                if self.archive.was_read(year):
+                    self.calendar.attach_archive(year, self.archive.read_year(year))
+            self.store.checkpoint(self.calendar, force=True) # El snapshot se reescribe sin ellas
+        self._schedule_flush()
+        return len(archived)
+
+    # --- Calendarios externos ---
+
+    def sync_feed(self, name, entries):
+        """
+        Sincroniza el feed ``name`` con pares (uid, fila), como los de ``formats.read_ics_entries``,
+        leídos en streaming. Las entradas iguales a las de la sincronización anterior no se tocan;
+        las nuevas se añaden, las modificadas actualizan su tarea (conservando su id) y las que ya
+        no están en el feed eliminan la suya. El completado solo se cambia si cambió en el feed:
+        una tarea completada aquí sigue así aunque el evento cambie de hora. Devuelve un FeedReport.
+
+        Si la lectura falla a medias, no se elimina nada, pero lo ya aplicado queda registrado.
+        """
+        report = FeedReport()
+        self.load_all()
+        with self.batch():
+            self.feeds.refresh()
+            known = self.feeds.entries(name) # Lo que quede al terminar ya no está en el feed
+            kept = {} # uid -> [id, huella, completado] de las entradas sin cambios
+            touched = {} # uid -> (fecha, tarea, huella) de las añadidas o actualizadas
+            try:
+                for uid, row in entries:
+                    digest = entry_digest(row)
+                    if uid in touched: # UID repetido en el feed: vale la última entrada
+                        date_str, task, previous = touched[uid]
+                        found = (date_str, task)
+                    else:
+                        previous = kept.pop(uid, None) or known.pop(uid, None)
+                        if previous is not None and previous[1] == digest:
+                            kept[uid] = previous
+                            report.unchanged += 1
+                            continue
+                        found = self._feed_task(previous)
+                    if found is None:
+                        date_str, task = row[0], self.add_task(*row)
+                        report.added += 1
+                    else:
+                        date_str, task = found
+                        date_str = self._apply_row(date_str, task, row, previous)
+                        report.updated += 1
+                    touched[uid] = (date_str, task, [None, digest, row[4]])
+
+                stale, known = known, {}
+                for entry in stale.values():
+                    found = self._feed_task(entry)
+                    if found is not None:
+                        self.delete_task(*found)
+                        report.deleted += 1
+            finally:
+                self.store.flush() # En SQLite las tareas nuevas reciben su id al guardarse
+                kept.update(known) # Solo si la lectura falló: siguen siendo del feed
+                kept.update((uid, [task.id, *entry[1:]]) for uid, (_, task, entry) in touched.items())
+                self.feeds.save(name, kept)
+        return report
+
+    def _feed_task(self, entry):
+        """(fecha, tarea) de una entrada ya sincronizada, o None si es nueva o su tarea se eliminó."""
+        if entry is None:
+            return None
+        try:
+            return self.find_task(entry[0])
+        except LookupError:
+            return None
+
+    def _apply_row(self, date_str, task, row, previous):
+        """
+        Deja ``task`` como la fila importada (``previous`` es la entrada de la sincronización
+        anterior). Devuelve su fecha, que cambia si la entrada se movió.
+        """
+        new_date, title, description, section_name, completed = row
+        if completed == previous[2]:
+            completed = task.completed # El feed no lo cambió: se conserva lo marcado aquí
+        if new_date != date_str:
+            # Se mueve con su id: se elimina de su fecha y el mismo objeto se añade en la nueva
+            self.delete_task(date_str, task)
+            self._set_fields(task, title, description, section_name)
+            task.completed = completed
+            self.restore_task(new_date, task)
+            return new_date
+        if (task.title, task.description, task.section.name) != (title, description, section_name):
+            self.update_task(date_str, task, title, description, section_name)
+        if task.completed != completed:
+            self.set_completed(date_str, task, completed)
+        return date_str
+
+    # --- Guardado ---
+
+    def _schedule_flush(self):
+        if self._batch_depth:
+            self._batch_flush = True # Se escribe una sola vez al terminar el lote
+            return
+        # Misma clave: los guardados dentro de la ventana de agrupación se escriben una sola vez
+        self._schedule("store", self.store.flush)
+
+    def save(self):
+        """Consolida todas las tareas en el almacenamiento (snapshot completo en el backend de texto)."""
+        self.load_all() # El snapshot necesita el historial completo
+        with self._change():
+            self.store.checkpoint(self.calendar, force=True)
+        self._schedule_flush()
+
+    def _schedule(self, key, job):
+        if self.writer is None:
+            job()
+        else:
+            self.writer.submit(key, job)
+
+    def close(self):
+        """Vacía la cola de escritura (si hay) y cierra el almacenamiento."""
+        if self.writer is not None:
+            self.writer.close()
+        self.store.close()
+
+    # --- Operaciones por lotes (streaming) ---
+
+    def iter_rows(self, start=None, end=None, with_ids=False):
+        """
+        Tuplas (fecha, titulo, descripcion, seccion, completado) guardadas, incluidas las archivadas,
+        sin cargar el calendario; con ``with_ids``, con el id al final. Dentro de cada fecha, las
+        archivadas van al final, como en el calendario.
+        """
+        archived = self.archive.iter_rows(start, end)
+        if not with_ids:
+            archived = (row[:5] for row in archived)
+        return heapq.merge(self.store.iter_rows(start, end, with_ids), archived, key=lambda row: row[0])
+
+    def import_rows(self, rows):
+        """Añade tareas desde un iterable de tuplas en una sola pasada. Devuelve cuántas se añadieron."""
+        count = self.store.import_rows(rows)
+        self.sync() # Incorporar las filas si el calendario ya estaba cargado
+        return count
+
+    def stats(self, start=None, end=None):
+        """Calcula un AgendaStats recorriendo las tareas guardadas en streaming."""
+        stats = AgendaStats()
+        for date_str, _, _, section_name, completed in self.iter_rows(start, end):
+            stats.add_row(date_str, section_name, completed)
+        return stats
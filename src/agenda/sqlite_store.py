@@ -0,0 +1,351 @@
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+
+from agenda.calendar import Calendar
+from agenda.sections import Section
+from agenda.storage import SIDECAR_SUFFIXES, StorageError, TaskStore, copy_sidecars, sidecar_paths, snapshot_rows
+from agenda.tasks import Task
+from agenda.text_store import TextTaskStore
+
+# AUTOINCREMENT: el id de una fila eliminada (o archivada) no se vuelve a dar a otra tarea
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    section TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_date ON tasks (date);
+CREATE INDEX IF NOT EXISTS idx_tasks_section ON tasks (section);
+CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed);
+"""
+
+_COLUMNS = "id, date, title, description, section, completed"
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Backend SQLite (módulo estándar sqlite3).
+    Carga los meses bajo demanda. Los cambios se encolan como sentencias de una fila y
+    ``flush`` los aplica en una única transacción desde el hilo de escritura.
+    El id de cada tarea es el de su fila: las tareas nuevas lo reciben al guardarse en ``flush``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._calendar = None # Calendario cargado, para indexar los ids que asigna ``flush``
+        self._reusable = {} # id -> Task cargada antes de un ``sync``
+        self._loaded_months = set()
+        self._all_loaded = False
+        self._pending = [] # (operación, tarea, valores copiados en el hilo principal)
+        self._pending_lock = threading.Lock()
+        self._conn_lock = threading.Lock() # La conexión se comparte entre el hilo principal y el de escritura
+        self._flush_lock = threading.RLock() # Un flush en curso termina antes de que ``sync`` relea
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+            self._migrate_autoincrement()
+            self._data_version = self._read_data_version()
+        except sqlite3.Error as e:
+            raise StorageError(f"No se pudo abrir la base de datos {path}: {e}") from e
+
+    def _migrate_autoincrement(self):
+        """
+        Las bases creadas sin AUTOINCREMENT reutilizan el id de la fila eliminada con el id más
+        alto: la tabla se reconstruye una vez, en una transacción, conservando los ids.
+        """
+        def table_sql():
+            return self._conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'").fetchone()[0]
+
+        if "AUTOINCREMENT" in table_sql().upper():
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if "AUTOINCREMENT" not in table_sql().upper(): # Otro proceso pudo migrarla mientras tanto
+                indexes = [name for name, in self._conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND sql IS NOT NULL")]
+                self._conn.execute("ALTER TABLE tasks RENAME TO tasks_old")
+                for name in indexes:
+                    self._conn.execute(f'DROP INDEX "{name}"')
+                for statement in SCHEMA.split(";"):
+                    if statement.strip():
+                        self._conn.execute(statement)
+                # La secuencia de AUTOINCREMENT empieza en el id más alto copiado
+                self._conn.execute(f"INSERT INTO tasks ({_COLUMNS}) SELECT {_COLUMNS} FROM tasks_old")
+                self._conn.execute("DROP TABLE tasks_old")
+            self._conn.commit()
+        except sqlite3.Error:
+            self._conn.rollback()
+            raise
+
+    def reserve_ids(self, next_id):
+        """Las tareas nuevas recibirán ids a partir de ``next_id`` como mínimo."""
+        try:
+            with self._conn_lock, self._conn:
+                updated = self._conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'tasks'",
+                                             (next_id - 1,)).rowcount
+                if not updated:
+                    self._conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (next_id - 1,))
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def _read_data_version(self):
+        # Cambia cuando otra conexión (de este u otro proceso) confirma una transacción
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _execute(self, sql, params=()):
+        try:
+            with self._conn_lock, self._conn: # Una transacción por sentencia
+                return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def _add_rows(self, calendar, rows):
+        self._calendar = calendar
+        for row_id, date_str, title, description, section_name, completed in rows:
+            task = self._reusable.pop(row_id, None)
+            if task is None:
+                task = Task(title, description, Section(section_name), row_id)
+            else:
+                # Misma fila tras ``sync``: se conserva el objeto que la interfaz puede tener en pantalla
+                task.title, task.description, task.section = title, description, Section(section_name)
+            task.set_completed(bool(completed))
+            calendar.add_task(date_str, task)
+
+    def load_month(self, calendar, year, month):
+        if self._all_loaded or (year, month) in self._loaded_months:
+            return
+        prefix = f"{year}-{month:02d}-"
+        rows = self._execute(
+            f"SELECT {_COLUMNS} FROM tasks WHERE date BETWEEN ? AND ? ORDER BY date, id",
+            (prefix + "01", prefix + "31"),
+        )
+        self._add_rows(calendar, rows)
+        self._loaded_months.add((year, month))
+
+    def load_all(self, calendar):
+        if self._all_loaded:
+            return
+        rows = self._execute(f"SELECT {_COLUMNS} FROM tasks ORDER BY date, id")
+        # Saltar los meses que ya se cargaron de forma perezosa
+        self._add_rows(calendar, (row for row in rows
+                                  if (int(row[1][:4]), int(row[1][5:7])) not in self._loaded_months))
+        self._all_loaded = True
+
+    def sync(self, calendar):
+        """Si otro proceso modificó la base de datos, recarga los meses ya cargados."""
+        try:
+            with self._conn_lock:
+                data_version = self._read_data_version()
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+        if data_version == self._data_version:
+            return False
+
+        with self._flush_lock:
+            self.flush() # Los cambios propios pendientes se aplican antes de releer
+            with self._conn_lock:
+                self._data_version = self._read_data_version()
+            loaded_months, all_loaded = self._loaded_months, self._all_loaded
+            self._reusable = {task.id: task for _, tasks in calendar.iter_tasks() for task in tasks
+                              if task.id is not None}
+            calendar.replace_tasks({})
+            self._loaded_months, self._all_loaded = set(), False
+            try:
+                if all_loaded:
+                    self.load_all(calendar)
+                else:
+                    for year, month in loaded_months:
+                        self.load_month(calendar, year, month)
+            finally:
+                self._reusable = {}
+        return True
+
+    def writes_pending(self):
+        # ``sync`` aplica antes la cola (y espera a un flush en curso) para no releer filas a medio guardar
+        with self._pending_lock:
+            if self._pending:
+                return True
+        if not self._flush_lock.acquire(blocking=False):
+            return True
+        self._flush_lock.release()
+        return False
+
+    def watch_paths(self):
+        return [self.path, self.path + "-wal", self.path + "-journal"]
+
+    def _enqueue(self, operation, task, values):
+        with self._pending_lock:
+            self._pending.append((operation, task, values))
+
+    def add_task(self, date_str, task):
+        # Con id (al deshacer una eliminación) la fila recupera el suyo si sigue libre
+        self._enqueue('add', task, (task.id, date_str, task.title, task.description, task.section.name,
+                                    int(task.completed)))
+
+    def update_task(self, date_str, index, task):
+        self._enqueue('update', task, (task.title, task.description, task.section.name))
+
+    def toggle_task(self, date_str, index, task):
+        self._enqueue('toggle', task, (int(task.completed),))
+
+    def delete_task(self, date_str, index, task):
+        self._enqueue('delete', task, ())
+
+    def remove_completed_before(self, date_str, task_ids):
+        # En el momento (no en el hilo de escritura) y solo las filas archivadas: una tarea antigua que
+        # otro proceso complete después sigue en la base aunque no esté en el archivo histórico
+        self.flush()
+        try:
+            with self._conn_lock, self._conn:
+                self._conn.executemany("DELETE FROM tasks WHERE id = ?", ((task_id,) for task_id in task_ids))
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        new_ids = {} # Task -> id de su fila (None si se eliminó), para las tareas añadidas en este flush
+        try:
+            with self._conn_lock, self._conn: # Todos los cambios pendientes en una sola transacción
+                for operation, task, values in pending:
+                    if operation == 'add':
+                        cursor = self._conn.execute(
+                            "INSERT OR IGNORE INTO tasks (id, date, title, description, section, completed) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            values,
+                        )
+                        if not cursor.rowcount: # Otra fila ocupó ese id mientras tanto: se le da uno nuevo
+                            cursor = self._conn.execute(
+                                "INSERT INTO tasks (date, title, description, section, completed) VALUES (?, ?, ?, ?, ?)",
+                                values[1:],
+                            )
+                        new_ids[task] = cursor.lastrowid
+                        continue
+
+                    row_id = new_ids.get(task, task.id)
+                    if operation == 'update':
+                        self._conn.execute("UPDATE tasks SET title = ?, description = ?, section = ? WHERE id = ?",
+                                           values + (row_id,))
+                    elif operation == 'toggle':
+                        self._conn.execute("UPDATE tasks SET completed = ? WHERE id = ?", values + (row_id,))
+                    elif operation == 'delete':
+                        self._conn.execute("DELETE FROM tasks WHERE id = ?", (row_id,))
+                        new_ids[task] = None
+        except sqlite3.Error as e:
+            # La transacción se deshizo: devolver los cambios a la cola para reintentarlos
+            with self._pending_lock:
+                self._pending[:0] = pending
+            raise StorageError(str(e)) from e
+
+        added = {task: values[1] for operation, task, values in pending if operation == 'add'}
+        for task, row_id in new_ids.items():
+            if row_id is not None:
+                task.id = row_id
+                if self._calendar is not None:
+                    self._calendar.index_task(added[task], task)
+
+    def iter_rows(self, start=None, end=None, with_ids=False):
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT date, title, description, section, completed, id FROM tasks{where} ORDER BY date, id"
+
+        try:
+            with self._conn_lock:
+                cursor = self._conn.execute(sql, params)
+            while True:
+                # Por bloques: nunca se cargan todas las filas en memoria
+                with self._conn_lock:
+                    rows = cursor.fetchmany(1000)
+                if not rows:
+                    return
+                for date_str, title, description, section_name, completed, task_id in rows:
+                    if with_ids:
+                        yield date_str, title, description, section_name, bool(completed), task_id
+                    else:
+                        yield date_str, title, description, section_name, bool(completed)
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def import_rows(self, rows):
+        """
+        Inserta en una sola transacción tuplas (fecha, titulo, descripcion, seccion, completado).
+        Si traen un sexto elemento (el id, como ``snapshot_rows``), se usa como id de la fila.
+        """
+        try:
+            with self._conn_lock, self._conn:
+                cursor = self._conn.executemany(
+                    "INSERT INTO tasks (id, date, title, description, section, completed) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((row[5] if len(row) > 5 else None, row[0], row[1], row[2], row[3], int(row[4])) for row in rows),
+                )
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def count(self):
+        return self._execute("SELECT COUNT(*) FROM tasks")[0][0]
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def migrate_text_to_sqlite(text_path, db_path):
+    """
+    Migración única de tasks.txt (incluidos los cambios pendientes del diario) a una base SQLite,
+    con copias de su archivo histórico, reglas de repetición y feeds junto a ``db_path``.
+    Devuelve el número de tareas migradas. Falla si la base de datos ya contiene tareas.
+    """
+    sidecars = sidecar_paths(text_path, db_path)
+    hoy = datetime.date.today()
+    calendar = Calendar(hoy.year, hoy.month)
+    text_store = TextTaskStore(text_path)
+    try:
+        text_store.load_all(calendar)
+    finally:
+        text_store.close()
+
+    db_store = SQLiteTaskStore(db_path)
+    try:
+        if db_store.count():
+            raise StorageError(f"La base de datos {db_path} ya contiene tareas.")
+        rows = snapshot_rows(calendar)
+        db_store.import_rows(rows)
+        # Los ids de las tareas eliminadas en el archivo de texto tampoco se reutilizan
+        db_store.reserve_ids(text_store.journal.next_id)
+    finally:
+        db_store.close()
+    copy_sidecars(sidecars)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # Uso: python -m agenda.sqlite_store tasks.txt tasks.db
+    if len(sys.argv) != 3:
+        sys.exit("Uso: python -m agenda.sqlite_store <tasks.txt> <tasks.db>")
+    try:
+        migrated = migrate_text_to_sqlite(sys.argv[1], sys.argv[2])
+    except StorageError as e:
+        sys.exit(f"Error: {e}")
+    print(f"{migrated} tareas migradas a {sys.argv[2]}")
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(sys.argv[2] + suffix):
+            print(f"Copiado {sys.argv[2] + suffix}")
@@ -0,0 +1,493 @@
+"""
+Persistencia de tareas: interfaz común de los backends y formato de texto plano
+FECHA|TITULO|DESCRIPCION|SECCION|COMPLETADO|ID.
+
+La primera línea del snapshot puede ser una cabecera ``#agenda seq=N next_id=M``: el número
+del último registro del diario que el snapshot ya incluye y el próximo id de tarea libre.
+
+Las líneas del formato anterior no tienen id: reciben ``next_id`` más su número de línea (desde
+0, sin contar la cabecera), así todos los procesos les dan el mismo id al leer el mismo archivo,
+y ``next_id`` pasa a ser el primero después de ellas. La siguiente compactación los guarda.
+"""
+
+import gc
+import os
+import shutil
+
+from agenda.sections import Section
+from agenda.tasks import Task
+
+PIPE_ESCAPE = '{{PIPE}}'
+# Los saltos de línea (descripciones importadas de iCalendar o CSV) partirían la tarea en varias líneas
+FIELD_ESCAPES = (('|', PIPE_ESCAPE), ('\r', '{{CR}}'), ('\n', '{{NL}}'))
+ESCAPE_MARK = '{{' # Todas las sustituciones empiezan así
+SNAPSHOT_HEADER = '#agenda seq='
+BINARY_EXTENSION = '.agb' # Snapshot binario (agenda.binary_store)
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+# Archivos que acompañan al de tareas y se refieren a ellas por id (valen con cualquier backend)
+ARCHIVE_SUFFIX = '.archive' # Directorio del archivo histórico por años (agenda.archive)
+RULES_SUFFIX = '.rules.json' # Reglas de repetición (agenda.recurrence)
+FEEDS_SUFFIX = '.feeds.json' # Calendarios sincronizados por UID (agenda.feeds)
+SIDECAR_SUFFIXES = (ARCHIVE_SUFFIX, RULES_SUFFIX, FEEDS_SUFFIX)
+
+
+def escape_field(value):
+    """Reemplaza el separador y los saltos de línea en los datos para evitar conflictos."""
+    for char, escaped in FIELD_ESCAPES:
+        if char in value:
+            value = value.replace(char, escaped)
+    return value
+
+
+def unescape_field(value):
+    """Restaura el separador y los saltos de línea si fueron reemplazados."""
+    if ESCAPE_MARK not in value:
+        return value
+    for char, escaped in FIELD_ESCAPES:
+        value = value.replace(escaped, char)
+    return value
+
+
+def format_task_line(date_str, title, description, section_name, completed, task_id):
+    """Crea la línea con el formato: FECHA|TITULO|DESCRIPCION|SECCION|COMPLETADO|ID."""
+    return (f"{date_str}|{escape_field(title)}|{escape_field(description)}|{escape_field(section_name)}"
+            f"|{completed}|{task_id}")
+
+
+def parse_task_line(line):
+    """
+    Interpreta una línea del snapshot.
+    Devuelve (fecha, titulo, descripcion, seccion, completado, id) o None si la línea está vacía o mal formada.
+    El id es None en las líneas del formato anterior.
+    """
+    line = line.strip()
+    if not line:
+        return None
+
+    parts = line.split('|', 5)
+    if len(parts) == 5:
+        parts.append(None)
+    elif len(parts) != 6:
+        return None
+
+    date_str, title, description, section_name, completed_str, task_id = parts
+    if task_id is not None:
+        if not task_id.isdecimal():
+            return None
+        task_id = int(task_id)
+    return (date_str, unescape_field(title), unescape_field(description),
+            unescape_field(section_name), completed_str == 'True', task_id)
+
+
+def format_snapshot_header(seq, next_id):
+    return f"{SNAPSHOT_HEADER}{seq} next_id={next_id}"
+
+
+def _read_header(f):
+    """
+    Lee la cabecera si existe. Devuelve (seq, next_id, número de la primera línea de tareas)
+    y deja ``f`` en ella. Sin cabecera, o en las del formato anterior, ``next_id`` es 1.
+    """
+    first = f.readline()
+    if first.startswith(SNAPSHOT_HEADER):
+        fields = dict(field.split('=', 1) for field in first[1:].split()[1:])
+        return int(fields['seq']), int(fields.get('next_id', 1)), 2
+    f.seek(0)
+    return 0, 1, 1
+
+
+def read_snapshot_seq(path):
+    """Número de secuencia de la cabecera del snapshot (0 si no tiene cabecera o no existe)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return _read_header(f)[0]
+    except FileNotFoundError:
+        return 0
+
+
+def read_snapshot_next_id(path, chunk_size=1 << 22):
+    """
+    Próximo id libre del snapshot, el mismo que daría ``read_snapshot``, sin crear las tareas:
+    solo recorre el archivo si hay que contar las líneas sin id. 1 si no existe.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            _, first_id, _ = _read_header(f)
+            line_index = 0
+            has_legacy = False
+            for chunk in iter(lambda: f.readlines(chunk_size), []):
+                has_legacy = has_legacy or "".join(chunk).count('|') != 5 * len(chunk)
+                line_index += len(chunk)
+    except FileNotFoundError:
+        return 1
+    return first_id + line_index if has_legacy else first_id
+
+
+def snapshot_in_date_order(path, chunk_size=1 << 22):
+    """
+    Indica si las líneas del snapshot están ordenadas por fecha. Los snapshots con cabecera los
+    escribe una compactación y siempre lo están; un tasks.txt del formato anterior se guardaba en
+    el orden de inserción y puede repartir una fecha en varios tramos. True si no existe.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.readline().startswith(SNAPSHOT_HEADER):
+                return True
+            f.seek(0)
+            previous = ""
+            for chunk in iter(lambda: f.readlines(chunk_size), []):
+                dates = [line[:10] for line in chunk if line.strip()]
+                if dates and (dates[0] < previous or dates != sorted(dates)):
+                    return False
+                previous = dates[-1] if dates else previous
+    except FileNotFoundError:
+        pass
+    return True
+
+
+class LoadReport:
+    """Resultado de una carga: tareas leídas y líneas mal formadas ignoradas."""
+
+    def __init__(self):
+        self.loaded = 0
+        self.malformed = 0
+        self.first_malformed_line = None # Número (1-based) de la primera línea mal formada
+        self.seq = 0 # Cabecera del snapshot: último registro del diario incluido
+        self.next_id = 1 # Próximo id de tarea libre según el snapshot
+
+
+def read_snapshot(path, chunk_size=1 << 22, date_prefix=None, progress=None):
+    """
+    Lee el snapshot en streaming, por bloques de ~``chunk_size`` bytes (nunca el archivo completo),
+    y agrupa las tareas por fecha en una sola pasada.
+    Con ``date_prefix`` (p. ej. "2025-01-") solo interpreta las líneas de esas fechas; el resto
+    se descarta sin partirlas. ``progress(fracción)`` se llama tras cada bloque.
+    Devuelve (tareas_por_fecha, LoadReport); ``report.seq`` y ``report.next_id`` salen de la cabecera.
+    """
+    tasks_by_date = {}
+    appenders = {} # fecha -> list.append, evita buscar la lista por cada tarea
+    report = LoadReport()
+    sections = {} # Caché local de secciones internadas
+
+    # Crear millones de objetos dispara el recolector de ciclos una y otra vez sin liberar nada
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            size = os.fstat(f.fileno()).st_size or 1
+            consumed = 0
+            report.seq, first_id, first_line_number = _read_header(f)
+            line_index = 0 # Líneas leídas después de la cabecera: dan el id de las líneas sin id
+            has_legacy = False
+            for chunk in iter(lambda: f.readlines(chunk_size), []):
+                line_count = len(chunk)
+                if progress is not None:
+                    consumed += sum(map(len, chunk)) # Caracteres, no bytes: basta para una estimación
+                    progress(min(consumed / size, 1.0))
+
+                # Cada línea con id tiene 5 separadores: si no cuadran, alguna es del formato anterior
+                # (o está vacía o mal formada) y el bloque se parte línea a línea
+                text = "".join(chunk)
+                rows = None
+                if text.count('|') == 5 * line_count:
+                    lines = chunk if date_prefix is None else [line for line in chunk if line.startswith(date_prefix)]
+                    # Partir todas las líneas del bloque con comprensiones (bucle en C)
+                    rows = [line.strip().split('|', 5) for line in lines]
+                    valid_rows = [parts for parts in rows if len(parts) == 6]
+                    try:
+                        ids = [int(parts[5]) for parts in valid_rows]
+                    except ValueError:
+                        rows = None
+                if rows is None:
+                    has_legacy = True
+                    rows = _split_numbered(chunk, first_id + line_index, date_prefix)
+                    valid_rows = [parts for parts in rows if len(parts) == 6]
+                    ids = [int(parts[5]) for parts in valid_rows]
+                if len(valid_rows) != len(rows):
+                    _count_malformed(rows, first_line_number, report)
+
+                # Solo se restauran los escapes en los bloques que los usan (la búsqueda en el texto unido es en C)
+                if ESCAPE_MARK in text:
+                    for parts in valid_rows:
+                        parts[1:4] = [unescape_field(field) for field in parts[1:4]]
+
+                for (date_str, title, description, section_name, completed_str, _), task_id in zip(valid_rows, ids):
+                    section = sections.get(section_name)
+                    if section is None:
+                        section = sections[section_name] = Section(section_name)
+
+                    task = Task(title, description, section, task_id)
+                    if completed_str == 'True':
+                        task.completed = True
+
+                    append = appenders.get(date_str)
+                    if append is None:
+                        tasks_by_date[date_str] = [task]
+                        appenders[date_str] = tasks_by_date[date_str].append
+                    else:
+                        append(task)
+
+                report.loaded += len(valid_rows)
+                first_line_number += line_count
+                line_index += line_count
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    # Los ids que recibieron las líneas sin id quedan ocupados
+    report.next_id = first_id + line_index if has_legacy else first_id
+    return tasks_by_date, report
+
+
+def _split_numbered(chunk, first_id, date_prefix):
+    """Parte las líneas de un bloque dando a las que no tienen id el suyo: ``first_id`` más su posición."""
+    rows = []
+    for offset, line in enumerate(chunk):
+        if date_prefix is not None and not line.startswith(date_prefix):
+            continue
+        parts = line.strip().split('|', 5)
+        if len(parts) == 5:
+            parts.append(first_id + offset)
+        elif len(parts) == 6 and not parts[5].isdecimal():
+            parts.pop() # Id ilegible: la línea cuenta como mal formada
+        rows.append(parts)
+    return rows
+
+
+def _count_malformed(rows, first_line_number, report):
+    for offset, parts in enumerate(rows):
+        if len(parts) != 6 and parts != ['']: # Las líneas vacías no cuentan como errores
+            report.malformed += 1
+            if report.first_malformed_line is None:
+                report.first_malformed_line = first_line_number + offset
+
+
+def iter_snapshot_rows(f, report=None):
+    """
+    Recorre un snapshot abierto línea a línea, sin cargarlo en memoria, devolviendo tuplas
+    (fecha, titulo, descripcion, seccion, completado, id) en el orden del archivo. Cierra ``f`` al terminar.
+    """
+    with f:
+        _, first_id, first_line_number = _read_header(f)
+        for line_index, line in enumerate(f):
+            row = parse_task_line(line)
+            if row is not None and row[5] is None:
+                row = row[:5] + (first_id + line_index,) # Línea sin id: el mismo que le da ``read_snapshot``
+            if row is not None:
+                yield row
+            elif report is not None and line.strip():
+                report.malformed += 1
+                if report.first_malformed_line is None:
+                    report.first_malformed_line = first_line_number + line_index
+
+
+def rows_in_range(rows, start=None, end=None):
+    """Filtra filas (fecha, ...) con la fecha entre ``start`` y ``end`` (cadenas YYYY-MM-DD, incluidas)."""
+    if start is None and end is None:
+        return rows
+    return (row for row in rows
+            if (start is None or row[0] >= start) and (end is None or row[0] <= end))
+
+
+def snapshot_rows(calendar):
+    """
+    Copia el estado del calendario como tuplas (fecha, titulo, descripcion, seccion, completado, id),
+    sin las tareas que se muestran desde el archivo histórico.
+    """
+    archived = calendar.archived_ids
+    return [
+        (date_str, task.title, task.description, task.section.name, task.completed, task.id)
+        for date_str, tasks_list in calendar.iter_tasks()
+        for task in tasks_list
+        if not archived or task.id not in archived
+    ]
+
+
+class TextSnapshotFormat:
+    """
+    Formato de snapshot de texto (tasks.txt). Los formatos de snapshot ofrecen la misma interfaz
+    para que el diario y los backends no dependan de cómo se guardan las tareas en disco.
+    """
+
+    def read(self, path, date_prefix=None, progress=None):
+        """(tareas_por_fecha, LoadReport), opcionalmente solo de las fechas que empiezan por ``date_prefix``."""
+        return read_snapshot(path, date_prefix=date_prefix, progress=progress)
+
+    def read_seq(self, path):
+        return read_snapshot_seq(path)
+
+    def read_next_id(self, path):
+        return read_snapshot_next_id(path)
+
+    def in_date_order(self, path):
+        """Si ``iter_rows`` devuelve las fechas en orden (si no, hay que cargar el snapshot para ordenarlo)."""
+        return snapshot_in_date_order(path)
+
+    def iter_rows(self, path, report=None):
+        """Recorre las tareas como tuplas (fecha, titulo, descripcion, seccion, completado, id) en streaming."""
+        return iter_snapshot_rows(open(path, 'r', encoding='utf-8'), report)
+
+    def write(self, path, rows, seq, next_id):
+        """Escribe (con fsync) un snapshot con las filas (con id) y la cabecera ``seq``/``next_id``."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(format_snapshot_header(seq, next_id) + "\n")
+            f.write("\n".join(format_task_line(*row) for row in rows))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+TEXT_SNAPSHOT = TextSnapshotFormat()
+
+
+class StorageError(IOError):
+    """Error de un backend de almacenamiento (p. ej. SQLite) expresado como IOError."""
+
+
+class TaskStore:
+    """
+    Interfaz común de persistencia de tareas.
+
+    Los métodos de modificación reciben la fecha, la posición de la tarea dentro de esa
+    fecha (antes del cambio) y el objeto Task, para que cada backend use lo que necesite.
+    Se llaman desde el hilo principal y solo copian los datos del cambio; la E/S real
+    ocurre en ``flush``, que ejecuta el hilo de escritura.
+
+    Cada backend da a las tareas nuevas un id estable (``Task.id``) y lo conserva al cargarlas;
+    ``add_task`` lo asigna si la tarea aún no tiene, o mantiene el suyo (al deshacer una eliminación).
+    """
+
+    load_report = None # LoadReport de la última carga completa, si el backend lo ofrece
+    preloading = False # Hay una lectura de ``preload`` sin incorporar
+
+    def load_all(self, calendar):
+        """Asegura que el calendario contiene todas las tareas guardadas."""
+        raise NotImplementedError
+
+    def load_month(self, calendar, year, month):
+        """Asegura que el calendario contiene al menos las tareas del mes indicado."""
+        raise NotImplementedError
+
+    def preload(self, progress=None):
+        """
+        Empieza a leer en otro hilo el historial completo, si el backend necesita leerlo de una vez.
+        ``progress(fracción)`` se llama desde ese hilo. Devuelve True si empezó una lectura.
+        """
+        return False
+
+    def finish_preload(self, calendar, wait=False):
+        """Incorpora al calendario la lectura de ``preload`` si terminó (o esperándola). Devuelve True si la incorporó."""
+        return False
+
+    def add_task(self, date_str, task):
+        raise NotImplementedError
+
+    def update_task(self, date_str, index, task):
+        raise NotImplementedError
+
+    def toggle_task(self, date_str, index, task):
+        raise NotImplementedError
+
+    def delete_task(self, date_str, index, task):
+        raise NotImplementedError
+
+    def remove_completed_before(self, date_str, task_ids):
+        """
+        Elimina las tareas completadas anteriores a ``date_str`` (ya copiadas al archivo histórico),
+        las mismas que ``Calendar.remove_completed_before`` con el calendario completo cargado.
+        ``task_ids`` son sus ids. Se llama con el lock de la agenda tomado.
+        """
+        raise NotImplementedError
+
+    def iter_rows(self, start=None, end=None, with_ids=False):
+        """
+        Recorre en streaming las tareas guardadas en disco como tuplas (fecha, titulo, descripcion,
+        seccion, completado), opcionalmente solo las fechas entre ``start`` y ``end`` (YYYY-MM-DD, incluidas).
+        Con ``with_ids`` las tuplas llevan el id como sexto elemento.
+        Dentro de cada fecha respeta el mismo orden que la carga en el calendario.
+        """
+        raise NotImplementedError
+
+    def import_rows(self, rows):
+        """
+        Añade directamente al almacenamiento un iterable de tuplas (fecha, titulo, descripcion,
+        seccion, completado) en una sola pasada y sin retenerlas en memoria; cada tarea recibe un
+        id nuevo. No modifica un calendario ya cargado. Devuelve el número de tareas añadidas.
+        """
+        raise NotImplementedError
+
+    def sync(self, calendar):
+        """
+        Incorpora al calendario los cambios que otros procesos guardaron desde la última lectura.
+        Devuelve True si el calendario cambió. Las tareas pueden sustituirse por objetos nuevos.
+        """
+        return False
+
+    def writes_pending(self):
+        """True si hay cambios propios encolados o escribiéndose que ``sync`` tendría que esperar."""
+        return False
+
+    def watch_paths(self):
+        """Archivos cuya modificación indica que otro proceso guardó cambios."""
+        return []
+
+    def checkpoint(self, calendar, force=False):
+        """Prepara la consolidación de los cambios si el backend lo necesita (o siempre, con ``force``)."""
+
+    def flush(self):
+        """Escribe en disco los cambios pendientes. Se ejecuta en el hilo de escritura."""
+
+    def close(self):
+        """Libera los recursos del backend."""
+
+
+def open_store(path):
+    """Elige el backend según la extensión: .db/.sqlite/.sqlite3 usan SQLite, .agb el snapshot binario y el resto texto plano."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in SQLITE_EXTENSIONS:
+        from agenda.sqlite_store import SQLiteTaskStore
+        return SQLiteTaskStore(path)
+    if extension == BINARY_EXTENSION:
+        from agenda.binary_store import BinaryTaskStore
+        return BinaryTaskStore(path)
+    from agenda.text_store import TextTaskStore
+    return TextTaskStore(path)
+
+
+def file_identity(path):
+    """Identidad de un archivo (dispositivo, inodo, tamaño, mtime): cambia si otro proceso lo reescribe. None si no existe."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def sidecar_paths(source_path, target_path):
+    """
+    Pares (origen, destino) de los archivos que acompañan a ``source_path`` y hay que llevar junto
+    a ``target_path`` al convertir o migrar la agenda. StorageError si alguno ya existe en el destino.
+    """
+    pairs = [(source_path + suffix, target_path + suffix) for suffix in SIDECAR_SUFFIXES
+             if os.path.exists(source_path + suffix)]
+    for _, target in pairs:
+        if os.path.exists(target):
+            raise StorageError(f"{target} ya existe.")
+    return pairs
+
+
+def copy_sidecars(pairs):
+    """Copia los pares de ``sidecar_paths`` (los ids de las tareas se conservan, así que siguen valiendo)."""
+    for source, target in pairs:
+        if os.path.isdir(source):
+            shutil.copytree(source, target)
+        else:
+            shutil.copy2(source, target)
+
+
+def write_atomic(path, text):
+    """Escribe ``text`` en ``path`` de forma atómica: archivo temporal, fsync y renombrado."""
+    tmp_path = f"{path}.{os.getpid()}.tmp" # Un temporal por proceso
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,253 @@
+"""
+Formulario de tareas reutilizable: una sola ventana para añadir y editar tareas.
+
+La ventana se construye la primera vez y después solo se oculta (``withdraw``) y se vuelve a
+mostrar (``deiconify``) con los campos rellenados. En modo rápido, cada Enter guarda la tarea
+y deja el formulario abierto en el día siguiente, listo para escribir la próxima.
+"""
+
+import datetime
+import tkinter as tk
+from tkinter import ttk
+
+from agenda.search import fold_text
+
+REPEAT_OPTIONS = {"No se repite": None, "Cada día": "daily", "Cada semana": "weekly", "Cada mes": "monthly"}
+WEEKDAY_NAMES = ["lun", "mar", "mie", "jue", "vie", "sab", "dom"]
+
+
+class TaskEntry:
+    """Datos validados del formulario. ``freq`` es None si la tarea no se repite."""
+
+    __slots__ = ('date', 'title', 'description', 'section', 'freq', 'weekdays', 'until', 'count')
+
+    def __init__(self, date, title, description, section, freq=None, weekdays=(), until=None, count=None):
+        self.date = date
+        self.title = title
+        self.description = description
+        self.section = section
+        self.freq = freq
+        self.weekdays = list(weekdays)
+        self.until = until
+        self.count = count
+
+
+def parse_weekdays(text, default):
+    """'Lun, Mié' -> [0, 2]. Vacío devuelve [default]. ValueError si un día no existe."""
+    weekdays = set()
+    for name in text.replace(",", " ").split():
+        folded = fold_text(name)[:3]
+        if folded not in WEEKDAY_NAMES:
+            raise ValueError(f"Día de la semana desconocido: {name}")
+        weekdays.add(WEEKDAY_NAMES.index(folded))
+    return sorted(weekdays) or [default]
+
+
+def parse_end(text):
+    """Fin de la repetición: (fecha final, número de repeticiones); vacío = (None, None)."""
+    text = text.strip()
+    if not text:
+        return None, None
+    if text.isdigit():
+        return None, int(text)
+    try:
+        return datetime.datetime.strptime(text, "%d-%m-%Y").date(), None
+    except ValueError:
+        raise ValueError("Use una fecha DD-MM-YYYY o un número de repeticiones.") from None
+
+
+class TaskForm(tk.Toplevel):
+    """
+    Ventana modal para añadir (``ask_new``) o editar (``ask_edit``) una tarea. ``on_submit``
+    recibe un TaskEntry y devuelve True si la tarea se guardó; si no, el formulario sigue
+    abierto con lo escrito. Las secciones propias usadas recientemente se ofrecen junto a las
+    predefinidas.
+    """
+
+    RECENT_SECTIONS = 5 # Secciones propias que se recuerdan (la más reciente primero)
+
+    def __init__(self, master, sections, bg_color):
+        super().__init__(master)
+        self.withdraw() # Se muestra al pedir la primera tarea
+        self.predefined_sections = list(sections)
+        self.recent_sections = []
+        self.on_submit = None
+        self.date = None
+        self.task = None # Tarea que se edita; None al añadir
+
+        self.title("Tarea")
+        self.configure(bg=bg_color)
+        self.resizable(False, False)
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+        self.bind("<Return>", self.submit)
+        self.bind("<KP_Enter>", self.submit)
+        self.bind("<Escape>", self.hide)
+
+        self.title_var = tk.StringVar(self)
+        self.description_var = tk.StringVar(self)
+        self.section_var = tk.StringVar(self)
+        self.repeat_var = tk.StringVar(self, value=next(iter(REPEAT_OPTIONS)))
+        self.weekdays_var = tk.StringVar(self)
+        self.end_var = tk.StringVar(self)
+        self.rapid_var = tk.BooleanVar(self, value=False)
+
+        body = ttk.Frame(self, padding=10)
+        body.pack(fill="both", expand=True)
+        body.columnconfigure(1, weight=1)
+
+        self.heading = ttk.Label(body, style='Dialog.TLabel')
+        self.heading.grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 8))
+
+        self.title_entry = ttk.Entry(body, textvariable=self.title_var, width=40, style='Dialog.TEntry')
+        self._row(body, 1, "Título:", self.title_entry)
+        self._row(body, 2, "Descripción:", ttk.Entry(body, textvariable=self.description_var, width=40,
+                                                     style='Dialog.TEntry'))
+        self.section_box = ttk.Combobox(body, textvariable=self.section_var)
+        self._row(body, 3, "Sección:", self.section_box)
+
+        # Solo al añadir: repetición y modo rápido
+        repeat_box = ttk.Combobox(body, textvariable=self.repeat_var, values=list(REPEAT_OPTIONS), state="readonly")
+        repeat_box.bind("<<ComboboxSelected>>", lambda e: self._show_repeat_fields())
+        self.repeat_row = self._row(body, 4, "Repetir:", repeat_box)
+        self.weekdays_row = self._row(body, 5, "Días (Lun, Mié...):", ttk.Entry(body, textvariable=self.weekdays_var))
+        self.end_row = self._row(body, 6, "Fin (DD-MM-YYYY o nº):", ttk.Entry(body, textvariable=self.end_var))
+        self.rapid_check = ttk.Checkbutton(body, text="Entrada rápida: Enter guarda y pasa al día siguiente",
+                                           variable=self.rapid_var)
+        self.rapid_check.grid(row=7, column=0, columnspan=2, sticky="w", pady=(6, 0))
+
+        self.message = ttk.Label(body, text="", wraplength=380)
+        self.message.grid(row=8, column=0, columnspan=2, sticky="w", pady=(6, 0))
+
+        buttons = ttk.Frame(body)
+        buttons.grid(row=9, column=0, columnspan=2, pady=(8, 0))
+        ttk.Button(buttons, text="Guardar", width=10, command=self.submit).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Cerrar", width=10, command=self.hide).pack(side="left", padx=5)
+
+    @staticmethod
+    def _row(parent, row, text, widget):
+        label = ttk.Label(parent, text=text)
+        label.grid(row=row, column=0, sticky="w", padx=(0, 8), pady=3)
+        widget.grid(row=row, column=1, sticky="ew", pady=3)
+        return label, widget
+
+    @staticmethod
+    def _set_visible(widgets, visible):
+        for widget in widgets:
+            if visible:
+                widget.grid()
+            else:
+                widget.grid_remove()
+
+    # --- Mostrar y ocultar ---
+
+    def ask_new(self, date, on_submit, parent=None):
+        """Muestra el formulario vacío para añadir una tarea el ``date`` (la sección se conserva)."""
+        self.task = None
+        self.on_submit = on_submit
+        self._set_date(date)
+        self.title_var.set("")
+        self.description_var.set("")
+        self.repeat_var.set(next(iter(REPEAT_OPTIONS)))
+        self.weekdays_var.set("")
+        self.end_var.set("")
+        self._set_visible(self.repeat_row + (self.rapid_check,), True)
+        self._show_repeat_fields()
+        self._show(parent, "Nueva tarea")
+
+    def ask_edit(self, date, task, on_submit, parent=None):
+        """Muestra el formulario con los datos de ``task``. Un título o sección vacíos se conservan."""
+        self.task = task
+        self.on_submit = on_submit
+        self._set_date(date)
+        self.title_var.set(task.title)
+        self.description_var.set(task.description)
+        self.section_var.set(task.section.name)
+        self._set_visible(self.repeat_row + self.weekdays_row + self.end_row + (self.rapid_check,), False)
+        self._show(parent, "Editar tarea")
+
+    def _show(self, parent, title):
+        parent = parent or self.master
+        self.title(title)
+        self.message.configure(text="")
+        self._update_sections()
+        self.transient(parent)
+        # Centrado sobre la ventana de origen con el tamaño que piden los campos visibles
+        self.update_idletasks()
+        x = parent.winfo_rootx() + (parent.winfo_width() - self.winfo_reqwidth()) // 2
+        y = parent.winfo_rooty() + (parent.winfo_height() - self.winfo_reqheight()) // 2
+        self.geometry(f"+{max(x, 0)}+{max(y, 0)}")
+        self.deiconify()
+        self.lift()
+        self.grab_set()
+        self.title_entry.focus_set()
+        self.title_entry.select_range(0, tk.END)
+
+    def hide(self, event=None):
+        self.grab_release()
+        self.withdraw()
+        self.on_submit = None
+        self.task = None
+
+    def _set_date(self, date):
+        self.date = date
+        verb = "Editar la tarea del" if self.task is not None else "Tarea para el"
+        self.heading.configure(text=f"{verb} {date.strftime('%d-%m-%Y')}")
+
+    def _show_repeat_fields(self):
+        freq = REPEAT_OPTIONS[self.repeat_var.get()]
+        self._set_visible(self.weekdays_row, freq == "weekly")
+        self._set_visible(self.end_row, freq is not None)
+
+    def _update_sections(self):
+        self.section_box.configure(values=self.predefined_sections + self.recent_sections)
+
+    def remember_section(self, name):
+        """Pone una sección propia al principio de las recientes."""
+        if name in self.predefined_sections or name == "General":
+            return
+        if name in self.recent_sections:
+            self.recent_sections.remove(name)
+        self.recent_sections.insert(0, name)
+        del self.recent_sections[self.RECENT_SECTIONS:]
+        self._update_sections()
+
+    # --- Guardar ---
+
+    def read_entry(self):
+        """Valida los campos y devuelve un TaskEntry. ValueError con el motivo si no son válidos."""
+        title = self.title_var.get().strip()
+        section = self.section_var.get().strip()
+        if self.task is not None:
+            return TaskEntry(self.date, title or self.task.title, self.description_var.get(),
+                             section or self.task.section.name)
+        if not title:
+            raise ValueError("Escriba un título.")
+        freq = REPEAT_OPTIONS[self.repeat_var.get()]
+        entry = TaskEntry(self.date, title, self.description_var.get(), section or "General", freq)
+        if freq is not None:
+            if freq == "weekly":
+                entry.weekdays = parse_weekdays(self.weekdays_var.get(), self.date.weekday())
+            entry.until, entry.count = parse_end(self.end_var.get())
+        return entry
+
+    def submit(self, event=None):
+        if self.on_submit is None:
+            return
+        try:
+            entry = self.read_entry()
+        except ValueError as e:
+            self.message.configure(text=str(e))
+            return
+        if not self.on_submit(entry):
+            return
+        self.remember_section(entry.section)
+
+        if self.task is not None or not self.rapid_var.get():
+            self.hide()
+            return
+        # Modo rápido: la siguiente tarea va al día siguiente, con la misma sección y repetición
+        self.message.configure(text=f"Guardada '{entry.title}' el {self.date.strftime('%d-%m-%Y')}.")
+        self._set_date(self.date + datetime.timedelta(days=1))
+        self.title_var.set("")
+        self.description_var.set("")
+        self.title_entry.focus_set()
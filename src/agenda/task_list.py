@@ -0,0 +1,174 @@
+import datetime
+import tkinter as tk
+from tkinter import ttk
+
+
+class _RowSlot:
+    """Conjunto de widgets reutilizable que muestra una fila (encabezado de fecha o tarea)."""
+
+    def __init__(self, task_list):
+        self.frame = ttk.Frame(task_list.canvas)
+        self.header = ttk.Label(self.frame, font=("Arial", 12, "bold"), foreground=task_list.header_color)
+        self.var = tk.BooleanVar(self.frame)
+        self.check = ttk.Checkbutton(self.frame, variable=self.var)
+        self.actions = ttk.Frame(self.frame)
+        self.edit_button = ttk.Button(self.actions, text="Editar")
+        self.edit_button.pack(side=tk.LEFT, padx=(0, 5))
+        self.delete_button = ttk.Button(self.actions, text="Eliminar", style='Danger.TButton')
+        self.delete_button.pack(side=tk.RIGHT, padx=(0, 5))
+        self.window_id = task_list.canvas.create_window((0, 0), window=self.frame, anchor="nw")
+        self.mode = None
+
+    def show_header(self, date_str):
+        if self.mode != 'header':
+            self.check.pack_forget()
+            self.actions.pack_forget()
+            self.header.pack(anchor="w", padx=10, pady=(8, 0))
+            self.mode = 'header'
+        try:
+            display_date = datetime.datetime.strptime(date_str, "%Y-%m-%d").strftime("%d-%m-%Y")
+        except ValueError:
+            display_date = date_str
+        self.header.configure(text=f"--- Tareas para el {display_date} ---")
+
+    def show_task(self, task_list, date_str, task):
+        if self.mode != 'task':
+            self.header.pack_forget()
+            self.check.pack(side=tk.LEFT, anchor="w", padx=10, pady=2)
+            self.actions.pack(side=tk.RIGHT, padx=(0, 5))
+            self.mode = 'task'
+        self.var.set(task.completed)
+        self.check.configure(
+            text=f"{task.title} ({task.section.name})",
+            command=lambda: task_list.on_toggle(date_str, task, self.var)
+        )
+        self.edit_button.configure(command=lambda: task_list.on_edit(date_str, task))
+        self.delete_button.configure(command=lambda: task_list.on_delete(date_str, task))
+
+
+class VirtualTaskList(ttk.Frame):
+    """
+    Lista virtualizada para la ventana "Historial de Tareas".
+
+    Solo existen widgets para las filas visibles (más una de margen) y se reutilizan al
+    desplazarse, de modo que el tiempo de apertura y la memoria de Tk dependen del
+    tamaño de la ventana y no de cuántas tareas hay en el historial.
+    """
+
+    ROW_HEIGHT = 36
+
+    def __init__(self, master, on_toggle, on_edit, on_delete, bg_color, header_color):
+        super().__init__(master)
+        self.on_toggle = on_toggle # (fecha, tarea, BooleanVar)
+        self.on_edit = on_edit # (fecha, tarea)
+        self.on_delete = on_delete # (fecha, tarea)
+        self.header_color = header_color
+
+        self.rows = [] # (fecha, tarea); tarea es None en los encabezados de fecha
+        self._slots = []
+        self._slot_by_task = {} # Vista-modelo: tarea visible -> widgets de su fila
+
+        self.canvas = tk.Canvas(self, bg=bg_color, highlightthickness=0, yscrollincrement=self.ROW_HEIGHT)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.canvas.bind("<Configure>", self._on_resize)
+        # La ventana de nivel superior recibe la rueda del ratón de todos sus widgets hijos
+        toplevel = self.winfo_toplevel()
+        toplevel.bind("<MouseWheel>", self._on_mousewheel)
+        toplevel.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        toplevel.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    def set_tasks(self, dated_tasks):
+        """Recibe un iterable de (fecha, tareas) en orden y construye la lista plana de filas."""
+        self.rows = []
+        for date_str, tasks in dated_tasks:
+            self.rows.append((date_str, None))
+            self.rows.extend((date_str, task) for task in tasks)
+        self.canvas.configure(scrollregion=(0, 0, 0, len(self.rows) * self.ROW_HEIGHT))
+        self.refresh()
+
+    def update_task(self, date_str, task):
+        """Actualiza en su sitio la fila de una tarea editada (solo si está visible)."""
+        slot = self._slot_by_task.get(task)
+        if slot is not None:
+            slot.show_task(self, date_str, task)
+
+    def remove_task(self, date_str, task):
+        """Quita la fila de una tarea (y el encabezado si la fecha queda vacía) conservando el desplazamiento."""
+        index = self.rows.index((date_str, task))
+        header_index = index - 1
+        while self.rows[header_index][1] is not None:
+            header_index -= 1
+
+        next_is_same_date = index + 1 < len(self.rows) and self.rows[index + 1][1] is not None
+        if header_index == index - 1 and not next_is_same_date:
+            del self.rows[header_index:index + 1] # Era la única tarea de la fecha
+        else:
+            del self.rows[index]
+
+        self._update_scrollregion()
+
+    def _update_scrollregion(self):
+        """Ajusta el área desplazable al número de filas conservando la posición actual."""
+        top = self.canvas.canvasy(0)
+        height = len(self.rows) * self.ROW_HEIGHT
+        self.canvas.configure(scrollregion=(0, 0, 0, height))
+        if height:
+            self.canvas.yview_moveto(top / height)
+        self.refresh()
+
+    def remove_rows(self, predicate):
+        """Quita las tareas para las que ``predicate(fecha, tarea)`` es verdadero, y los encabezados que queden vacíos."""
+        kept = []
+        for date_str, task in self.rows:
+            if task is None:
+                if kept and kept[-1][1] is None:
+                    kept.pop() # El encabezado anterior se quedó sin tareas
+                kept.append((date_str, task))
+            elif not predicate(date_str, task):
+                kept.append((date_str, task))
+        if kept and kept[-1][1] is None:
+            kept.pop()
+        self.rows = kept
+        self._update_scrollregion()
+
+    def refresh(self):
+        """Vuelve a pintar las filas visibles con los widgets reutilizables."""
+        first = int(self.canvas.canvasy(0)) // self.ROW_HEIGHT
+        self._slot_by_task = {}
+        for offset, slot in enumerate(self._slots):
+            index = first + offset
+            if index >= len(self.rows):
+                self.canvas.itemconfigure(slot.window_id, state="hidden")
+                continue
+
+            self.canvas.itemconfigure(slot.window_id, state="normal")
+            self.canvas.coords(slot.window_id, 0, index * self.ROW_HEIGHT)
+            date_str, task = self.rows[index]
+            if task is None:
+                slot.show_header(date_str)
+            else:
+                slot.show_task(self, date_str, task)
+                self._slot_by_task[task] = slot
+
+    def _on_resize(self, event):
+        # Suficientes filas para cubrir la altura visible más una parcialmente desplazada
+        needed = event.height // self.ROW_HEIGHT + 2
+        while len(self._slots) < needed:
+            self._slots.append(_RowSlot(self))
+        for slot in self._slots:
+            self.canvas.itemconfigure(slot.window_id, width=event.width, height=self.ROW_HEIGHT)
+        self.refresh()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        self.canvas.yview_scroll(-1 if event.delta > 0 else 1, "units")
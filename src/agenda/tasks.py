@@ -1,5 +1,10 @@
 class Task:
-    def __init__(self, title, description, section):
+    # Sin __dict__ por instancia: reduce la memoria cuando se cargan muchas tareas
+    __slots__ = ('id', 'title', 'description', 'section', 'completed')
+
+    def __init__(self, title, description, section, task_id=None):
+        # Identificador estable dentro de la agenda; None hasta que el almacenamiento le asigna uno
+        self.id = task_id
         self.title = title
         self.description = description
         self.section = section
@@ -15,4 +20,4 @@ class Task:
 
     def __str__(self):
         status = "✔️" if self.completed else "❌"
-        return f"{self.title} - {self.description} [{self.section}] - {status}"
\ No newline at end of file
+        return f"{self.title} - {self.description} [{self.section}] - {status}"
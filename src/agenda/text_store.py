@@ -0,0 +1,194 @@
+import datetime
+import itertools
+import os
+import threading
+
+from agenda.calendar import Calendar
+from agenda.journal import TaskJournal
+from agenda.storage import TEXT_SNAPSHOT, LoadReport, TaskStore, file_identity, rows_in_range, snapshot_rows
+
+
+class _HistoryReader(threading.Thread):
+    """Lee el snapshot completo en segundo plano, sin el lock y sin tocar el calendario de la interfaz."""
+
+    def __init__(self, path, snapshot_format, progress):
+        super().__init__(name="agenda-preload", daemon=True)
+        self.path = path
+        self.snapshot_format = snapshot_format
+        self.progress = progress
+        self.snapshot_id = None
+        self.tasks_by_date, self.report = {}, LoadReport()
+        self.error = None
+
+    def run(self):
+        try:
+            # La identidad se toma antes de abrirlo: si otro proceso lo reemplaza, ``adopt`` lo detecta
+            self.snapshot_id = file_identity(self.path)
+            if self.snapshot_id is not None:
+                self.tasks_by_date, self.report = self.snapshot_format.read(self.path, progress=self.progress)
+        except (IOError, ValueError) as e:
+            self.error = e
+
+
+class TextTaskStore(TaskStore):
+    """
+    Backend de texto plano (tasks.txt) con diario de cambios incrementales.
+    Los cambios se añaden al diario al registrarlos y ``flush`` hace el fsync y las compactaciones.
+    El formato no tiene índice: la primera carga de un mes recorre el archivo pero solo interpreta
+    las líneas de ese mes, y el historial completo se lee una sola vez (en segundo plano con
+    ``preload``); después ``sync`` solo lee los registros que otros procesos añadieron al diario.
+    """
+
+    snapshot_format = TEXT_SNAPSHOT
+
+    def __init__(self, path):
+        self.path = path
+        self.journal = TaskJournal(path, snapshot_format=self.snapshot_format)
+        self._loaded = False
+        self._partial = None # Prefijo "YYYY-MM-" del único mes cargado, antes de la carga completa
+        self._reader = None # _HistoryReader en curso
+        self._stale = False # El calendario cargado no refleja el diario (tras import_rows)
+        self.load_report = None
+
+    def load_all(self, calendar):
+        if self._loaded:
+            return
+        if self._partial is not None:
+            # Leer y completar como en segundo plano conserva los objetos del mes ya mostrado
+            self.preload()
+        if self._reader is not None:
+            self.finish_preload(calendar, wait=True)
+            return
+        with self.journal.lock:
+            self.load_report = self.journal.load(calendar)
+        self._loaded = True
+        self._partial = None
+
+    @property
+    def preloading(self):
+        return self._reader is not None
+
+    def preload(self, progress=None):
+        if self._loaded or self._reader is not None:
+            return False
+        self._reader = _HistoryReader(self.path, self.snapshot_format, progress)
+        self._reader.start()
+        return True
+
+    def finish_preload(self, calendar, wait=False):
+        reader = self._reader
+        if reader is None or (reader.is_alive() and not wait):
+            return False
+        reader.join()
+        self._reader = None
+        if self._loaded:
+            return False
+        if reader.error is not None:
+            raise reader.error
+        with self.journal.lock:
+            if self.journal.adopt(calendar, reader.tasks_by_date, reader.report, reader.snapshot_id):
+                self.load_report = reader.report
+            else:
+                self.load_report = self.journal.load(calendar) # Otro proceso compactó mientras tanto
+        self._loaded = True
+        self._partial = None
+        self._stale = False
+        return True
+
+    def sync(self, calendar):
+        with self.journal.lock:
+            if not self._loaded and self._partial is None:
+                self.journal.sync(None) # Sin tareas cargadas: solo numerar bien los próximos registros
+                return False
+            if self._stale:
+                report = self.journal.load(calendar, self._partial)
+                if self._partial is None:
+                    self.load_report = report
+                self._stale = False
+                return True
+            return self.journal.sync(calendar) > 0
+
+    def watch_paths(self):
+        return [self.path, self.journal.path]
+
+    def load_month(self, calendar, year, month):
+        """Solo el primer mes se carga por separado (arranque rápido); cualquier otro carga el historial completo."""
+        if self._loaded:
+            return
+        prefix = f"{year}-{month:02d}-"
+        if self._partial == prefix:
+            return
+        if self._partial is None and self._reader is None:
+            with self.journal.lock:
+                self.journal.load(calendar, prefix)
+            self._partial = prefix
+            return
+        self.load_all(calendar)
+
+    def add_task(self, date_str, task):
+        self.journal.record_add(date_str, task)
+
+    def update_task(self, date_str, index, task):
+        self.journal.record_update(date_str, task)
+
+    def toggle_task(self, date_str, index, task):
+        self.journal.record_toggle(date_str, task)
+
+    def delete_task(self, date_str, index, task):
+        self.journal.record_delete(date_str, task)
+
+    def remove_completed_before(self, date_str, task_ids):
+        # El registro queda ordenado con los demás bajo el lock: al reproducirlo solo encuentra las archivadas
+        self.journal.record_archive(date_str)
+
+    def iter_rows(self, start=None, end=None, with_ids=False):
+        with self.journal.lock:
+            if (not self.journal.has_records() and os.path.exists(self.path)
+                    and self.snapshot_format.in_date_order(self.path)):
+                # Sin cambios en el diario, el snapshot se recorre directamente sin cargarlo.
+                # El archivo abierto sigue siendo legible aunque otro proceso lo reemplace después.
+                rows = self.snapshot_format.iter_rows(self.path)
+            else:
+                # Los registros del diario usan posiciones dentro de cada fecha: hay que aplicarlos sobre todo el snapshot.
+                # Lo mismo si el snapshot no está ordenado por fecha: el calendario lo ordena como al mostrarlo
+                hoy = datetime.date.today()
+                calendar = Calendar(hoy.year, hoy.month)
+                journal = TaskJournal(self.path, snapshot_format=self.snapshot_format)
+                try:
+                    journal.load(calendar)
+                finally:
+                    journal.close()
+                rows = iter(snapshot_rows(calendar))
+        if not with_ids:
+            rows = (row[:5] for row in rows)
+        return rows_in_range(rows, start, end)
+
+    def import_rows(self, rows, batch_size=10000):
+        """Añade las filas al final del diario por lotes de ``batch_size``, tomando el lock en cada lote."""
+        rows = iter(rows)
+        count = 0
+        for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+            with self.journal.lock:
+                self.journal.sync(None) # Numerar los registros después de los de otros procesos
+                for row in batch:
+                    self.journal.record_add_row(*row[:5])
+            self.journal.flush()
+            count += len(batch)
+        # Las filas no pasan por el calendario cargado, y ``sync(None)`` se saltó los registros de
+        # otros procesos: el próximo ``sync`` lo recarga completo
+        self._stale = self._loaded or self._partial is not None
+        return count
+
+    def checkpoint(self, calendar, force=False):
+        """Solicita compactar el diario cuando supera el umbral; la escritura ocurre en ``flush``."""
+        if not self._loaded:
+            return # Con una carga parcial el snapshot perdería el resto del historial
+        if force or self.journal.needs_compaction():
+            # Copia del estado actual para que el hilo de escritura no lea objetos que siguen mutando
+            self.journal.request_compaction(snapshot_rows(calendar))
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        self.journal.close()
@@ -0,0 +1,44 @@
+import os
+import threading
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ChangeWatcher:
+    """
+    Vigila en un hilo los archivos de la agenda (``os.stat`` cada ``interval`` segundos) para
+    detectar que otro proceso guardó cambios. Al detectarlos activa el evento ``changed`` y
+    llama a ``on_change`` desde el hilo del vigilante: la interfaz debe releer desde su propio
+    hilo (en Tk, consultando ``changed`` con ``after``).
+
+    Los cambios del propio proceso también se detectan; el ``sync`` posterior no lee nada nuevo.
+    """
+
+    def __init__(self, paths, interval=1.0, on_change=None):
+        self.paths = list(paths)
+        self.interval = interval
+        self.on_change = on_change
+        self.changed = threading.Event()
+        self._stop = threading.Event()
+        self._signatures = [_signature(path) for path in self.paths]
+        self._thread = threading.Thread(target=self._run, name="agenda-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            signatures = [_signature(path) for path in self.paths]
+            if signatures != self._signatures:
+                self._signatures = signatures
+                self.changed.set()
+                if self.on_change is not None:
+                    self.on_change()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,82 @@
+import collections
+import queue
+import threading
+import time
+
+
+class PersistenceWorker:
+    """
+    Hilo dedicado a la escritura en disco para que el bucle de Tk nunca se bloquee con E/S.
+
+    Los trabajos se encolan con una clave: si llega otro trabajo con la misma clave antes de
+    ejecutarse, reemplaza al anterior. La ventana de agrupación empieza con el primer trabajo
+    pendiente y dura ``debounce`` segundos, así que varios guardados seguidos se convierten
+    en una sola escritura. Los errores se dejan en ``errors`` para que el hilo principal los
+    muestre (Tk solo debe usarse desde el hilo principal).
+    """
+
+    def __init__(self, debounce=0.25):
+        self.debounce = debounce
+        self.errors = queue.Queue()
+        self._jobs = collections.OrderedDict()
+        self._deadline = 0.0
+        self._busy = False
+        self._flushing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="agenda-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, key, job):
+        """Encola ``job`` (invocable sin argumentos) reemplazando el trabajo pendiente con la misma clave."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El hilo de escritura ya está cerrado.")
+            if not self._jobs:
+                self._deadline = time.monotonic() + self.debounce
+            self._jobs[key] = job
+            self._cond.notify_all()
+
+    def flush(self):
+        """Ejecuta de inmediato los trabajos pendientes y espera a que terminen."""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while self._jobs or self._busy:
+                self._cond.wait()
+            self._flushing = False
+
+    def close(self):
+        """Vacía la cola y detiene el hilo."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._jobs:
+                        remaining = self._deadline - time.monotonic()
+                        if remaining <= 0 or self._flushing or self._closed:
+                            break
+                        self._cond.wait(remaining)
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+                jobs = list(self._jobs.values())
+                self._jobs.clear()
+                self._busy = True
+
+            for job in jobs:
+                try:
+                    job()
+                except Exception as e: # El hilo debe seguir vivo; el error se informa en el hilo principal
+                    self.errors.put(e)
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
@@ -1,12 +1,22 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox
 import json
 import os
+import sys
 import datetime
+import itertools
 import calendar # Importar el módulo calendar directamente
-from agenda.calendar import Calendar
+from agenda.archive import archive_cutoff
+from agenda.commands import (AddRecurringTask, AddTask, Batch, CommandHistory, DeleteSeries, DeleteTask, EditTask,
+                             SetCompleted)
 from agenda.tasks import Task
-from agenda.sections import Section
+from agenda.profiling import EventLoopMonitor, profiler
+from agenda.recurrence import Occurrence, merge_dated_tasks
+from agenda.service import AgendaService
+from agenda.task_form import TaskForm
+from agenda.task_list import VirtualTaskList
+from agenda.watcher import ChangeWatcher
+from agenda.writer import PersistenceWorker
 
 class AgendaApp(tk.Tk):
     def __init__(self):
@@ -14,7 +24,7 @@ class AgendaApp(tk.Tk):
         # --- Configuración de Estilos ---
         self.setup_styles()
 
-        self.set_app_icon()
+        self.after_idle(self.set_app_icon) # No retrasa la primera pintura de la ventana
 
         self.title("Agenda App")
         self.iconbitmap(default="") # Evitar error si no se encuentra el icono
@@ -27,123 +37,47 @@ class AgendaApp(tk.Tk):
         hoy = datetime.date.today()
         self.current_year = hoy.year
         self.current_month_num = hoy.month
-        self.calendar = Calendar(self.current_year, self.current_month_num)
 
         self.predefined_sections = ["Gimnasio", "Escuela", "Trabajo", "Personal", "Hogar"]
-
-        self.data_file = "tasks.txt" # Archivo para guardar los datos
-        self.load_tasks() # Cargar tareas al iniciar
+        self._task_form = None # Se crea al añadir o editar la primera tarea
+
+        # Archivo para guardar los datos (.db/.sqlite usa el backend SQLite). La lógica de datos vive
+        # en el servicio (compartido con la línea de comandos); el hilo de escritura evita bloquear Tk con E/S.
+        data_file = os.environ.get("AGENDA_DATA_FILE", "tasks.txt")
+        self.service = AgendaService(data_file, writer=PersistenceWorker())
+        # Todos los cambios pasan por el historial para poder deshacerlos (Ctrl+Z) y rehacerlos (Ctrl+Y)
+        self.history = CommandHistory(self.service)
+        self.open_task_lists = {} # Toplevel -> función que vuelve a poblar su lista tras deshacer o rehacer
+        self.load_recurrences()
+        # Arranque rápido: solo el mes actual; el resto del historial se lee en segundo plano
+        self.load_tasks()
 
         self.create_widgets()
+        self.start_preload()
 
         self.protocol("WM_DELETE_WINDOW", self.on_closing) # Guardar al cerrar
-
-    def ask_string_non_resizable(self, title, prompt, parent):
-        """
-        Creates a simple dialog to ask for a string, but makes the window non-resizable.
-        Returns the entered string, or None if the user cancels.
-        """
-        # The app instance is needed to access the color theme (self.BG_COLOR, etc.)
-        app_instance = self
-
-        class CustomDialog(simpledialog.Dialog):
-            def body(self, master):
-                # Apply the theme from the main app window to the dialog
-                self.configure(bg=app_instance.BG_COLOR)
-                master.configure(bg=app_instance.BG_COLOR)
-
-                self.resizable(False, False)  # Make the dialog non-resizable
-
-                # Internal widgets will pick up the global ttk style
-                ttk.Label(master, text=prompt, justify=tk.LEFT, style='Dialog.TLabel').pack(padx=10, pady=(10, 5))
-                self.entry = ttk.Entry(master, width=50, style='Dialog.TEntry')
-                self.entry.pack(padx=10, pady=(0, 10), fill=tk.X, expand=True)
-                
-                return self.entry  # Set initial focus
-
-            def buttonbox(self):
-                # Override to use styled ttk.Buttons
-                box = ttk.Frame(self)
-
-                w = ttk.Button(box, text="OK", width=10, command=self.ok, default=tk.ACTIVE)
-                w.pack(side=tk.LEFT, padx=5, pady=5)
-                w = ttk.Button(box, text="Cancelar", width=10, command=self.cancel)
-                w.pack(side=tk.LEFT, padx=5, pady=5)
-
-                self.bind("<Return>", self.ok)
-                self.bind("<Escape>", self.cancel)
-
-                box.pack()
-
-            def apply(self):
-                self.result = self.entry.get()
-
-        # The 'parent' argument determines which window the dialog appears on top of.
-        # The 'app_instance' provides the styling information.
-        dialog = CustomDialog(parent, title=title)
-        return dialog.result
-
-    def ask_choice_non_resizable(self, title, prompt, parent):
-        """
-        Creates a dialog to choose from a list of options or enter a new one.
-        """
-        app_instance = self
-
-        class CustomChoiceDialog(simpledialog.Dialog):
-            def body(self, master):
-                self.configure(bg=app_instance.BG_COLOR)
-                master.configure(bg=app_instance.BG_COLOR)
-                self.resizable(False, False)
-                ttk.Label(master, text=prompt, justify=tk.LEFT, style='Dialog.TLabel').pack(padx=10, pady=(10, 5))
-
-                self.choice_var = tk.StringVar(self)
-                self.other_entry_var = tk.StringVar(self)
-
-                radio_frame = ttk.Frame(master)
-                radio_frame.pack(padx=15, pady=5, fill='x', expand=True)
-
-                for section in app_instance.predefined_sections:
-                    rb = ttk.Radiobutton(radio_frame, text=section, variable=self.choice_var, value=section, command=self.toggle_other_entry, style='Dialog.TRadiobutton')
-                    rb.pack(anchor='w')
-                
-                other_frame = ttk.Frame(radio_frame)
-                other_frame.pack(anchor='w', fill='x', expand=True, pady=(5,0))
-                
-                self.other_radio = ttk.Radiobutton(other_frame, text="Otro:", variable=self.choice_var, value="OTHER", command=self.toggle_other_entry, style='Dialog.TRadiobutton')
-                self.other_radio.pack(side='left')
-
-                self.other_entry = ttk.Entry(other_frame, textvariable=self.other_entry_var, width=40, style='Dialog.TEntry')
-                self.other_entry.pack(side='left', fill='x', expand=True, padx=5)
-
-                self.choice_var.set(app_instance.predefined_sections[0])
-                self.toggle_other_entry()
-                return self.other_entry
-
-            def toggle_other_entry(self):
-                if self.choice_var.get() == "OTHER":
-                    self.other_entry.config(state='normal')
-                    self.other_entry.focus_set()
-                else:
-                    self.other_entry.config(state='disabled')
-
-            def buttonbox(self):
-                box = ttk.Frame(self)
-                w = ttk.Button(box, text="OK", width=10, command=self.ok, default=tk.ACTIVE)
-                w.pack(side=tk.LEFT, padx=5, pady=5)
-                w = ttk.Button(box, text="Cancelar", width=10, command=self.cancel)
-                w.pack(side=tk.LEFT, padx=5, pady=5)
-                self.bind("<Return>", self.ok)
-                self.bind("<Escape>", self.cancel)
-                box.pack()
-
-            def apply(self):
-                if self.choice_var.get() == "OTHER":
-                    self.result = self.other_entry_var.get().strip()
-                else:
-                    self.result = self.choice_var.get()
-
-        dialog = CustomChoiceDialog(parent, title=title)
-        return dialog.result
+        for sequence in ("<Control-z>", "<Control-Z>"):
+            self.bind_all(sequence, lambda e: self.deshacer())
+        for sequence in ("<Control-y>", "<Control-Y>"):
+            self.bind_all(sequence, lambda e: self.rehacer())
+        self.after(200, self.poll_writer_errors)
+
+        # Instrumentación (AGENDA_PROFILE o --profile): retraso del bucle de eventos y volcado con F12
+        if profiler.enabled:
+            self.loop_monitor = EventLoopMonitor(self, profiler)
+            self.loop_monitor.start()
+            self.bind("<F12>", lambda e: self.dump_profile())
+
+        # Otra ventana, la línea de comandos o el servidor pueden guardar en el mismo archivo
+        self.watcher = ChangeWatcher(self.service.watch_paths())
+        self.after(500, self.poll_external_changes)
+
+    @profiler.timed("dialog")
+    def task_form(self):
+        """Formulario de tareas: se construye la primera vez y después solo se vuelve a mostrar."""
+        if self._task_form is None:
+            self._task_form = TaskForm(self, self.predefined_sections, self.BG_COLOR)
+        return self._task_form
 
     def set_app_icon(self):
         """Establece el icono de la aplicación si el archivo existe."""
@@ -166,6 +100,8 @@ class AgendaApp(tk.Tk):
         self.BUTTON_TEXT_COLOR = "#FFFFFF"
         self.DANGER_COLOR = "#E53935"
         self.DANGER_HOVER_COLOR = "#F44336"
+        self.DONE_COLOR = "#43A047" # Verde: días completados
+        self.DONE_HOVER_COLOR = "#66BB6A"
         self.ENTRY_BG = "#424242"
         self.HEADER_COLOR = self.BUTTON_COLOR
 
@@ -193,6 +129,10 @@ class AgendaApp(tk.Tk):
         style.map('HasTasks.TButton', foreground=[('!active', self.FG_COLOR)],
                                     background=[('active', self.BUTTON_HOVER_COLOR)]) # Fondo gris claro al pasar el mouse
 
+        # Días con todas sus tareas completadas
+        style.configure('Done.TButton', font=('Arial', 10, 'bold'), background=self.DONE_COLOR)
+        style.map('Done.TButton', background=[('active', self.DONE_HOVER_COLOR)])
+
         # Estilo para el día actual
         style.configure('Today.TButton', bordercolor=self.BUTTON_COLOR, borderwidth=2)
         style.map('Today.TButton', bordercolor=[('active', self.BUTTON_HOVER_COLOR)])
@@ -201,6 +141,8 @@ class AgendaApp(tk.Tk):
         style.configure('TEntry', font=('Arial', 12), fieldbackground=self.ENTRY_BG, foreground=self.FG_COLOR, borderwidth=1, insertcolor=self.FG_COLOR)
         style.configure('TMenubutton', background=self.BUTTON_COLOR, foreground=self.BUTTON_TEXT_COLOR, borderwidth=0, arrowcolor=self.FG_COLOR)
         style.map('TMenubutton', background=[('active', self.BUTTON_HOVER_COLOR)])
+        style.configure('TCombobox', fieldbackground=self.ENTRY_BG, foreground=self.FG_COLOR, arrowcolor=self.FG_COLOR)
+        style.map('TCombobox', fieldbackground=[('readonly', self.ENTRY_BG)], foreground=[('readonly', self.FG_COLOR)])
 
         # Estilo para Checkbuttons
         style.configure('TCheckbutton',
@@ -267,66 +209,109 @@ class AgendaApp(tk.Tk):
         for i in range(7):
             self.cal_frame.columnconfigure(i, weight=1)
 
+        self.create_calendar_grid()
         self.display_calendar()
 
+        # Atajos de teclado para cambiar de mes
+        self.bind("<Prior>", lambda e: self.shift_month(-1)) # Re Pág: mes anterior
+        self.bind("<Next>", lambda e: self.shift_month(1))   # Av Pág: mes siguiente
+
         # Frame para botones de acción (añadir tarea, ver tareas, salir)
         action_btns_frame = ttk.Frame(self, padding="10")
         action_btns_frame.grid(row=2, column=0, pady=10, sticky="ew")
         action_btns_frame.columnconfigure(0, weight=1)
         action_btns_frame.columnconfigure(1, weight=1)
         action_btns_frame.columnconfigure(2, weight=1)
+        action_btns_frame.columnconfigure(3, weight=1)
 
         ttk.Button(action_btns_frame, text="Ver tareas", command=self.ver_tareas).grid(row=0, column=0, padx=5, sticky="ew")
-        ttk.Button(action_btns_frame, text="Salir", command=self.destroy).grid(row=0, column=2, padx=5, sticky="ew")
-
-    def display_calendar(self):
-        # Limpiar el contenido actual del calendario
-        for widget in self.cal_frame.winfo_children():
-            widget.destroy()
-
+        ttk.Button(action_btns_frame, text="Estadísticas", command=self.ver_estadisticas).grid(row=0, column=1, padx=5, sticky="ew")
+
+        # Cuadro de búsqueda: Enter o el botón abren la ventana de resultados
+        search_frame = ttk.Frame(action_btns_frame)
+        search_frame.grid(row=0, column=2, padx=5, sticky="ew")
+        search_frame.columnconfigure(0, weight=1)
+        self.search_entry = ttk.Entry(search_frame)
+        self.search_entry.grid(row=0, column=0, sticky="ew")
+        self.search_entry.bind("<Return>", lambda e: self.buscar_tareas())
+        ttk.Button(search_frame, text="Buscar", command=self.buscar_tareas).grid(row=0, column=1, padx=(5, 0))
+        ttk.Button(action_btns_frame, text="Salir", command=self.on_closing).grid(row=0, column=3, padx=5, sticky="ew")
+
+        # Progreso de la carga del historial en segundo plano (oculto el resto del tiempo)
+        self.status_label = ttk.Label(self, text="", anchor="w")
+        self.status_label.grid(row=3, column=0, padx=20, pady=(0, 5), sticky="ew")
+        self.status_label.grid_remove()
+
+    def create_calendar_grid(self):
+        """Crea una sola vez los encabezados y la cuadrícula de 6x7 botones que se reutiliza en cada mes."""
         # Mostrar los días de la semana
         dias = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
         for i, dia in enumerate(dias):
             lbl = ttk.Label(self.cal_frame, text=dia, anchor="center", font=("Arial", 10, "bold"), foreground=self.HEADER_COLOR)
             lbl.grid(row=0, column=i, padx=2, pady=2, sticky="nsew")
 
+        # Un mes ocupa como máximo 6 semanas
+        self.day_buttons = []
+        for r in range(6):
+            semana = []
+            for c in range(7):
+                btn = ttk.Button(self.cal_frame, width=4)
+                btn.grid(row=r+1, column=c, padx=2, pady=2, sticky="nsew")
+                semana.append(btn)
+            self.day_buttons.append(semana)
+
+    @profiler.timed()
+    def display_calendar(self):
+        """Reconfigura la cuadrícula de días existente para el mes actual, sin crear ni destruir widgets."""
         # Obtener la matriz de días del mes
         # monthcalendar devuelve una lista de listas, donde cada sublista es una semana.
         # 0 representa un día fuera del mes.
         today = datetime.date.today() # Obtener la fecha actual una vez
-        matriz = calendar.monthcalendar(self.calendar.year, self.calendar.month_num)
-        
-        for r, semana in enumerate(matriz):
-            for c, dia in enumerate(semana):
+        view = self.service.month_view
+        year, month = view.year, view.month
+        matriz = view.weeks # Calculada una vez por mes y reutilizada al volver a él
+        # Totales por día mantenidos de forma incremental (más las ocurrencias de este mes): O(días)
+        day_counts = self.persist(self.service.month_counts, year, month)
+        day_counts = day_counts[1] if day_counts else {}
+
+        for r, botones in enumerate(self.day_buttons):
+            en_uso = r < len(matriz)
+            semana = matriz[r] if en_uso else [0] * 7
+            # Las semanas que no usa el mes no ocupan espacio
+            self.cal_frame.rowconfigure(r+1, weight=1 if en_uso else 0)
+
+            for btn, dia in zip(botones, semana):
                 if dia == 0:
-                    # Días fuera del mes, se muestran como etiquetas vacías o deshabilitadas
-                    lbl = ttk.Label(self.cal_frame, text="", width=4) # Usar Label para días vacíos
-                    lbl.grid(row=r+1, column=c, padx=2, pady=2, sticky="nsew")
-                else:
-                    # Determinar el estilo del botón
-                    is_today = (self.calendar.year == today.year and
-                                self.calendar.month_num == today.month and
-                                dia == today.day)
-                    
-                    date_str = f"{self.calendar.year}-{self.calendar.month_num:02d}-{dia:02d}"
-                    has_tasks = self.calendar.get_tasks(date_str)
-
-                    button_style = 'TButton' # Estilo por defecto
-                    if is_today:
-                        button_style = 'Today.TButton'
-                    elif has_tasks:
-                        button_style = 'HasTasks.TButton'
-
-                    btn = ttk.Button(
-                        self.cal_frame,
-                        text=str(dia),
-                        style=button_style,
-                        command=lambda d=dia: self.agregar_tarea_dia(d)
-                    )
-                    btn.grid(row=r+1, column=c, padx=2, pady=2, sticky="nsew")
-                
-                # Configurar la fila para que se expanda también
-                self.cal_frame.rowconfigure(r+1, weight=1)
+                    # Días fuera del mes: se oculta el botón conservando su posición en la cuadrícula
+                    btn.grid_remove()
+                    continue
+
+                # Determinar el estilo del botón
+                is_today = (year == today.year and month == today.month and dia == today.day)
+                counts = day_counts.get(dia)
+
+                button_style = 'TButton' # Estilo por defecto
+                if is_today:
+                    button_style = 'Today.TButton'
+                elif counts is not None:
+                    button_style = 'Done.TButton' if counts.all_completed() else 'HasTasks.TButton'
+
+                # Insignia con las tareas completadas del día
+                text = str(dia) if counts is None else f"{dia}\n{counts.completed}/{counts.total}"
+                btn.configure(text=text, style=button_style, command=lambda d=dia: self.agregar_tarea_dia(d))
+                btn.grid()
+
+    def shift_month(self, delta):
+        """Avanza o retrocede ``delta`` meses y actualiza el calendario."""
+        month_index = self.current_year * 12 + (self.service.month_view.month - 1) + delta
+        new_year, new_month_index = divmod(month_index, 12)
+        if not (1900 <= new_year <= 2100): # Mismo rango de años que el campo de entrada
+            return
+        self.current_year = new_year
+        self.year_entry.delete(0, tk.END)
+        self.year_entry.insert(0, str(new_year))
+        self.selected_month.set(self.month_names[new_month_index])
+        self.update_calendar_display()
 
     def update_calendar_display_from_entry(self, event=None):
         try:
@@ -347,60 +332,57 @@ class AgendaApp(tk.Tk):
             messagebox.showerror("Error de Mes", "Mes inválido seleccionado.")
             return
 
-        # Actualizar el objeto Calendar con el nuevo año y mes
-        self.calendar = Calendar(self.current_year, new_month_num)
+        # Actualizar el objeto Calendar con el nuevo año y mes y cargar sus tareas
+        self.load_tasks(self.current_year, new_month_num)
         self.display_calendar()
 
     def agregar_tarea_dia(self, dia):
-        # 1. Format the date for displaying to the user as DD-MM-YYYY
-        # current_month_num is already the month number (1-12)
-        # dia is the day number
-        # current_year is the year
-        
-        try:
-            # Create a datetime.date object to easily format
-            date_obj = datetime.date(self.current_year, self.calendar.month_num, dia)
-            display_date_str = date_obj.strftime("%d-%m-%Y")
-        except ValueError:
-            # This should ideally not happen if the calendar buttons are valid days,
-            # but it's a fallback for invalid date combinations (e.g., Feb 30th).
-            display_date_str = f"{dia:02d}-{self.calendar.month_num:02d}-{self.current_year}"
-
-        # 2. The date passed to the calendar's add_task method should be YYYY-MM-DD
-        # because the add_task method in calendar.py converts to and stores this format internally.
-        # Passing YYYY-MM-DD directly avoids any ambiguity or potential parsing issues in calendar.py.
-        storage_date_str = f"{self.current_year}-{self.calendar.month_num:02d}-{dia:02d}"
-        
-        # 3. Prompt the user for task details, displaying the date in DD-MM-YYYY format
-        title = self.ask_string_non_resizable("Título", f"Ingrese el título de la tarea para el {display_date_str}:", parent=self)
-        if title is None:
-            return # User cancelled
-
-        description = self.ask_string_non_resizable("Descripción", "Ingrese la descripción de la tarea:", parent=self)
-        if description is None:
-            return # User cancelled
-
-        section_name = self.ask_choice_non_resizable("Sección", "Elija o ingrese una sección:", parent=self)
-        if section_name is None:
-            return # User cancelled
-        
-        if not section_name.strip():
-            section_name = "General" # Default value if empty
-
-        # 4. Create Task and Section objects
-        section = Section(section_name)
-        task = Task(title, description, section)
-        
-        # 5. Add the task to the calendar using the internal YYYY-MM-DD format
-        self.calendar.add_task(storage_date_str, task)
-        
-        # 6. Show success message to the user, again using the DD-MM-YYYY display format
-        messagebox.showinfo("Éxito", f"Tarea '{title}' agregada para el {display_date_str}.")
-        self.save_tasks() # Guardar después de agregar una tarea
+        """Abre el formulario de tareas para el día pulsado del mes visible."""
+        date_obj = datetime.date(self.current_year, self.service.month_view.month, dia)
+        self.task_form().ask_new(date_obj, self.guardar_tarea_nueva)
+
+    def guardar_tarea_nueva(self, entry):
+        """Guarda la tarea del formulario (la regla, si se repite). Devuelve True si se guardó."""
+        if entry.freq is not None:
+            command = AddRecurringTask(entry.date, entry.freq, entry.title, entry.description, entry.section,
+                                       weekdays=entry.weekdays, until=entry.until, count=entry.count)
+        else:
+            # Las fechas se guardan como YYYY-MM-DD y se muestran como DD-MM-YYYY
+            command = AddTask(entry.date.isoformat(), entry.title, entry.description, entry.section)
+        if self.persist(self.history.execute, command) is None:
+            return False
+        self.display_calendar()
+        kind = "repetida " if entry.freq is not None else ""
+        self.show_status(f"Tarea {kind}'{entry.title}' agregada para el {entry.date.strftime('%d-%m-%Y')}.")
+        return True
 
+    def load_recurrences(self):
+        """Carga las reglas de repetición guardadas junto al archivo de tareas."""
+        try:
+            self.service.load_recurrences()
+        except (IOError, ValueError, KeyError) as e:
+            # Se sigue con un conjunto de reglas vacío
+            messagebox.showerror("Error de carga", f"No se pudieron cargar las tareas repetidas: {e}")
+
+    def history_occurrences(self):
+        """Ocurrencias a mostrar en el historial: desde el inicio de cada regla hasta el fin del mes visible (o del actual)."""
+        if not self.service.recurrences.rules:
+            return {}
+        today = datetime.date.today()
+        year, month = max((self.service.month_view.year, self.service.month_view.month), (today.year, today.month))
+        start = min(rule.start for rule in self.service.recurrences.rules.values())
+        end = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        return self.service.recurrences.occurrences_between(start, end)
+
+    @profiler.timed()
     def ver_tareas(self):
+        # El historial completo se carga solo cuando se abre esta ventana
+        if not self.load_all_tasks():
+            return
+        occurrences = self.history_occurrences()
+
         # Si no hay tareas en el diccionario, muestra un mensaje y termina.
-        if not self.calendar.tasks:
+        if not self.service.calendar.tasks and not occurrences:
             messagebox.showinfo("Sin tareas", "No hay tareas registradas.")
             return
 
@@ -413,128 +395,255 @@ class AgendaApp(tk.Tk):
         top.transient(self) # Mantener la ventana por encima de la principal
         top.grab_set()      # Hacer la ventana modal (bloquea la interacción con la principal)
 
-        # 2. Crear un Frame con Scrollbar para la lista de tareas
-        container = ttk.Frame(top)
-        container.pack(fill="both", expand=True, padx=10, pady=5)
-
-        canvas = tk.Canvas(container, bg=self.BG_COLOR, highlightthickness=0)
-        scrollbar = ttk.Scrollbar(container, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas, style='TFrame')
-
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        # 2. Lista virtualizada: solo se crean widgets para las filas visibles
+        task_list = VirtualTaskList(
+            top,
+            on_toggle=self.toggle_task_completion,
+            on_edit=lambda f, t: self.editar_tarea(f, t, task_list),
+            on_delete=lambda f, t: self.eliminar_tarea(f, t, task_list),
+            bg_color=self.BG_COLOR,
+            header_color=self.HEADER_COLOR,
         )
+        task_list.pack(fill="both", expand=True, padx=10, pady=5)
 
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        canvas.grid(row=0, column=0, sticky="nsew")
-        scrollbar.grid(row=0, column=1, sticky="ns")
-
-        # 3. Poblar el frame con Checkbuttons interactivos
-        self.task_vars = [] # Guardar referencia a las variables de Tkinter
-
-        sorted_dates = sorted(self.calendar.tasks.keys())
-        for fecha_str_internal in sorted_dates: # fecha_str_internal es YYYY-MM-DD
-            tasks = self.calendar.tasks[fecha_str_internal]
-            try:
-                display_date = datetime.datetime.strptime(fecha_str_internal, "%Y-%m-%d").strftime("%d-%m-%Y")
-            except ValueError:
-                display_date = fecha_str_internal
-            
-            # Encabezado de fecha
-            header = ttk.Label(scrollable_frame, text=f"--- Tareas para el {display_date} ---", font=("Arial", 12, "bold"), foreground=self.HEADER_COLOR)
-            header.pack(anchor="w", pady=(10, 5), padx=10)
-
-            for task in tasks:
-                # Crear un frame para cada fila de tarea (checkbox + botón de eliminar)
-                task_row_frame = ttk.Frame(scrollable_frame)
-                task_row_frame.pack(fill='x', expand=True, padx=10)
-
-                # Variable de control para el Checkbutton
-                var = tk.BooleanVar(value=task.completed)
-                self.task_vars.append(var) # Guardar referencia
-
-                # Crear el Checkbutton
-                check_button = ttk.Checkbutton(
-                    task_row_frame,
-                    text=f"{task.title} ({task.section.name})",
-                    variable=var,
-                    command=lambda t=task, v=var: self.toggle_task_completion(t, v)
-                )
-                check_button.pack(side=tk.LEFT, anchor="w", pady=2)
-
-                # Crear un frame para los botones de acción de la tarea
-                action_frame = ttk.Frame(task_row_frame)
-                action_frame.pack(side=tk.RIGHT, padx=(0, 5))
-
-                # Botón para editar la tarea
-                edit_button = ttk.Button(
-                    action_frame,
-                    text="Editar",
-                    command=lambda f=fecha_str_internal, t=task, top_win=top: self.editar_tarea(f, t, top_win)
-                )
-                edit_button.pack(side=tk.LEFT, padx=(0, 5))
-
-                # Crear el botón para eliminar la tarea
-                delete_button = ttk.Button(
-                    action_frame,
-                    text="Eliminar",
-                    style='Danger.TButton', # Aplicar el estilo de peligro
-                    command=lambda f=fecha_str_internal, t=task, top_win=top: self.eliminar_tarea(f, t, top_win),
-                )
-                delete_button.pack(side=tk.RIGHT, padx=(0, 5))
+        # 3. Poblar la lista en orden cronológico usando el índice de fechas, con las repeticiones intercaladas
+        task_list.set_tasks(merge_dated_tasks(self.service.calendar.iter_tasks(), occurrences))
+        self.register_task_list(top, lambda: task_list.set_tasks(
+            merge_dated_tasks(self.service.calendar.iter_tasks(), self.history_occurrences())))
 
         # 4. Añadir un botón para cerrar la ventana
         ttk.Button(top, text="Cerrar", command=top.destroy).pack(pady=10)
 
-    def toggle_task_completion(self, task: Task, var: tk.BooleanVar):
-        """Actualiza el estado de completado de la tarea basado en el checkbox."""
-        task.set_completed(var.get())
-        self.save_tasks() # Guardar después de cambiar el estado de una tarea
+    def get_search_index(self):
+        """Devuelve el índice de búsqueda, construyéndolo con todo el historial la primera vez."""
+        if not self.load_all_tasks():
+            return None
+        return self.service.get_search_index()
 
-    def editar_tarea(self, fecha_str, task_to_edit, toplevel_window):
-        """Permite editar el título y la descripción de una tarea existente."""
-        
-        # Pedir nuevo título
-        new_title = self.ask_string_non_resizable("Editar Título", f"Nuevo título para '{task_to_edit.title}':", parent=toplevel_window)
-        if new_title is None: # El usuario canceló
+    @profiler.timed()
+    def ver_estadisticas(self):
+        """Muestra los totales del mes visible y del año, las rachas y el desglose por sección."""
+        year, month = self.service.month_view.year, self.service.month_view.month
+        try:
+            month_totals = self.service.month_counts(year, month)[0]
+            year_totals = self.service.year_counts(year)
+            current, best = self.service.streaks(year)
+        except IOError as e:
+            messagebox.showerror("Error de carga", f"No se pudieron cargar las tareas: {e}")
             return
 
-        # Pedir nueva descripción
-        new_description = self.ask_string_non_resizable("Editar Descripción", f"Nueva descripción:", parent=toplevel_window)
-        if new_description is None: # El usuario canceló
+        top = tk.Toplevel(self)
+        top.title("Estadísticas")
+        top.configure(bg=self.BG_COLOR)
+        self.centrar_ventana_toplevel(top, 420, 400)
+        top.resizable(False, False)
+        top.transient(self)
+        top.grab_set()
+
+        def percent(totals):
+            return f"{totals.completed}/{totals.total} completadas ({totals.ratio:.0%})"
+
+        frame = ttk.Frame(top, padding=10)
+        frame.pack(fill="both", expand=True)
+        frame.columnconfigure(1, weight=1)
+        rows = [
+            (f"{self.service.month_view.name} {year}:", percent(month_totals)),
+            (f"Año {year}:", percent(year_totals)),
+            ("Racha actual:", f"{current} días"),
+            (f"Mejor racha de {year}:", f"{best} días"),
+        ]
+        for row, (label, value) in enumerate(rows):
+            ttk.Label(frame, text=label, font=("Arial", 10, "bold")).grid(row=row, column=0, sticky="w", pady=2)
+            ttk.Label(frame, text=value).grid(row=row, column=1, sticky="w", padx=(10, 0), pady=2)
+
+        # Desglose por sección del mes visible
+        ttk.Label(frame, text="Por sección (mes):", foreground=self.HEADER_COLOR,
+                  font=("Arial", 10, "bold")).grid(row=len(rows), column=0, columnspan=2, sticky="w", pady=(10, 2))
+        sections = month_totals.by_section.most_common()
+        if not sections:
+            ttk.Label(frame, text="Sin tareas este mes.").grid(row=len(rows) + 1, column=0, columnspan=2, sticky="w")
+        for offset, (section_name, total) in enumerate(sections, len(rows) + 1):
+            done = month_totals.completed_by_section[section_name]
+            ttk.Label(frame, text=section_name).grid(row=offset, column=0, sticky="w")
+            ttk.Progressbar(frame, maximum=total, value=done).grid(row=offset, column=1, sticky="ew", padx=(10, 0), pady=2)
+            ttk.Label(frame, text=f"{done}/{total}").grid(row=offset, column=2, sticky="e", padx=(5, 0))
+
+        ttk.Button(top, text="Cerrar", command=top.destroy).pack(pady=(0, 10))
+
+    @profiler.timed()
+    def buscar_tareas(self):
+        """Abre la ventana de resultados de búsqueda con filtros por sección y estado."""
+        index = self.get_search_index()
+        if index is None:
             return
 
-        # Pedir nueva sección
-        new_section_name = self.ask_choice_non_resizable("Editar Sección", "Elija o ingrese la nueva sección:", parent=toplevel_window)
-        if new_section_name is None: # El usuario canceló
+        top = tk.Toplevel(self)
+        top.title("Buscar Tareas")
+        top.configure(bg=self.BG_COLOR)
+        self.centrar_ventana_toplevel(top, 500, 450)
+        top.resizable(False, False)
+        top.transient(self)
+        top.grab_set()
+
+        # 1. Texto de búsqueda y facetas
+        filters = ttk.Frame(top)
+        filters.pack(fill="x", padx=10, pady=(10, 0))
+        filters.columnconfigure(0, weight=1)
+        query_entry = ttk.Entry(filters)
+        query_entry.insert(0, self.search_entry.get())
+        query_entry.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        section_choice = ttk.Combobox(filters, state="readonly")
+        section_choice.grid(row=1, column=0, sticky="ew", padx=(0, 5))
+        status_choice = ttk.Combobox(filters, state="readonly", width=22)
+        status_choice.grid(row=1, column=1, sticky="ew")
+        summary = ttk.Label(top)
+        summary.pack(anchor="w", padx=10, pady=(5, 0))
+
+        # 2. Resultados en la misma lista virtualizada del historial
+        task_list = VirtualTaskList(
+            top,
+            on_toggle=self.toggle_task_completion,
+            on_edit=lambda f, t: self.editar_tarea(f, t, task_list),
+            on_delete=lambda f, t: self.eliminar_tarea(f, t, task_list),
+            bg_color=self.BG_COLOR,
+            header_color=self.HEADER_COLOR,
+        )
+        task_list.pack(fill="both", expand=True, padx=10, pady=5)
+
+        facet_values = {"section": [None], "status": [None, False, True]}
+        shown_matches = [] # (fecha, tarea) de los resultados mostrados, para las acciones por lotes
+
+        def run_search(event=None):
+            section_index = max(section_choice.current(), 0)
+            status_index = max(status_choice.current(), 0)
+            section = facet_values["section"][section_index]
+            completed = facet_values["status"][status_index]
+            result = index.search(query_entry.get(), section=section, completed=completed)
+
+            # Actualizar las facetas con los conteos de esta búsqueda
+            sections = sorted(result.section_counts)
+            if section is not None and section not in sections:
+                sections.append(section)
+            facet_values["section"] = [None] + sections
+            section_choice["values"] = ["Todas las secciones"] + [f"{name} ({result.section_counts.get(name, 0)})" for name in sections]
+            section_choice.current(facet_values["section"].index(section))
+            status_choice["values"] = [
+                "Todos los estados",
+                f"Pendientes ({result.completed_counts[False]})",
+                f"Completadas ({result.completed_counts[True]})",
+            ]
+            status_choice.current(status_index)
+
+            shown = len(result.matches)
+            shown_matches[:] = result.matches
+            summary.configure(text=f"{result.total} resultados" + (f" (se muestran {shown})" if shown < result.total else ""))
+            task_list.set_tasks(
+                (date_str, [task for _, task in group])
+                for date_str, group in itertools.groupby(result.matches, key=lambda match: match[0])
+            )
+
+        query_entry.bind("<Return>", run_search)
+        section_choice.bind("<<ComboboxSelected>>", run_search)
+        status_choice.bind("<<ComboboxSelected>>", run_search)
+        run_search()
+        query_entry.focus_set()
+        self.register_task_list(top, run_search)
+
+        # 3. Acciones sobre todos los resultados mostrados: una sola transacción (y un solo Ctrl+Z)
+        buttons = ttk.Frame(top)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Completar resultados",
+                   command=lambda: self.completar_resultados(shown_matches, top)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Eliminar resultados", style='Danger.TButton',
+                   command=lambda: self.eliminar_resultados(shown_matches, top)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Cerrar", command=top.destroy).pack(side=tk.LEFT, padx=5)
+
+    def completar_resultados(self, matches, window):
+        """Marca como completadas todas las tareas pendientes de ``matches`` en un solo cambio."""
+        commands = [SetCompleted(date_str, task, True) for date_str, task in matches if not task.completed]
+        if not commands:
+            messagebox.showinfo("Sin cambios", "Todas las tareas mostradas ya están completadas.", parent=window)
             return
+        self.persist(self.history.execute, Batch(commands, f"Completar {len(commands)} tareas"))
+        self.refresh_after_change()
 
-        # Actualizar el objeto de la tarea en memoria
-        if new_title.strip(): # Solo actualizar si no está vacío
-            task_to_edit.title = new_title
-        
-        task_to_edit.description = new_description # La descripción puede estar vacía
+    def eliminar_resultados(self, matches, window):
+        """Elimina todas las tareas de ``matches`` en un solo cambio (se puede deshacer con Ctrl+Z)."""
+        if not matches:
+            return
+        if not messagebox.askyesno("Confirmar Eliminación", f"¿Eliminar las {len(matches)} tareas mostradas?",
+                                   parent=window):
+            return
+        commands = [DeleteTask(date_str, task) for date_str, task in matches]
+        self.persist(self.history.execute, Batch(commands, f"Eliminar {len(commands)} tareas"))
+        self.refresh_after_change()
 
-        if new_section_name.strip():
-            task_to_edit.section = Section(new_section_name)
+    def register_task_list(self, window, reload):
+        """Registra una ventana con lista de tareas para repoblarla después de deshacer o rehacer."""
+        self.open_task_lists[window] = reload
+        window.bind("<Destroy>", lambda e: self.open_task_lists.pop(window, None) if e.widget is window else None)
 
-        # Guardar los cambios y refrescar la vista
-        self.save_tasks()
-        
-        # Refrescar la ventana de tareas para mostrar los cambios
-        toplevel_window.destroy()
-        self.ver_tareas()
-        messagebox.showinfo("Éxito", "Tarea actualizada correctamente.", parent=self)
+    def refresh_after_change(self):
+        """Vuelve a mostrar el calendario y las listas abiertas tras un cambio de varias tareas."""
+        self.display_calendar()
+        for reload in list(self.open_task_lists.values()):
+            reload()
+
+    def deshacer(self):
+        """Ctrl+Z: revierte el último cambio (un lote cuenta como uno)."""
+        if not self.history.can_undo():
+            self.show_status("No hay nada que deshacer.")
+            return
+        command = self.persist(self.history.undo)
+        if command is not None:
+            self.refresh_after_change()
+            self.show_status(f"Deshecho: {command.label}")
+
+    def rehacer(self):
+        """Ctrl+Y: vuelve a aplicar el último cambio deshecho."""
+        if not self.history.can_redo():
+            self.show_status("No hay nada que rehacer.")
+            return
+        command = self.persist(self.history.redo)
+        if command is not None:
+            self.refresh_after_change()
+            self.show_status(f"Rehecho: {command.label}")
+
+    def show_status(self, text, duration_ms=2500):
+        """Muestra un aviso breve bajo el calendario (salvo mientras indica el progreso de la carga)."""
+        if self.service.preloading:
+            return
+        self.status_label.configure(text=text)
+        self.status_label.grid()
+        if getattr(self, "_status_after", None):
+            self.after_cancel(self._status_after)
+        self._status_after = self.after(duration_ms, self.status_label.grid_remove)
 
-    def eliminar_tarea(self, fecha_str, task_to_delete, toplevel_window):
+    def toggle_task_completion(self, fecha_str, task: Task, var: tk.BooleanVar):
+        """Actualiza el estado de completado de la tarea basado en el checkbox."""
+        # Guardar después de cambiar el estado de una tarea (en una repetida, solo esta ocurrencia)
+        if self.persist(self.history.execute, SetCompleted(fecha_str, task, var.get())) is None:
+            var.set(task.completed) # No se guardó: la casilla vuelve al estado real
+
+    def editar_tarea(self, fecha_str, task_to_edit, task_list):
+        """Permite editar el título, la descripción y la sección de una tarea existente."""
+        def guardar(entry):
+            # En una repetida, solo cambia esta ocurrencia
+            command = EditTask(fecha_str, task_to_edit, entry.title, entry.description, entry.section)
+            if self.persist(self.history.execute, command) is None:
+                return False
+            # Actualizar solo la fila de la tarea, sin reconstruir la ventana
+            task_list.update_task(fecha_str, task_to_edit)
+            self.show_status("Tarea actualizada correctamente.")
+            return True
+
+        date_obj = datetime.date.fromisoformat(fecha_str)
+        self.task_form().ask_edit(date_obj, task_to_edit, guardar, parent=task_list.winfo_toplevel())
+
+    def eliminar_tarea(self, fecha_str, task_to_delete, task_list):
         """Elimina una tarea específica, pide confirmación y actualiza la vista."""
-        
+        toplevel_window = task_list.winfo_toplevel()
+
         confirm = messagebox.askyesno(
             "Confirmar Eliminación",
             f"¿Estás seguro de que quieres eliminar la tarea '{task_to_delete.title}'?",
@@ -544,79 +653,179 @@ class AgendaApp(tk.Tk):
         if not confirm:
             return
 
+        if isinstance(task_to_delete, Occurrence):
+            self.eliminar_ocurrencia(task_to_delete, task_list)
+            return
+
         # Eliminar la tarea del modelo de datos
-        if fecha_str in self.calendar.tasks:
-            tasks_on_date = self.calendar.tasks[fecha_str]
-            if task_to_delete in tasks_on_date:
-                tasks_on_date.remove(task_to_delete)
-            
-            # Si no quedan más tareas para esa fecha, eliminar la entrada completa
-            if not tasks_on_date:
-                del self.calendar.tasks[fecha_str]
-
-        self.save_tasks()
-        toplevel_window.destroy()
-        self.ver_tareas()
+        if self.persist(self.history.execute, DeleteTask(fecha_str, task_to_delete)) is None:
+            return
 
-    def save_tasks(self):
-        """Guarda todas las tareas en el archivo de texto plano."""
-        lines_to_save = []
-        for date_str, tasks_list in self.calendar.tasks.items():
-            for task in tasks_list:
-                # Reemplazar el separador en los datos para evitar conflictos
-                title = task.title.replace('|', '{{PIPE}}')
-                description = task.description.replace('|', '{{PIPE}}')
-                section_name = task.section.name.replace('|', '{{PIPE}}')
-                
-                # Crear la línea con el formato: FECHA|TITULO|DESCRIPCION|SECCION|COMPLETADO
-                line = f"{date_str}|{title}|{description}|{section_name}|{task.completed}"
-                lines_to_save.append(line)
-        
+        # Quitar solo la fila (y el encabezado si la fecha quedó vacía) de la ventana abierta
+        task_list.remove_task(fecha_str, task_to_delete)
+
+    def eliminar_ocurrencia(self, occurrence, task_list):
+        """Elimina una ocurrencia de una tarea repetida o, si el usuario lo elige, toda la serie."""
+        only_this = messagebox.askyesnocancel(
+            "Tarea repetida",
+            "¿Eliminar solo esta ocurrencia?\n(No = eliminar todas las repeticiones)",
+            parent=task_list.winfo_toplevel()
+        )
+        if only_this is None:
+            return
+
+        rule = occurrence.rule
+        if only_this:
+            if self.persist(self.history.execute, DeleteTask(occurrence.date_str, occurrence)) is None:
+                return
+            task_list.remove_task(occurrence.date_str, occurrence)
+        else:
+            if self.persist(self.history.execute, DeleteSeries(rule)) is None:
+                return
+            task_list.remove_rows(lambda date_str, task: isinstance(task, Occurrence) and task.rule is rule)
+        self.display_calendar()
+
+    def persist(self, operation, *args, **kwargs):
+        """Ejecuta un cambio del servicio (que encola su escritura) y muestra los errores de guardado."""
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                f.write("\n".join(lines_to_save))
+            return operation(*args, **kwargs)
         except IOError as e:
             messagebox.showerror("Error de guardado", f"No se pudieron guardar las tareas: {e}")
-
-    def load_tasks(self):
-        """Carga las tareas desde el archivo de texto plano al iniciar la aplicación."""
-        if not os.path.exists(self.data_file):
-            return # No hay archivo para cargar, empezar de cero
-        
+            return None
+        except LookupError as e:
+            # Otro proceso cambió la tarea mientras estaba en pantalla
+            messagebox.showwarning("Tarea no disponible", str(e))
+            self.display_calendar()
+            return None
+
+    @profiler.timed()
+    def save_tasks(self):
+        """Consolida todas las tareas en el almacenamiento (snapshot completo en el backend de texto)."""
+        self.persist(self.service.save)
+
+    def poll_external_changes(self):
+        """Incorpora en el hilo principal los cambios que otros procesos guardaron en el archivo."""
+        # Con escrituras propias pendientes, ``sync`` las esperaría bloqueando la interfaz: el aviso
+        # se deja activo y se vuelve a intentar en la próxima consulta
+        if self.watcher.changed.is_set() and not self.service.writes_pending():
+            self.watcher.changed.clear()
+            if self.persist(self.service.sync):
+                self.display_calendar()
+        self.after(500, self.poll_external_changes)
+
+    def poll_writer_errors(self):
+        """Muestra en el hilo principal los errores del hilo de escritura."""
+        self.show_writer_errors()
+        self.after(200, self.poll_writer_errors)
+
+    def show_writer_errors(self):
+        while not self.service.writer.errors.empty():
+            error = self.service.writer.errors.get_nowait()
+            messagebox.showerror("Error de guardado", f"No se pudieron guardar las tareas: {error}")
+
+    @profiler.timed()
+    def load_tasks(self, year=None, month=None):
+        """Carga las tareas del mes visible (o cambia al mes indicado); el resto del historial se carga bajo demanda."""
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # Limpiar el diccionario de tareas actual antes de cargar
-            self.calendar.tasks = {}
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                parts = line.split('|', 4)
-                if len(parts) != 5:
-                    continue # Ignorar líneas mal formadas
-
-                date_str, title, description, section_name, completed_str = parts
-
-                # Restaurar el separador si fue reemplazado
-                title = title.replace('{{PIPE}}', '|')
-                description = description.replace('{{PIPE}}', '|')
-                section_name = section_name.replace('{{PIPE}}', '|')
+            if year is None:
+                self.service.load_month()
+            else:
+                self.service.set_month(year, month)
+        except IOError as e:
+            messagebox.showerror("Error de carga", f"No se pudieron cargar las tareas: {e}")
+        self.report_malformed_lines()
 
-                # Recrear los objetos y añadirlos al calendario
-                section = Section(section_name)
-                task = Task(title=title, description=description, section=section)
-                task.set_completed(completed_str == 'True') # Convertir string a booleano
-                self.calendar.add_task(date_str, task)
+    def start_preload(self):
+        """Empieza a leer el resto del historial en otro hilo y muestra su progreso."""
+        self.preload_progress = 0.0 # Lo actualiza el hilo de lectura; Tk solo se toca desde poll_preload
+        try:
+            started = self.service.preload(progress=lambda fraction: setattr(self, "preload_progress", fraction))
+        except IOError as e:
+            messagebox.showerror("Error de carga", f"No se pudieron cargar las tareas: {e}")
+            return
+        if started:
+            self.status_label.configure(text="Cargando historial... 0%")
+            self.status_label.grid()
+            self.after(100, self.poll_preload)
+        else:
+            self.after_idle(self.archive_old_tasks)
+
+    def poll_preload(self):
+        """Incorpora el historial en el hilo principal cuando el hilo de lectura termina."""
+        try:
+            done = self.service.finish_preload()
         except IOError as e:
+            self.status_label.grid_remove()
             messagebox.showerror("Error de carga", f"No se pudieron cargar las tareas: {e}")
+            return
+        if done or not self.service.preloading: # También si otra acción ya esperó a la carga completa
+            self.status_label.grid_remove()
+            self.report_malformed_lines()
+            self.display_calendar()
+            self.after_idle(self.archive_old_tasks)
+            return
+        self.status_label.configure(text=f"Cargando historial... {self.preload_progress:.0%}")
+        self.after(100, self.poll_preload)
+
+    @profiler.timed()
+    def archive_old_tasks(self):
+        """Con AGENDA_ARCHIVE_DAYS=N, archiva al arrancar las tareas completadas de hace más de N días."""
+        days = os.environ.get("AGENDA_ARCHIVE_DAYS")
+        if not days:
+            return
+        try:
+            before = archive_cutoff(int(days))
+        except ValueError:
+            messagebox.showerror("Archivo histórico", f"AGENDA_ARCHIVE_DAYS no es un número de días válido: {days}")
+            return
+        count = self.persist(self.service.archive_completed, before)
+        if count:
+            self.refresh_after_change()
+            self.show_status(f"{count} tareas completadas anteriores al {before} archivadas.")
+
+    @profiler.timed()
+    def load_all_tasks(self):
+        """Carga todo el historial de tareas, también los años archivados. Devuelve False si hubo un error."""
+        try:
+            self.service.load_history()
+        except IOError as e:
+            messagebox.showerror("Error de carga", f"No se pudieron cargar las tareas: {e}")
+            return False
+        self.report_malformed_lines()
+        return True
+
+    def report_malformed_lines(self):
+        """Avisa (una sola vez) de las líneas mal formadas que se ignoraron al cargar."""
+        report = self.service.load_report
+        if report is None or not report.malformed or getattr(self, "_malformed_reported", False):
+            return
+        self._malformed_reported = True
+        messagebox.showwarning(
+            "Líneas ignoradas",
+            f"Se ignoraron {report.malformed} líneas mal formadas en {self.service.data_file} "
+            f"(la primera es la línea {report.first_malformed_line})."
+        )
+
+    def dump_profile(self):
+        """Vuelca los eventos de perfilado registrados hasta ahora."""
+        try:
+            path = profiler.dump()
+        except IOError as e:
+            messagebox.showerror("Perfilado", f"No se pudo guardar el perfil: {e}")
+            return
+        print(f"Perfil guardado en {path}")
 
     def on_closing(self):
         """Maneja el evento de cierre de la ventana."""
-        self.save_tasks()
+        self.watcher.stop()
+        if profiler.enabled:
+            self.loop_monitor.stop()
+            self.dump_profile()
+        try:
+            self.service.close() # Vacía la cola de escritura y cierra el almacenamiento
+        except IOError as e:
+            messagebox.showerror("Error de guardado", f"No se pudieron guardar las tareas: {e}")
+        self.show_writer_errors()
         self.destroy()
 
     def centrar_ventana_toplevel(self, toplevel_window, ancho, alto):
@@ -626,5 +835,10 @@ class AgendaApp(tk.Tk):
         toplevel_window.geometry(f"{ancho}x{alto}+{x}+{y}")
 
 if __name__ == "__main__":
+    # --profile[=ruta] equivale a AGENDA_PROFILE (ver agenda/profiling.py)
+    for arg in sys.argv[1:]:
+        if arg == "--profile" or arg.startswith("--profile="):
+            os.environ["AGENDA_PROFILE"] = arg.partition("=")[2] or "1"
+    profiler.configure_from_env()
     app = AgendaApp()
     app.mainloop()
\ No newline at end of file